@@ -36,8 +36,14 @@ import re
 # gcd for Smith normal form
 from fractions import gcd
 
-# for duplicating Hasse diagram for randomised algorithm
-import copy
+# compact integer storage for the face poset incidences
+from array import array
+
+# free face queue for the Morse matching
+from collections import deque
+
+# optional counters of the Morse matching (--stats of the census scripts)
+from censusStats import STATS
 
 import sys
 sys.setrecursionlimit(100)
@@ -73,6 +79,13 @@ class FacePoset:
     This is designed so that the user should only interact with the FacePoset object, with the PosetNode objects 
     used only for the backend of the FacePoset object.
 
+    Storage is array-backed: for each layer (dimension) we keep an alive mask, and CSR-style integer arrays
+    (row pointers, neighbour names and multiplicities) for the downward arcs to the layer below and the upward
+    arcs to the layer above. Node names are the dense integer indices of the cells in Regina, so a name is also
+    a row number in these arrays. Regina cells are not stored; get_cell resolves them from the triangulation
+    on demand. PosetNode objects are thin views created on request, so get_node / add_arc / remove_node
+    behave as before but cost no memory per cell.
+
     Example usage:
     
     tri = Triangulation3.fromIsoSig('fLAMcbcbdeehxjqhr')
@@ -84,22 +97,23 @@ class FacePoset:
 
     get_node
     get_cell
-    add_node
+    add_node: node names must be non-negative integers
     add_arc: this requires the two end nodes to exist
     remove_node
     remove_arc
+    memory_footprint
     """
     class PosetNode:
         """
-        PosetNodes have three main attributes:
-        cell: a reference to the Regina object for the cell in the triangulation
+        PosetNodes are views onto a single cell of the FacePoset. They have three main attributes:
+        cell: a reference to the Regina object for the cell in the triangulation (resolved lazily)
         name: an integer index uniquely identifying this cell amongst cells of the same dimension
         dim: an integer corresponding to the dimension of the cell
 
         PosetNodes are uniquely identified inside the FacePoset by the tuple (self.dim, self.name). 
         This is implemented by the PosetNode.key() method, which returns the above tuple.
 
-        PosetNodes also carry 'pointers' to other cells:
+        PosetNodes also give 'pointers' to other cells, read from the incidence arrays of the FacePoset:
         parents:    a list of references to PosetNodes of dimension self.dim+1, which have an arc between
                     each parent and the current PosetNode
         children:   a list of references to PosetNodes of dimension self.dim-1, which have an arc between
@@ -112,24 +126,46 @@ class FacePoset:
         Parent / child relationships will be stored in a separate 'irregular_parents' and 'irregular_children'
         lists as attributes of each PosetNode, similarly to the ordinary 'parents' and 'children' attributes.
         """
+        __slots__ = ('poset', 'dim', 'name')
 
-        def __init__(self, dim, name, cell,
-                     parents = None, children = None):
-            self.cell = cell
-            self.name = name
+        def __init__(self, poset, dim, name):
+            self.poset = poset
             self.dim = dim
-            self.irregular_parents = []
-            self.irregular_children = []
-            self.morse_matched = None 
+            self.name = name
 
-            if not parents:
-                self.parents = []
+        @property
+        def cell(self):
+            return self.poset.get_cell(self.dim, self.name)
+
+        @property
+        def parents(self):
+            return self.poset._neighbours(self.dim, self.name, up = True, irregular = False)
+
+        @property
+        def children(self):
+            return self.poset._neighbours(self.dim, self.name, up = False, irregular = False)
+
+        @property
+        def irregular_parents(self):
+            return self.poset._neighbours(self.dim, self.name, up = True, irregular = True)
+
+        @property
+        def irregular_children(self):
+            return self.poset._neighbours(self.dim, self.name, up = False, irregular = True)
+
+        @property
+        def morse_matched(self):
+            key = self.poset._matched.get(self.key())
+            if key is None:
+                return None
+            return self.poset.PosetNode(self.poset, key[0], key[1])
+
+        @morse_matched.setter
+        def morse_matched(self, node):
+            if node is None:
+                self.poset._matched.pop(self.key(), None)
             else:
-                self.parents = parents
-            if not children:
-                self.children = []
-            else:
-                self.children = children
+                self.poset._matched[self.key()] = node.key()
         
         def key(self):
             return (self.dim, self.name)
@@ -143,41 +179,88 @@ class FacePoset:
         def __eq__(self, other):
             return self.__key() == other.__key()
 
+        def __ne__(self, other):
+            return not self == other
+
         def add_child(self, node):
-            self.children.append(node)
+            self.poset.add_arc(self.key(), node.key())
         
         def add_parent(self, node):
-            self.parents.append(node)
+            self.poset.add_arc(self.key(), node.key())
         
         def remove_child(self, node, error = False):
-            if node in self.irregular_children:
-                self.irregular_children.remove(node)
-            if node in self.children:
-                self.children.remove(node)
-            elif error:
-                raise FindCellFailure('No such cell '+str((node.dim, node.name))+' found')
+            self.poset.remove_arc(self.key(), node.key(), error = error)
 
         def remove_parent(self, node, error = False):
-            if node in self.irregular_parents:
-                self.irregular_parents.remove(node)
-            if node in self.parents:
-                self.parents.remove(node)
-            elif error:
-                raise FindCellFailure('No such cell '+str((node.dim, node.name))+' found')
+            self.poset.remove_arc(self.key(), node.key(), error = error)
+
+    class PosetLayer:
+        """
+        Read-only, dict-like view of the live nodes of one dimension, so that self.layers[dim][name],
+        self.layers[dim].items() etc. keep working on top of the array storage.
+        """
+        __slots__ = ('poset', 'dim')
+
+        def __init__(self, poset, dim):
+            self.poset = poset
+            self.dim = dim
+
+        def keys(self):
+            return [name for name, alive in enumerate(self.poset._alive[self.dim]) if alive]
+
+        def values(self):
+            return [self.poset.PosetNode(self.poset, self.dim, name) for name in self.keys()]
+
+        def items(self):
+            return [(name, self.poset.PosetNode(self.poset, self.dim, name)) for name in self.keys()]
+
+        def __iter__(self):
+            return iter(self.keys())
+
+        def __len__(self):
+            return sum(self.poset._alive[self.dim])
+
+        def __contains__(self, name):
+            return self.poset._is_alive(self.dim, name)
+
+        def __getitem__(self, name):
+            if not self.poset._is_alive(self.dim, name):
+                raise KeyError(name)
+            return self.poset.PosetNode(self.poset, self.dim, name)
     
     def get_node(self, dim, name):
-        try:
-            return self.layers[dim][name]
-        except:
+        if not dim in self.layers or not self._is_alive(dim, name):
             raise FindCellFailure('Could not find cell '+str(name)+' in layer '+str(dim)) 
+        return self.PosetNode(self, dim, name)
 
     def get_cell(self, dim, name):
-        return self.layers[dim][name].cell
+        if not dim in self.layers or not self._is_alive(dim, name):
+            raise FindCellFailure('Could not find cell '+str(name)+' in layer '+str(dim)) 
+        if (dim, name) in self._cells:
+            return self._cells[(dim, name)]
+        if self.triangulation is None:
+            return None
+        if dim == self.dim:
+            return self.triangulation.simplex(name)
+        return self.triangulation.face(dim, name)
 
     def add_node(self, dim, name, cell):
         if not dim in self.layers.keys():
-            self.layers[dim] = {}
-        self.layers[dim][name] = self.PosetNode(name = name, cell = cell, dim = dim)
+            self._add_layer(dim, 0)
+        alive = self._alive[dim]
+        if name >= len(alive):
+            extra = name + 1 - len(alive)
+            alive.extend(bytearray(extra))
+            for ptr, _, _ in self._down[dim], self._up[dim]:
+                ptr.extend(array('i', [ptr[-1]]) * extra)
+        else:
+            # a fresh node starts without arcs, even if the name was used by a removed node
+            self._compact()
+            self._clear_arcs(dim, name)
+        alive[name] = 1
+        self._cells.pop((dim, name), None)
+        if cell is not None:
+            self._cells[(dim, name)] = cell
 
     def remove_node(self, dim, node_label, suppress_error = False):
         if not dim in self.layers.keys():
@@ -185,38 +268,16 @@ class FacePoset:
                 return
             string = 'Could not find layer of dimension '+str(dim)+' when deleting node '+str(node_label)
             raise FindLayerFailure(string)
-        if not node_label in self.layers[dim].keys():
+        if not self._is_alive(dim, node_label):
             if suppress_error:
                 return
             string = 'Could not find node '+str((dim, node_label))+' when trying to delete it'
             raise FindCellFailure(string)
         else:
-            #print 'before remove_node'
-            #fp.output_poset()
-            
-            node = self.layers[dim][node_label]
-            #print type(node)
-            #print 'stripping the neighbours of ',node.key(), 'before:'
-            #print [(el.key(), [l.key() for l in el.parents]) for el in node.children]
-            #print [(el.key(), [l.key() for l in el.children]) for el in node.parents]
-            for child in node.children:
-                child.remove_parent(node)
-            for irr_child in node.irregular_children:
-                irr_child.remove_parent(node)
-            for parent in node.parents:
-                parent.remove_child(node)
-            for irr_parent in node.irregular_parents:
-                irr_parent.remove_child(node)
-            #print 'after:'
-            #print [(el.key(), [l.key() for l in el.parents]) for el in node.children]
-            #print [(el.key(), [l.key() for l in el.children]) for el in node.parents]
-            #_ = self.layers[dim].pop(node_label)
-            del self.layers[dim][node_label]
-            del node
-            #print 'after remove_node'
-            #fp.output_poset()
-            #print type(node)
-            
+            # arcs to a dead node are hidden by the alive mask, so they are left in the arrays
+            self._alive[dim][node_label] = 0
+            self._cells.pop((dim, node_label), None)
+            self._matched.pop((dim, node_label), None)
 
     def add_arc(self, n1_tup, n2_tup):
         dim1, name1 = n1_tup
@@ -227,7 +288,7 @@ class FacePoset:
                 raise FindLayerFailure('Could not find layer '+str(dim)+' for creating arc between '+str((n1_tup, n2_tup)))
 
         for dim, name in n1_tup, n2_tup:
-            if not name in self.layers[dim].keys():
+            if not self._is_alive(dim, name):
                 raise FindCellFailure('Could not find node '+str((dim, name))+' for creating arc between '+str((n1_tup, n2_tup)))
         
         if dim1 == dim2:
@@ -241,17 +302,15 @@ class FacePoset:
 
         # so after this point, the (dim1, name1) is the node with the higher dimension
 
-        n1 = self.layers[dim1][name1]
-        n2=  self.layers[dim2][name2]
-
-        #print n1.name, n1.cell, n1.dim, n1.children, n1.parents
-        #print n2.name, n2.cell, n2.dim, n2.children, n2.parents
-
-        n1.add_child(n2)
-        n2.add_parent(n1)
-
-        #print n1.name, n1.cell, n1.dim, n1.children, n1.parents
-        #print n2.name, n2.cell, n2.dim, n2.children, n2.parents
+        self._compact()
+        down_pos = self._find_arc(self._down[dim1], name1, name2)
+        if down_pos is None:
+            # new arcs are batched and merged into the arrays on the next read
+            self._pending.append((dim1, name1, name2))
+        else:
+            up_pos = self._find_arc(self._up[dim2], name2, name1)
+            self._down[dim1][2][down_pos] += 1
+            self._up[dim2][2][up_pos] += 1
 
     def remove_arc(self, tup1, tup2, error = False):
         dim1, name1 = tup1
@@ -259,11 +318,11 @@ class FacePoset:
         
         for dim in dim1, dim2:
             if not dim in self.layers.keys():
-                raise FindLayerFailure('Could not find layer '+str(dim)+' for creating arc between '+str(n1_tup, n2_tup))
+                raise FindLayerFailure('Could not find layer '+str(dim)+' for removing arc between '+str((tup1, tup2)))
 
         for dim, name in tup1, tup2:
-            if not name in self.layers[dim].keys():
-                raise FindCellFailure('Could not find node '+str(dim, name)+' for creating arc between '+str(n1_tup, n2_tup))
+            if not self._is_alive(dim, name):
+                raise FindCellFailure('Could not find node '+str((dim, name))+' for removing arc between '+str((tup1, tup2)))
         
         if dim1 == dim2:
             raise LogicalMistake('arc cannot exist between two nodes of the same dimension')
@@ -276,17 +335,20 @@ class FacePoset:
 
         # so after this point, the (dim1, name1) is the node with the higher dimension
 
-        n1 = self.layers[dim1][name1]
-        n2=  self.layers[dim2][name2]
-        #print 'Test'
-        #print n1.dim, n1.name, n1.children
-        #print n2.dim, n2.name, n2.parents
-
-        if error:
-            n1.remove_child(n2, error = True)
-            n2.remove_parent(n1, error = True)
-        n1.remove_child(n2)
-        n2.remove_parent(n1)
+        self._compact()
+        down_pos = self._find_arc(self._down[dim1], name1, name2)
+        if down_pos is None or self._down[dim1][2][down_pos] == 0:
+            if error:
+                raise FindCellFailure('No such arc '+str(((dim1, name1), (dim2, name2)))+' found')
+            return
+        up_pos = self._find_arc(self._up[dim2], name2, name1)
+        # an irregular arc is removed as a whole, otherwise one copy of a repeated arc goes
+        if self._stripped:
+            self._down[dim1][2][down_pos] = 0
+            self._up[dim2][2][up_pos] = 0
+        else:
+            self._down[dim1][2][down_pos] -= 1
+            self._up[dim2][2][up_pos] -= 1
 
     def output_poset(self):
         print "This depicts the face poset diagram from the 0th dimension cells upwards. Arcs are expressed downwards."
@@ -304,34 +366,191 @@ class FacePoset:
                     else:
                         print str(cell_name) + ': ' + string
 
+    def memory_footprint(self):
+        """
+        Returns the number of bytes held by the alive masks and incidence arrays of all layers.
+        Regina cells resolved through get_cell are not counted, as they are not kept by the FacePoset.
+        """
+        self._compact()
+        total = 0
+        for dim in self.layers:
+            total += sys.getsizeof(self._alive[dim])
+            for csr in self._down[dim], self._up[dim]:
+                total += sum(sys.getsizeof(arr) for arr in csr)
+        return total
+
+    def hasse_diagram(self):
+        """
+        Returns (upward, downward) as lists of lists in the form of hasse.compute_hasse (and the input of
+        morseCollapse.morse_collapse): upward[dim][name] are the names of the regular parents of a node,
+        downward[dim][name] those of its regular children, in the order of the incidence arrays. Rows of
+        removed nodes are empty.
+        """
+        self._compact()
+        upward = []
+        downward = []
+        for dim in sorted(self.layers.keys()):
+            for csr, other, result in (self._up[dim], dim+1, upward), (self._down[dim], dim-1, downward):
+                ptr, idx, mult = csr
+                alive = self._alive.get(other)
+                rows = []
+                for name in xrange(len(self._alive[dim])):
+                    if self._alive[dim][name]:
+                        rows.append([idx[k] for k in xrange(ptr[name], ptr[name+1])
+                                     if mult[k] == 1 and alive[idx[k]]])
+                    else:
+                        rows.append([])
+                result.append(rows)
+        return upward, downward
+
     def __init__(self, triangulation = None, dim = None):
         
         if triangulation and not dim:
             raise InputError('No dim arg given, must be given accompanying a triangulation input')
-        self.layers ={}
+        self.layers = {}
+        self.triangulation = triangulation
+        self.dim = dim
+        self._alive = {}
+        self._down = {}
+        self._up = {}
+        self._pending = []
+        self._cells = {}
+        self._matched = {}
+        self._stripped = False
         if not triangulation and not dim:
             return
-        self.dim = dim
         for dimension in range(dim):
-            self.layers[dimension] = { name: self.PosetNode(dimension, name, cell) for name, cell in enumerate(triangulation.faces(dimension))}
-        self.layers[dim] = {name: self.PosetNode(dim, name, cell) for name, cell in enumerate(triangulation.simplices())}
+            self._add_layer(dimension, triangulation.countFaces(dimension))
+        self._add_layer(dim, triangulation.size())
 
+        # cell names are the Regina face indices, so each facet can be found directly
+        # through face.index() instead of searching the layer below for a matching cell
         for dimension in range(dim, 0, -1):
-            for name, node in self.layers[dimension].items():
-                cell = node.cell 
+            if dimension == dim:
+                cells = triangulation.simplices()
+            else:
+                cells = triangulation.faces(dimension)
+            ptr = array('i', [0])
+            idx = array('i')
+            mult = array('B')
+            for cell in cells:
+                start = len(idx)
                 for j in range(dimension+1):
-                    face = cell.face(dimension-1, j)
-                    for face_name, face_node in self.layers[dimension-1].items():
-                        if face_node.cell == face:
-                            self.add_arc((dimension, name), (dimension-1, face_name))
+                    face_name = cell.face(dimension-1, j).index()
+                    for k in range(start, len(idx)):
+                        if idx[k] == face_name:
+                            mult[k] += 1
+                            break
+                    else:
+                        idx.append(face_name)
+                        mult.append(1)
+                ptr.append(len(idx))
+            self._down[dimension] = (ptr, idx, mult)
+            self._up[dimension-1] = self._transpose(self._down[dimension], len(self._alive[dimension-1]))
     
     def strip_multi_edges(self):
-        for dimension in range(self.dim, 0, -1):
-            for name, node in self.layers[dimension].items():
-                node.children, node.irregular_children = self.separate_duplicates(node.children)
-        for dimension in range(self.dim):
-            for name, node in self.layers[dimension].items():
-                node.parents, node.irregular_parents = self.separate_duplicates(node.parents)
+        # arcs are stored once with a multiplicity, so stripping only changes how the views
+        # report them: multiplicity 1 arcs are regular, repeated arcs are irregular
+        self._compact()
+        self._stripped = True
+
+    def _add_layer(self, dim, size):
+        self.layers[dim] = self.PosetLayer(self, dim)
+        self._alive[dim] = bytearray([1]) * size
+        self._down[dim] = (array('i', [0]) * (size + 1), array('i'), array('B'))
+        self._up[dim] = (array('i', [0]) * (size + 1), array('i'), array('B'))
+
+    def _is_alive(self, dim, name):
+        alive = self._alive.get(dim)
+        return alive is not None and isinstance(name, (int, long)) and 0 <= name < len(alive) and alive[name] == 1
+
+    def _neighbours(self, dim, name, up, irregular):
+        self._compact()
+        if up:
+            ptr, idx, mult = self._up[dim]
+            other = dim + 1
+        else:
+            ptr, idx, mult = self._down[dim]
+            other = dim - 1
+        alive = self._alive.get(other)
+        nodes = []
+        for k in xrange(ptr[name], ptr[name+1]):
+            m = mult[k]
+            if m == 0 or not alive[idx[k]]:
+                continue
+            if self._stripped:
+                if (m > 1) == irregular:
+                    nodes.append(self.PosetNode(self, other, idx[k]))
+            elif not irregular:
+                nodes.extend([self.PosetNode(self, other, idx[k])] * m)
+        return nodes
+
+    def _find_arc(self, csr, row, target):
+        ptr, idx, _ = csr
+        for k in xrange(ptr[row], ptr[row+1]):
+            if idx[k] == target:
+                return k
+        return None
+
+    def _clear_arcs(self, dim, name):
+        for csr, other_csr in (self._down[dim], self._up.get(dim-1)), (self._up[dim], self._down.get(dim+1)):
+            ptr, idx, mult = csr
+            for k in xrange(ptr[name], ptr[name+1]):
+                if mult[k]:
+                    mult[k] = 0
+                    other_csr[2][self._find_arc(other_csr, idx[k], name)] = 0
+
+    def _transpose(self, csr, size):
+        # counting sort of the arcs by their lower end, so rows of the result list parents in increasing order
+        ptr, idx, mult = csr
+        t_ptr = array('i', [0]) * (size + 1)
+        for k in xrange(len(idx)):
+            t_ptr[idx[k]+1] += 1
+        for row in xrange(size):
+            t_ptr[row+1] += t_ptr[row]
+        fill = array('i', t_ptr)
+        t_idx = array('i', [0]) * len(idx)
+        t_mult = array('B', [0]) * len(idx)
+        for row in xrange(len(ptr) - 1):
+            for k in xrange(ptr[row], ptr[row+1]):
+                pos = fill[idx[k]]
+                t_idx[pos] = row
+                t_mult[pos] = mult[k]
+                fill[idx[k]] += 1
+        return (t_ptr, t_idx, t_mult)
+
+    def _compact(self):
+        """
+        Merges arcs queued by add_arc into the CSR arrays of the layers they touch.
+        """
+        if not self._pending:
+            return
+        pending = {}
+        for dim, upper, lower in self._pending:
+            pending.setdefault(dim, {}).setdefault(upper, []).append(lower)
+        self._pending = []
+        for dim, new_arcs in pending.items():
+            ptr, idx, mult = self._down[dim]
+            n_ptr = array('i', [0])
+            n_idx = array('i')
+            n_mult = array('B')
+            for row in xrange(len(ptr) - 1):
+                start = len(n_idx)
+                for k in xrange(ptr[row], ptr[row+1]):
+                    if mult[k]:
+                        n_idx.append(idx[k])
+                        n_mult.append(mult[k])
+                for lower in new_arcs.get(row, ()):
+                    for k in xrange(start, len(n_idx)):
+                        if n_idx[k] == lower:
+                            n_mult[k] += 1
+                            break
+                    else:
+                        n_idx.append(lower)
+                        n_mult.append(1)
+                n_ptr.append(len(n_idx))
+            self._down[dim] = (n_ptr, n_idx, n_mult)
+            self._up[dim-1] = self._transpose(self._down[dim], len(self._alive[dim-1]))
 
     def separate_duplicates(self, array):
         seen = {}
@@ -369,40 +588,155 @@ class FacePoset:
         n1.morse_matched = n2
         n2.morse_matched = n1
 
-    def randomised_morse_matching(self):
-        # for now, implement this in a destructive way
+    def randomised_morse_matching(self, seed = None):
+        """
+        Greedy Morse matching by repeated elementary collapses, driven by a queue of free faces.
+
+        The up-degree of every node is kept in integer arrays: regular arcs count towards reg_degree and
+        irregular (repeated) arcs towards irr_degree. A node is free when it has exactly one regular parent
+        and no irregular ones; it is queued when its degree drops to that state. Removing a node only touches
+        its own arcs, so a full matching costs O(cells + incidences). When no free face is left, the first
+        remaining node of the highest dimension is made critical.
+
+        With seed = None the free faces are processed in queue order and critical cells are taken in name order.
+        Given a seed, both choices are made uniformly at random by a random.Random(seed), so each seed gives a
+        reproducible trial.
+
+        The poset itself is not modified: removals are recorded in per-trial copies of the alive masks, so
+        one FacePoset can serve any number of matching trials with O(cells) integer state per trial.
+
+        Returns (morse_pairs, critical), with morse_pairs a list of (face key, coface key) tuples and critical
+        a list of node keys.
+        """
+        self._compact()
         morse_pairs = []
         critical = []
-        critical_candidate = None
+        dims = sorted(self.layers.keys(), reverse = True)
+        trial_alive = dict((dimension, bytearray(self._alive[dimension])) for dimension in dims)
+        reg_degree = {}
+        irr_degree = {}
+        if seed is None:
+            rng = None
+            queue = deque()
+            pop_free = queue.popleft
+        else:
+            rng = random.Random(seed)
+            queue = []
+            def pop_free():
+                # swap-remove a uniformly random free face
+                pos = rng.randrange(len(queue))
+                queue[pos], queue[-1] = queue[-1], queue[pos]
+                return queue.pop()
+        for dimension in dims:
+            ptr, idx, mult = self._up[dimension]
+            parent_alive = trial_alive.get(dimension+1)
+            alive = trial_alive[dimension]
+            reg = array('i', [0]) * len(alive)
+            irr = array('i', [0]) * len(alive)
+            for name in xrange(len(alive)):
+                if not alive[name]:
+                    continue
+                for k in xrange(ptr[name], ptr[name+1]):
+                    if mult[k] and parent_alive[idx[k]]:
+                        if not self._stripped:
+                            reg[name] += mult[k]
+                        elif mult[k] == 1:
+                            reg[name] += 1
+                        else:
+                            irr[name] += 1
+                if reg[name] == 1 and irr[name] == 0:
+                    queue.append((dimension, name))
+            reg_degree[dimension] = reg
+            irr_degree[dimension] = irr
+
+        # order in which each layer offers critical candidates, and the position of the next candidate in it;
+        # all nodes before that position are removed
+        candidate_order = {}
+        for dimension in dims:
+            candidate_order[dimension] = range(len(trial_alive[dimension]))
+            if rng is not None:
+                rng.shuffle(candidate_order[dimension])
+        next_candidate = dict((dimension, 0) for dimension in dims)
         while True:
-            found_unmatched_uncritical = False
-            match_made = False
-            for dimension in range(self.dim, -1, -1):
-                for name, node in self.layers[dimension].items():
-                    if not found_unmatched_uncritical:
-                        critical_candidate = node
-                        #print 'this is the candidate', node.dim, node.name 
-                        found_unmatched_uncritical = True
-                    if len(node.parents) == 1 and len(node.irregular_parents) == 0:
-                        
-                        morse_pairs.append((node.key(), node.parents[0].key()))
-                        #print [(node.key(), el.key()) for el in node.parents]
-                        self.remove_node(node.parents[0].dim, node.parents[0].name)
-                        #print [(node.key(), el.key()) for el in node.parents]
-                        self.remove_node(node.dim, node.name)
-                        
-                        match_made = True
-            # need to save a candidate for making a cell critical so I don't need to repeat the search
-            if found_unmatched_uncritical and not match_made:
-                #make cell critical
-                
-                critical.append((critical_candidate.dim, critical_candidate.name))
-                self.remove_node(critical_candidate.dim, critical_candidate.name)
-                
-            if not found_unmatched_uncritical:
+            while queue:
+                dimension, name = pop_free()
+                if not trial_alive[dimension][name] or reg_degree[dimension][name] != 1 or irr_degree[dimension][name] != 0:
+                    continue
+                ptr, idx, mult = self._up[dimension]
+                parent_alive = trial_alive[dimension+1]
+                for k in xrange(ptr[name], ptr[name+1]):
+                    if mult[k] and parent_alive[idx[k]]:
+                        parent = idx[k]
+                        break
+                morse_pairs.append(((dimension, name), (dimension+1, parent)))
+                self._collapse_node(dimension+1, parent, trial_alive, reg_degree, irr_degree, queue)
+                self._collapse_node(dimension, name, trial_alive, reg_degree, irr_degree, queue)
+
+            # no free face left, so make the first node of the highest dimension critical
+            critical_candidate = None
+            for dimension in dims:
+                alive = trial_alive[dimension]
+                order = candidate_order[dimension]
+                pos = next_candidate[dimension]
+                while pos < len(order) and not alive[order[pos]]:
+                    pos += 1
+                next_candidate[dimension] = pos
+                if pos < len(order):
+                    critical_candidate = (dimension, order[pos])
+                    break
+            if critical_candidate is None:
                 break
+            critical.append(critical_candidate)
+            self._collapse_node(critical_candidate[0], critical_candidate[1], trial_alive, reg_degree, irr_degree, queue)
+        if STATS.enabled:
+            STATS.count('collapse trials')
+            STATS.count('critical cells', len(critical))
+            STATS.count('pairs collapsed', len(morse_pairs))
+            STATS.count('nodes removed', 2 * len(morse_pairs) + len(critical))
         return morse_pairs, critical
 
+    def best_morse_matching(self, trials, seed = 0, lower_bound = None):
+        """
+        Runs randomised_morse_matching with the seeds seed, seed+1, ..., seed+trials-1 and keeps the matching
+        with the fewest critical cells (the first one found on ties). Stops early once the number of critical
+        cells reaches lower_bound, e.g. the sum of the Betti numbers when that is known to be attainable.
+
+        Returns (morse_pairs, critical, winning_seed).
+        """
+        if trials < 1:
+            raise InputError('best_morse_matching needs at least one trial')
+        best = None
+        for trial_seed in range(seed, seed + trials):
+            morse_pairs, critical = self.randomised_morse_matching(seed = trial_seed)
+            if best is None or len(critical) < len(best[1]):
+                best = (morse_pairs, critical, trial_seed)
+            if lower_bound is not None and len(critical) <= lower_bound:
+                break
+        return best
+
+    def _collapse_node(self, dim, name, trial_alive, reg_degree, irr_degree, queue):
+        # removes a node from the trial masks and lowers the up-degree of its children,
+        # queueing those that become free
+        trial_alive[dim][name] = 0
+        if not dim-1 in reg_degree:
+            return
+        ptr, idx, mult = self._down[dim]
+        child_alive = trial_alive[dim-1]
+        reg = reg_degree[dim-1]
+        irr = irr_degree[dim-1]
+        for k in xrange(ptr[name], ptr[name+1]):
+            child = idx[k]
+            if not mult[k] or not child_alive[child]:
+                continue
+            if not self._stripped:
+                reg[child] -= mult[k]
+            elif mult[k] == 1:
+                reg[child] -= 1
+            else:
+                irr[child] -= 1
+            if reg[child] == 1 and irr[child] == 0:
+                queue.append((dim-1, child))
+
     def node_info(self, node):
         print 'Printing information about node',node.key()
         print 'Parents:'
@@ -521,74 +855,75 @@ def get_edge_list(triangulation, dim):
             multiples.append(el)
     return singles, multiples, loops
 
-#fp = FacePoset()
-tri = Triangulation3.fromIsoSig('fLAMcbcbdeehxjqhr')
-fp = FacePoset(triangulation=tri, dim = 3)
-a,b,c,d =  fp.filtered_dual_graph_links(dim = 3)
-print a
-print b
-print c
-print d
-#FP = FacetPairing3(tri)
-#print fp.output_poset()
-#print FP.__str__()
-
-#fp = FacePoset(triangulation = tri, dim = 3)
-#fp.strip_multi_edges()
-#fp.output_poset()
-
-#morse, critical = fp.randomised_morse_matching()
-#print 'Morse pairs:'
-#print morse
-#print 'Critical cells:'
-#print critical
-
-#fp.add_node(0, 0, 'A')
-#fp.add_node(0, 1, 'B')
-#fp.add_node(1,0, 'C')
-#fp.add_node(2,0, 'D')
-
-#fp.add_arc((0,0), (1,0))
-#fp.add_arc((1,0), (2,0))
-#fp.output()
-#fp.remove_arc((0,0), (1,0), error = True)
-#fp.output()
-#fp.remove_arc((1,0), (2,0), error = True)
-#fp.output()
-
-#n1 = fp.get_node(1,0)
-#print n1.cell
-
-##########################################
-##########################################
-#########END HELPER FUNCTIONS ############
-##########################################
-##########################################
-
-#for line in sys.stdin:
-#  if ctr > 0: # max added to stop loop
-#    break
-#  ctr += 1
-  #if ctr%1000 == 0:
-  #  print ctr
-  #sig = re.search('[a-zA-Z0-9]*' ,line)
-  #t = NTriangulation.fromIsoSig(line)
-#  t = Triangulation3.fromIsoSig(line)
-  #print t.isoSig()
-  #print t.detail()
-  #print list([v for v in t.vertex_iterator()])
-
-
-  #vertices = t.getVertices() OG
-#  vertices = t.faces(0)
+if __name__ == '__main__':
+    #fp = FacePoset()
+    tri = Triangulation3.fromIsoSig('fLAMcbcbdeehxjqhr')
+    fp = FacePoset(triangulation=tri, dim = 3)
+    a,b,c,d =  fp.filtered_dual_graph_links(dim = 3)
+    print a
+    print b
+    print c
+    print d
+    #FP = FacetPairing3(tri)
+    #print fp.output_poset()
+    #print FP.__str__()
+
+    #fp = FacePoset(triangulation = tri, dim = 3)
+    #fp.strip_multi_edges()
+    #fp.output_poset()
+
+    #morse, critical = fp.randomised_morse_matching()
+    #print 'Morse pairs:'
+    #print morse
+    #print 'Critical cells:'
+    #print critical
+
+    #fp.add_node(0, 0, 'A')
+    #fp.add_node(0, 1, 'B')
+    #fp.add_node(1,0, 'C')
+    #fp.add_node(2,0, 'D')
+
+    #fp.add_arc((0,0), (1,0))
+    #fp.add_arc((1,0), (2,0))
+    #fp.output()
+    #fp.remove_arc((0,0), (1,0), error = True)
+    #fp.output()
+    #fp.remove_arc((1,0), (2,0), error = True)
+    #fp.output()
+
+    #n1 = fp.get_node(1,0)
+    #print n1.cell
+
+    ##########################################
+    ##########################################
+    #########END HELPER FUNCTIONS ############
+    ##########################################
+    ##########################################
+
+    #for line in sys.stdin:
+    #  if ctr > 0: # max added to stop loop
+    #    break
+    #  ctr += 1
+      #if ctr%1000 == 0:
+      #  print ctr
+      #sig = re.search('[a-zA-Z0-9]*' ,line)
+      #t = NTriangulation.fromIsoSig(line)
+    #  t = Triangulation3.fromIsoSig(line)
+      #print t.isoSig()
+      #print t.detail()
+      #print list([v for v in t.vertex_iterator()])
+
+
+      #vertices = t.getVertices() OG
+    #  vertices = t.faces(0)
 
   
 
-  #edges = t.getEdges() OG
-#  edges = t.faces(1)
-  #faces = t.getTriangles() OG
-#  faces = t.faces(2)
-  #tet = t.getTetrahedra() OG
-#  tet = t.simplices()
+      #edges = t.getEdges() OG
+    #  edges = t.faces(1)
+      #faces = t.getTriangles() OG
+    #  faces = t.faces(2)
+      #tet = t.getTetrahedra() OG
+    #  tet = t.simplices()
 
   
\ No newline at end of file
@@ -0,0 +1,528 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Benchmarks for the census scripts
+#
+# ./benchmarks.py io [--lines N]
+#   compares reading a compressed census and writing the results through
+#   censusIO against the 'bzcat <file>.sig.bz2 | ./<pythonFile>.py > <file>'
+#   pipeline. The per-line work is the identity, so only the I/O is timed.
+#
+# ./benchmarks.py paths [--lines N] [--subdivisions K]
+#   times the boundary operator of hasseDiagramCopy.py computed by dynamic
+#   programming (SCMorseBdryOp) and by walking the gradient paths, iteratively
+#   and recursively, on the first N triangulations of 5.sig (barycentrically
+#   subdivided K times, for long gradient paths), and checks that all give
+#   the same operator.
+#
+# ./benchmarks.py hasse [--dimension D] [--census FILE] [--lines N] [--subdivisions K]
+#   times compute_hasse of hasse.py (NumPy CSR arrays) against the original
+#   list implementation on a census of D-manifolds (default 5.sig for D = 3,
+#   Regina's example 4-manifolds for D = 4) and checks that both give the
+#   same diagrams.
+#
+# ./benchmarks.py strategies [--dimension D] [--census FILE] [--lines N] [--subdivisions K]
+#   runs morse_collapse of morseCollapse.py with every strategy on the same
+#   census and reports the critical cells (total, mean, per dimension), how
+#   often each strategy reaches the fewest critical cells of all, and the
+#   running time, i.e. the quality per CPU-second.
+#
+# ./benchmarks.py suite [--lines N] [--subdivided-lines M] [--seed S]
+#                       [--baseline FILE] [--save-baseline FILE] [--tolerance T]
+#   times every stage of the census scripts on its own (FacePoset.__init__,
+#   strip_multi_edges, randomised_morse_matching, dual_graph_links,
+#   compute_hasse, collKnotCompl, SCBdry, SCBdryOp) with fixed seeds, on the
+#   first N triangulations of 5.sig and the first M barycentrically
+#   subdivided once. Reports triangulations/s, p50/p99 per triangulation
+#   and the peak memory of each stage (run in its own process, above the
+#   memory of its inputs), saves them as a JSON baseline and flags
+#   regressions against a saved one (exit status 1).
+###############################################################################
+
+import os
+
+import sys
+
+import time
+
+import shutil
+
+import tempfile
+
+import subprocess
+
+import argparse
+
+import bz2
+
+import gzip
+
+import copy
+
+import json
+
+import math
+
+import random
+
+import gc
+
+import multiprocessing
+
+# directory of this file, where 5.sig and the census modules live
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CENSUS = os.path.join(HERE, '5.sig')
+
+
+def census_lines(count, census = CENSUS):
+    """
+    Returns count isoSig lines, cycling through the given census file.
+    """
+    sigs = [line for line in open(census) if line.strip()]
+    return [sigs[i % len(sigs)] for i in xrange(count)]
+
+
+def timed_shell(command, cwd):
+    start = time.time()
+    subprocess.check_call(command, shell = True, cwd = cwd)
+    return time.time() - start
+
+
+# the old per-line path: one print statement per result
+PRINT_LOOP = 'import sys\nfor line in sys.stdin:\n  print line.strip()\n'
+
+# the censusIO path: direct decompression and batched (compressing) output
+CENSUS_IO_LOOP = ('import sys\nsys.path.insert(0, %r)\nfrom censusIO import open_census, CensusWriter\n'
+                  'lines = open_census(sys.argv[1])\nout = CensusWriter(sys.argv[2])\n'
+                  'for line in lines:\n  out.write(line.strip() + "\\n")\nout.close()\n')
+
+
+def bench_io(count):
+    """
+    Times the old 'bzcat | script > file' path against censusIO for .bz2 and .gz input,
+    with plain and compressed output. Returns a list of (name, seconds, lines per second).
+    """
+    tmp = tempfile.mkdtemp()
+    try:
+        text = ''.join(census_lines(count))
+        bz2_file = bz2.BZ2File(os.path.join(tmp, 'census.sig.bz2'), 'w')
+        bz2_file.write(text)
+        bz2_file.close()
+        gz_file = gzip.open(os.path.join(tmp, 'census.sig.gz'), 'wb')
+        gz_file.write(text)
+        gz_file.close()
+        del text
+        open(os.path.join(tmp, 'print_loop.py'), 'w').write(PRINT_LOOP)
+        open(os.path.join(tmp, 'census_io_loop.py'), 'w').write(CENSUS_IO_LOOP % HERE)
+        python = sys.executable
+        cases = [
+            ('bzcat | print > out', 'bzcat census.sig.bz2 | %s print_loop.py > out' % python),
+            ('censusIO .bz2 -> out', '%s census_io_loop.py census.sig.bz2 out' % python),
+            ('zcat | print > out', 'zcat census.sig.gz | %s print_loop.py > out' % python),
+            ('censusIO .gz -> out', '%s census_io_loop.py census.sig.gz out' % python),
+            ('bzcat | print | bzip2 > out.bz2', 'bzcat census.sig.bz2 | %s print_loop.py | bzip2 > out.bz2' % python),
+            ('censusIO .bz2 -> out.bz2', '%s census_io_loop.py census.sig.bz2 out.bz2' % python),
+        ]
+        results = []
+        for name, command in cases:
+            seconds = timed_shell(command, tmp)
+            results.append((name, seconds, count / seconds))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_paths(count, subdivisions = 0):
+    """
+    Times SCMorseBdryOp of hasseDiagramCopy.py, and SCBdryOp with SCFindGradientPaths and with
+    SCFindGradientPathsRecursive, on the same Morse functions. Returns a list of (name, seconds,
+    triangulations per second) and the number of triangulations whose operators differ from those of
+    SCMorseBdryOp (0 expected). The recursive version gets a recursion limit high enough for the subdivided
+    triangulations.
+    """
+    import hasseDiagramCopy
+    from regina import Triangulation3
+    inputs = []
+    lines = [line for line in open(CENSUS) if line.strip()]
+    if count > 0:
+        lines = lines[:count]
+    for line in lines:
+        t = Triangulation3.fromIsoSig(line.split()[0])
+        for i in xrange(subdivisions):
+            t.barycentricSubdivision()
+        # numbered as SCComputeIsoSig numbers the faces
+        t = Triangulation3.fromIsoSig(t.isoSig())
+        result = hasseDiagramCopy.SCComputeIsoSig(t.isoSig())
+        # SCBdryOp re-orients boundaries in place, so every run gets fresh ones
+        bdrys = hasseDiagramCopy.SCBdry(t)
+        inputs.append((result['Morse'], result['critical'][2], result['critical'][1], t, bdrys))
+
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 100000))
+    try:
+        start = time.time()
+        operators = [[hasseDiagramCopy.SCMorseBdryOp(morse, crits_up, crits_down, bdrys)
+                      for morse, crits_up, crits_down, t, bdrys in inputs]]
+        seconds = time.time() - start
+        results = [('dynamic programming', seconds, len(inputs) / seconds)]
+        for name, find_paths in [('iterative paths', hasseDiagramCopy.SCFindGradientPaths),
+                                 ('recursive paths', hasseDiagramCopy.SCFindGradientPathsRecursive)]:
+            runs = [(morse, crits_up, crits_down, t, copy.deepcopy(bdrys))
+                    for morse, crits_up, crits_down, t, bdrys in inputs]
+            start = time.time()
+            operators.append([hasseDiagramCopy.SCBdryOp(morse, crits_up, crits_down, t, bdrys, find_paths)
+                              for morse, crits_up, crits_down, t, bdrys in runs])
+            seconds = time.time() - start
+            results.append((name, seconds, len(inputs) / seconds))
+    finally:
+        sys.setrecursionlimit(limit)
+    differ = len([1 for i in xrange(len(inputs)) if operators[1][i] != operators[0][i] or operators[2][i] != operators[0][i]])
+    return results, differ
+
+
+
+def example_4_manifolds():
+    """
+    IsoSigs of Regina's example closed 4-manifold triangulations, for when no 4-manifold census is at hand.
+    """
+    from regina import Example4
+    names = ['fourSphere', 'simplicialFourSphere', 'rp4', 'cp2', 's2xs2', 's2xs2Twisted', 'k3']
+    return [getattr(Example4, name)().isoSig() + '\n' for name in names if hasattr(Example4, name)]
+
+
+def bench_hasse(count, dimension = 3, census = None, subdivisions = 0):
+    """
+    Times compute_hasse of hasse.py against compute_hasse_reference on the first count isoSigs of census
+    (all if count is 0), barycentrically subdivided subdivisions times. Returns a list of (name, seconds,
+    triangulations per second) and the number of triangulations whose diagrams differ (0 expected).
+    """
+    import hasse
+    if census is not None:
+        lines = [line for line in open(census) if line.strip()]
+    elif dimension == 3:
+        lines = [line for line in open(CENSUS) if line.strip()]
+    else:
+        lines = example_4_manifolds()
+    if count > 0:
+        lines = lines[:count]
+    sigs = []
+    for line in lines:
+        t = hasse.triangulation_class(dimension).fromIsoSig(line.split()[0])
+        for i in xrange(subdivisions):
+            t.barycentricSubdivision()
+        sigs.append(t.isoSig())
+
+    start = time.time()
+    diagrams = [hasse.compute_hasse(sig, dimension) for sig in sigs]
+    seconds = time.time() - start
+    results = [('NumPy CSR', seconds, len(sigs) / seconds)]
+    start = time.time()
+    references = [hasse.compute_hasse_reference(sig, dimension) for sig in sigs]
+    seconds = time.time() - start
+    results.append(('lists (original)', seconds, len(sigs) / seconds))
+    differ = 0
+    for (t, upward, downward), (r, ref_upward, ref_downward) in zip(diagrams, references):
+        if ([hasse.csr_rows(csr) for csr in upward[:-1]] != ref_upward[:-1] or
+                [hasse.csr_rows(csr) for csr in downward[1:]] != ref_downward[1:]):
+            differ += 1
+    return results, differ
+
+
+def bench_strategies(count, dimension = 3, census = None, subdivisions = 0):
+    """
+    Collapses the first count triangulations of census (all if count is 0; default 5.sig, or the example
+    4-manifolds), barycentrically subdivided subdivisions times, with each strategy of morseCollapse (the
+    random one seeded with the line number), down to the vertices so that multi-vertex triangulations
+    count fairly. Only the collapses are timed. Returns a list of (name, seconds, triangulations per second,
+    total critical cells, critical cells per dimension, number of triangulations where the strategy has
+    the fewest critical cells of all strategies).
+    """
+    import random
+    import hasse
+    import morseCollapse
+    if census is not None:
+        lines = [line for line in open(census) if line.strip()]
+    elif dimension == 3:
+        lines = [line for line in open(CENSUS) if line.strip()]
+    else:
+        lines = example_4_manifolds()
+    if count > 0:
+        lines = lines[:count]
+    diagrams = []
+    for line in lines:
+        t = hasse.triangulation_class(dimension).fromIsoSig(line.split()[0])
+        for i in xrange(subdivisions):
+            t.barycentricSubdivision()
+        upward, downward = hasse.triangulation_hasse(t)
+        diagrams.append(([hasse.csr_rows(csr) for csr in upward], [hasse.csr_rows(csr) for csr in downward]))
+
+    names = sorted(morseCollapse.STRATEGIES)
+    counts = {}
+    results = []
+    for name in names:
+        strategy = morseCollapse.STRATEGIES[name]()
+        start = time.time()
+        fs = [morseCollapse.morse_collapse(upward, downward, random.Random(i), 0, strategy)[0]
+              for i, (upward, downward) in enumerate(diagrams)]
+        seconds = time.time() - start
+        counts[name] = [sum(f) for f in fs]
+        per_dimension = [sum(f[d] for f in fs) for d in xrange(dimension + 1)]
+        results.append([name, seconds, len(diagrams) / seconds, sum(counts[name]), per_dimension])
+    best = [min(counts[name][i] for name in names) for i in xrange(len(diagrams))]
+    for result in results:
+        result.append(len([1 for i in xrange(len(diagrams)) if counts[result[0]][i] == best[i]]))
+    return [tuple(result) for result in results]
+
+
+# the stages timed by bench_suite, in pipeline order
+SUITE_STAGES = ['FacePoset.__init__', 'strip_multi_edges', 'randomised_morse_matching', 'dual_graph_links',
+                'compute_hasse', 'collKnotCompl', 'SCBdry', 'SCBdryOp']
+
+
+def suite_inputs(count, subdivisions = 0):
+    """
+    IsoSigs of the first count triangulations of 5.sig, barycentrically subdivided subdivisions times.
+    """
+    from regina import Triangulation3
+    sigs = []
+    for line in [line for line in open(CENSUS) if line.strip()][:count]:
+        t = Triangulation3.fromIsoSig(line.split()[0])
+        for i in xrange(subdivisions):
+            t.barycentricSubdivision()
+        sigs.append(t.isoSig())
+    return sigs
+
+
+def _stage_call(stage, sig, seed):
+    # the inputs of one stage for one triangulation (not timed), and the call to time
+    import hasse
+    import hasseDiagramCopy
+    from FacePoset import FacePoset
+    from regina import Triangulation3
+    t = Triangulation3.fromIsoSig(sig)
+    if stage == 'FacePoset.__init__':
+        return lambda: FacePoset(triangulation = t, dim = 3)
+    if stage in ('strip_multi_edges', 'randomised_morse_matching', 'dual_graph_links'):
+        fp = FacePoset(triangulation = t, dim = 3)
+        if stage == 'strip_multi_edges':
+            return fp.strip_multi_edges
+        fp.strip_multi_edges()
+        if stage == 'randomised_morse_matching':
+            return lambda: fp.randomised_morse_matching(seed)
+        return lambda: fp.dual_graph_links(3)
+    if stage == 'compute_hasse':
+        return lambda: hasse.compute_hasse(sig, 3)
+    if stage == 'collKnotCompl':
+        t, upward, downward = hasse.compute_hasse(sig, 3)
+        upward = [hasse.csr_rows(csr) for csr in upward]
+        downward = [hasse.csr_rows(csr) for csr in downward]
+        return lambda: hasseDiagramCopy.collKnotCompl(upward, downward, t, random.Random(seed))
+    if stage == 'SCBdry':
+        return lambda: hasseDiagramCopy.SCBdry(t)
+    if stage == 'SCBdryOp':
+        result = hasseDiagramCopy.SCComputeIsoSig(sig, 1, seed)
+        bdrys = hasseDiagramCopy.SCBdry(t)
+        critical = result['critical']
+        return lambda: hasseDiagramCopy.SCBdryOp(result['Morse'], critical[2], critical[1], t, bdrys)
+    raise ValueError('unknown stage ' + stage)
+
+
+def _status_megabytes(field):
+    # a line of /proc/self/status in MB: VmRSS the current RSS, VmHWM its high-water mark
+    try:
+        for line in open('/proc/self/status'):
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024.0
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def _reset_peak():
+    # sets the high-water mark to the current RSS (Linux 4.0 and later), True if it could
+    try:
+        handle = open('/proc/self/clear_refs', 'w')
+        handle.write('5')
+        handle.close()
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def _measure_stage(stage, sigs, seed, conn):
+    # runs in its own process: imports the modules and builds the inputs of every call first, then takes
+    # the RSS as the baseline and times the calls, seeded with seed + the number of the triangulation.
+    # Sends the seconds, the high-water mark of the RSS during the calls minus the baseline (None where the
+    # mark cannot be reset, since it would include the imports and the memory shared with the parent) and
+    # the RSS after the calls minus the baseline
+    calls = [_stage_call(stage, sig, seed + i) for i, sig in enumerate(sigs)]
+    gc.collect()
+    start = _status_megabytes('VmRSS')
+    reset = _reset_peak()
+    seconds = []
+    for call in calls:
+        begin = time.time()
+        call()
+        seconds.append(time.time() - begin)
+    peak = _status_megabytes('VmHWM')
+    end = _status_megabytes('VmRSS')
+    if start is None:
+        conn.send((seconds, None, None))
+    else:
+        conn.send((seconds, peak - start if reset and peak is not None else None,
+                   end - start if end is not None else None))
+    conn.close()
+
+
+def percentile(values, q):
+    """
+    The q-th percentile (nearest rank) of a list of numbers.
+    """
+    ordered = sorted(values)
+    rank = int(math.ceil(q / 100.0 * len(ordered))) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+def bench_suite(count = 500, subdivided = 20, seed = 0):
+    """
+    Times the SUITE_STAGES on two inputs: the first count triangulations of 5.sig ('5.sig') and the first
+    subdivided of them barycentrically subdivided once ('5.sig subdivided'). Each stage runs in a forked
+    process. Returns {input: {stage: statistics}}, with the number of triangulations ('items'),
+    triangulations per second of stage time ('throughput'), the 50th and 99th percentile of the time per
+    triangulation in ms ('p50_ms', 'p99_ms'), and in MB the peak RSS during the stage ('peak_mb') and the
+    RSS left after it ('growth_mb'), both above the RSS of the process once the modules are imported and the
+    inputs built (peak_mb is None where the kernel cannot reset the high-water mark).
+    """
+    inputs = [('5.sig', suite_inputs(count))]
+    if subdivided > 0:
+        inputs.append(('5.sig subdivided', suite_inputs(subdivided, 1)))
+    results = {}
+    for name, sigs in inputs:
+        results[name] = {}
+        for stage in SUITE_STAGES:
+            parent, child = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target = _measure_stage, args = (stage, sigs, seed, child))
+            worker.start()
+            child.close()
+            seconds, peak, growth = parent.recv()
+            worker.join()
+            total = sum(seconds)
+            results[name][stage] = {'items': len(sigs),
+                                    'throughput': len(sigs) / total if total > 0 else None,
+                                    'p50_ms': 1000 * percentile(seconds, 50),
+                                    'p99_ms': 1000 * percentile(seconds, 99),
+                                    'peak_mb': peak,
+                                    'growth_mb': growth}
+    return results
+
+
+def suite_regressions(results, baseline, tolerance = 0.25, memory = True):
+    """
+    Compares bench_suite results with a saved baseline (the same form). Returns a list of (input, stage,
+    metric, baseline value, new value) for every throughput that dropped, or time per triangulation (p50,
+    p99, ignored below 0.01 ms) or peak memory (ignored below 1 MB) that grew, by more than the fraction
+    tolerance. memory = False compares the times only.
+    """
+    regressions = []
+    for name in sorted(results):
+        for stage in SUITE_STAGES:
+            new = results[name].get(stage)
+            old = baseline.get(name, {}).get(stage)
+            if new is None or old is None:
+                continue
+            for metric in ['throughput', 'p50_ms', 'p99_ms'] + (['peak_mb'] if memory else []):
+                if old.get(metric) is None or new.get(metric) is None:
+                    continue
+                if metric == 'throughput':
+                    worse = new[metric] < old[metric] * (1 - tolerance)
+                elif metric.endswith('_ms') and max(old[metric], new[metric]) < 0.01:
+                    # below the resolution of the timer
+                    worse = False
+                elif metric == 'peak_mb' and max(old[metric], new[metric]) < 1:
+                    # allocator noise
+                    worse = False
+                else:
+                    worse = new[metric] > old[metric] * (1 + tolerance)
+                if worse:
+                    regressions.append((name, stage, metric, old[metric], new[metric]))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'benchmarks for the census scripts')
+    parser.add_argument('benchmark', choices = ['io', 'paths', 'hasse', 'strategies', 'suite'])
+    parser.add_argument('--lines', type = int, default = None,
+                        help = 'number of census lines (io: generated, default 2000000; paths: read from 5.sig, default all; suite: default 500)')
+    parser.add_argument('--subdivisions', type = int, default = 0,
+                        help = 'paths, hasse, strategies: barycentric subdivisions of each triangulation (default: %(default)s)')
+    parser.add_argument('--dimension', type = int, default = 3, choices = [3, 4],
+                        help = 'hasse, strategies: dimension of the triangulations (default: %(default)s)')
+    parser.add_argument('--census', default = None,
+                        help = 'hasse, strategies: census file of isoSigs (default: 5.sig, or the example 4-manifolds)')
+    parser.add_argument('--subdivided-lines', type = int, default = 20,
+                        help = 'suite: number of 5.sig triangulations also timed subdivided once (default: %(default)s)')
+    parser.add_argument('--seed', type = int, default = 0,
+                        help = 'suite: seed of the collapses and matchings of the first triangulation (default: %(default)s)')
+    parser.add_argument('--baseline', default = None,
+                        help = 'suite: JSON baseline to flag regressions against')
+    parser.add_argument('--save-baseline', default = None,
+                        help = 'suite: save the results as a JSON baseline')
+    parser.add_argument('--tolerance', type = float, default = 0.25,
+                        help = 'suite: relative change flagged as a regression (default: %(default)s)')
+    options = parser.parse_args()
+
+    if options.benchmark == 'io':
+        print '%-34s %10s %14s' % ('path', 'seconds', 'lines/s')
+        for name, seconds, rate in bench_io(options.lines or 2000000):
+            print '%-34s %10.2f %14.0f' % (name, seconds, rate)
+    elif options.benchmark == 'paths':
+        results, differ = bench_paths(options.lines or 0, options.subdivisions)
+        print '%-34s %10s %14s' % ('boundary operator', 'seconds', 'triangulations/s')
+        for name, seconds, rate in results:
+            print '%-34s %10.3f %14.1f' % (name, seconds, rate)
+        print 'operators differing:', differ
+    elif options.benchmark == 'hasse':
+        results, differ = bench_hasse(options.lines or 0, options.dimension, options.census, options.subdivisions)
+        print '%-34s %10s %14s' % ('Hasse diagram', 'seconds', 'triangulations/s')
+        for name, seconds, rate in results:
+            print '%-34s %10.3f %14.1f' % (name, seconds, rate)
+        print 'diagrams differing:', differ
+    elif options.benchmark == 'strategies':
+        results = bench_strategies(options.lines or 0, options.dimension, options.census, options.subdivisions)
+        print '%-12s %10s %16s %10s %10s %10s  %s' % ('strategy', 'seconds', 'triangulations/s', 'critical',
+                                                     'mean', 'fewest', 'per dimension')
+        for name, seconds, rate, total, per_dimension, fewest in results:
+            print '%-12s %10.3f %16.1f %10d %10.3f %10d  %s' % (name, seconds, rate, total, total / (rate * seconds),
+                                                               fewest, per_dimension)
+    elif options.benchmark == 'suite':
+        results = bench_suite(options.lines or 500, options.subdivided_lines, options.seed)
+        print '%-18s %-26s %8s %16s %10s %10s %10s %10s' % ('input', 'stage', 'items', 'triangulations/s',
+                                                             'p50 ms', 'p99 ms', 'peak MB', 'growth MB')
+        for name in sorted(results):
+            for stage in SUITE_STAGES:
+                r = results[name][stage]
+                print '%-18s %-26s %8d %16.1f %10.3f %10.3f %10.1f %10.1f' % (name, stage, r['items'],
+                    r['throughput'] or 0, r['p50_ms'], r['p99_ms'], r['peak_mb'] or 0, r['growth_mb'] or 0)
+        if options.save_baseline is not None:
+            handle = open(options.save_baseline, 'w')
+            json.dump({'version': 2, 'lines': options.lines or 500, 'subdivided_lines': options.subdivided_lines,
+                       'seed': options.seed, 'results': results}, handle, indent = 1, sort_keys = True)
+            handle.close()
+        if options.baseline is not None:
+            baseline = json.load(open(options.baseline))
+            for key, value in [('lines', options.lines or 500), ('subdivided_lines', options.subdivided_lines),
+                               ('seed', options.seed)]:
+                if baseline.get(key) != value:
+                    print 'note: the baseline has %s = %s, this run %s' % (key, baseline.get(key), value)
+            # the peak memory of a version 1 baseline is that of the whole process, shared pages included
+            memory = baseline.get('version', 1) >= 2
+            if not memory:
+                print 'note: the baseline predates the per-stage peak memory, comparing times only'
+            regressions = suite_regressions(results, baseline['results'], options.tolerance, memory)
+            for name, stage, metric, old, new in regressions:
+                print 'REGRESSION %s / %s: %s %.3f -> %.3f' % (name, stage, metric, old, new)
+            if not regressions:
+                print 'no regressions against', options.baseline
+            else:
+                sys.exit(1)
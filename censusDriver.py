@@ -0,0 +1,577 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Parallel driver for the census scripts (hasseDiagramCopy.py, genExamples.py)
+#
+# The scripts turn one isoSig line into one block of output text. run_census
+# hands the lines, in chunks, to long-lived worker processes, so Regina and
+# the calling script are imported once per worker and not once per line.
+# Results come back in input order, or as they complete. The workers are
+# supervised: one that dies, or runs over the time or memory budget of a
+# line (--time-budget, --memory-budget), is killed and replaced, and the
+# line is skipped and recorded with its pipeline stage in a quarantine file,
+# while the other workers go on. The memory budget is on the growth of the
+# RSS during the line, and a worker holding on to more than the budget since
+# it started is replaced between chunks, before it gets more lines.
+#
+# drive_census runs a whole census with the options added by
+# add_driver_options: it reads the input, writes the results and saves a
+# checkpoint every --checkpoint-every lines, from which --resume continues.
+# With --cache, results are also kept in a persistent ResultCache keyed by
+# isoSig and the script's parameters, and looked up before any Regina work.
+# With --stats, the stage times and counters of censusStats.STATS, summed
+# over all workers, are written to a JSON sidecar as the run goes.
+###############################################################################
+
+import os
+
+import sys
+
+# checkpoint files
+import json
+
+import itertools
+
+import multiprocessing
+
+import traceback
+
+import time
+
+# the supervisor waits on the pipes of the workers
+import select
+
+from collections import deque
+
+# compressed census input and buffered output
+from censusIO import open_census, CensusWriter
+
+# persistent results across runs
+from resultCache import ResultCache
+
+# the workers report the pipeline stage of the current line
+from censusPipeline import set_stage_listener
+
+# stage timers and counters of the workers (--stats)
+from censusStats import STATS
+
+
+class CensusWorkerError(Exception):
+    pass
+
+
+class CensusDriverError(Exception):
+    pass
+
+
+class Budget(object):
+    """
+    Per-line limits of a supervised run_census: seconds of wall-clock time and megabytes of resident memory
+    (RSS, read from /proc, so only enforced on Linux) per line; None is no limit. The memory is that the
+    worker's RSS grew by since the line started, as Python seldom gives freed memory back and a worker
+    keeps what its heaviest line took. A worker exceeding them, or dying, is killed and replaced, and its
+    line is skipped (its result is None) and recorded as a JSON line in the quarantine file (if given) and
+    on stderr, with the pipeline stage it was in (see censusPipeline.set_stage_listener). A worker whose
+    RSS is over megabytes above what it started with is replaced before it is sent more lines, and no line
+    is quarantined.
+    """
+    def __init__(self, seconds = None, megabytes = None, quarantine = None):
+        self.seconds = seconds
+        self.megabytes = megabytes
+        self.quarantine = quarantine
+        self.quarantined = 0
+
+    def record(self, entry):
+        self.quarantined += 1
+        text = json.dumps(entry, sort_keys = True)
+        print >>sys.stderr, 'quarantined:', text
+        if self.quarantine is not None:
+            handle = open(self.quarantine, 'a')
+            handle.write(text + '\n')
+            handle.close()
+
+
+# a worker is checked this often (seconds) against the budget
+POLL_INTERVAL = 0.05
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _rss_megabytes(pid):
+    try:
+        handle = open('/proc/%d/statm' % pid)
+        try:
+            return int(handle.read().split()[1]) * _PAGE_SIZE / float(1 << 20)
+        finally:
+            handle.close()
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def _supervised_worker(conn, process, args, stage, baseline):
+    # runs in the worker process: processes the chunks sent by the supervisor and sends back each result as
+    # soon as it is done, so that a killed worker only loses the line it is working on. stage holds the
+    # pipeline stage of the current line and baseline (if not None) the RSS at its start. With STATS
+    # enabled, what it recorded for the line goes along.
+    def listen(name):
+        stage.value = name[:len(stage) - 1]
+    set_stage_listener(listen)
+    # a replacement worker is forked from the supervisor, whose STATS holds the totals so far
+    STATS.reset()
+    while True:
+        chunk = conn.recv()
+        if chunk is None:
+            return
+        for lineno, line in chunk:
+            stage.value = ''
+            if baseline is not None:
+                baseline.value = _rss_megabytes(os.getpid()) or 0.0
+            try:
+                result = process(line, *args)
+            except Exception:
+                conn.send(('failure', lineno, traceback.format_exc(), None))
+                break
+            conn.send(('result', lineno, result, STATS.take() if STATS.enabled else None))
+
+
+class _Worker(object):
+    """
+    Supervisor side of one worker process: its pipe, the lines sent to it and not answered yet, and when
+    it started on the first of them. With measure (a memory budget), the RSS it started with (initial)
+    and at the start of the current line (baseline, shared with the worker) too.
+    """
+    def __init__(self, process, args, measure = False):
+        self.conn, child = multiprocessing.Pipe()
+        self.stage = multiprocessing.Array('c', 64, lock = False)
+        self.baseline = multiprocessing.Value('d', 0.0, lock = False) if measure else None
+        self.process = multiprocessing.Process(target = _supervised_worker,
+                                               args = (child, process, args, self.stage, self.baseline))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self.chunk = deque()
+        self.started = None
+        self.initial = None
+
+    def send(self, chunk):
+        if self.baseline is not None:
+            # the worker is idle, and sets it again at each line
+            self.baseline.value = _rss_megabytes(self.process.pid) or 0.0
+            if self.initial is None:
+                self.initial = self.baseline.value
+        self.chunk.extend(chunk)
+        self.started = time.time()
+        self.conn.send(chunk)
+
+    def retained(self):
+        # megabytes of RSS the idle worker holds beyond what it started with, None if not measured
+        if self.initial is None:
+            return None
+        rss = _rss_megabytes(self.process.pid)
+        return rss - self.initial if rss is not None else None
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+class _Supervisor(object):
+    """
+    run_census with supervised worker processes (see there). lines are (line number, line) pairs; results
+    are collected in ready until they are yielded. in_flight counts the lines read but not yet yielded, and
+    no more input is read while it is at its bound, so an ordered run waiting for one slow line does not
+    buffer the rest of the census.
+    """
+    def __init__(self, lines, process, args, workers, ordered, chunksize, budget):
+        self.lines = lines
+        self.process = process
+        self.args = args
+        self.ordered = ordered
+        self.chunksize = chunksize
+        self.budget = budget if budget is not None else Budget()
+        self.measure = self.budget.megabytes is not None
+        self.pool = [_Worker(process, args, self.measure) for i in xrange(workers)]
+        self.requeued = deque()
+        self.ready = {}
+        self.next_lineno = None
+        self.max_in_flight = 4 * workers * chunksize
+        self.in_flight = 0
+        self.exhausted = False
+
+    def receive(self, worker):
+        # collects what worker has sent so far; False if its pipe is closed
+        try:
+            while worker.chunk and worker.conn.poll():
+                kind, lineno, value, stats = worker.conn.recv()
+                if kind == 'failure':
+                    raise CensusWorkerError('line '+str(lineno)+' failed in a worker:\n'+value)
+                if stats is not None:
+                    STATS.merge(stats)
+                worker.chunk.popleft()
+                worker.started = time.time()
+                self.ready[lineno] = value
+        except (EOFError, IOError):
+            return False
+        return True
+
+    def replace(self, worker, reason = None, extra = None):
+        # kills worker and starts a new one. With a reason, the line worker is on is quarantined, and the rest
+        # of its chunk is handed to the next idle worker.
+        elapsed = time.time() - (worker.started or time.time())
+        stage = worker.stage.value or 'process'
+        self.receive(worker)
+        worker.kill()
+        self.pool[self.pool.index(worker)] = _Worker(self.process, self.args, self.measure)
+        if reason is None or not worker.chunk:
+            return
+        lineno, line = worker.chunk.popleft()
+        fields = line.split()
+        entry = {'line': lineno, 'isoSig': fields[0] if fields else '', 'stage': stage, 'reason': reason,
+                 'seconds': round(elapsed, 3)}
+        if extra:
+            entry.update(extra)
+        self.budget.record(entry)
+        self.ready[lineno] = None
+        self.requeued.extendleft(reversed(worker.chunk))
+
+    def next_chunk(self):
+        chunk = []
+        while len(chunk) < self.chunksize:
+            if self.requeued:
+                chunk.append(self.requeued.popleft())
+                continue
+            if self.exhausted or self.in_flight >= self.max_in_flight:
+                break
+            try:
+                lineno, line = next(self.lines)
+            except StopIteration:
+                self.exhausted = True
+                break
+            if self.next_lineno is None:
+                self.next_lineno = lineno
+            self.in_flight += 1
+            if line is None:
+                self.ready[lineno] = None
+            else:
+                chunk.append((lineno, line))
+        return chunk
+
+    def check(self, worker):
+        # replaces worker if it died or is over its budget on the current line
+        budget = self.budget
+        if not worker.process.is_alive():
+            self.replace(worker, 'worker died (exit code '+str(worker.process.exitcode)+')')
+        elif budget.seconds is not None and time.time() - worker.started > budget.seconds:
+            self.replace(worker, 'time budget of '+str(budget.seconds)+' s exceeded')
+        elif budget.megabytes is not None:
+            rss = _rss_megabytes(worker.process.pid)
+            if rss is not None and worker.baseline.value and rss - worker.baseline.value > budget.megabytes:
+                self.replace(worker, 'memory budget of '+str(budget.megabytes)+' MB exceeded',
+                             {'megabytes': round(rss - worker.baseline.value, 1), 'rss': round(rss, 1)})
+
+    def results(self):
+        try:
+            while True:
+                for position in xrange(len(self.pool)):
+                    worker = self.pool[position]
+                    if worker.chunk:
+                        continue
+                    if not worker.process.is_alive():
+                        # died between lines
+                        self.replace(worker)
+                        worker = self.pool[position]
+                    chunk = self.next_chunk()
+                    if chunk:
+                        retained = worker.retained() if self.measure else None
+                        if retained is not None and retained > self.budget.megabytes:
+                            # recycled before an ordinary line is charged with what an earlier one left
+                            self.replace(worker)
+                            worker = self.pool[position]
+                            STATS.count('workers recycled')
+                        worker.send(chunk)
+                busy = [worker for worker in self.pool if worker.chunk]
+                if busy:
+                    readable = select.select([worker.conn for worker in busy], [], [], POLL_INTERVAL)[0]
+                    for worker in busy:
+                        if worker.conn in readable:
+                            self.receive(worker)
+                        if worker.chunk:
+                            self.check(worker)
+                if self.ordered:
+                    while self.next_lineno in self.ready:
+                        lineno = self.next_lineno
+                        self.next_lineno += 1
+                        self.in_flight -= 1
+                        yield lineno, self.ready.pop(lineno)
+                else:
+                    for lineno in self.ready.keys():
+                        self.in_flight -= 1
+                        yield lineno, self.ready.pop(lineno)
+                if self.exhausted and not self.requeued and not self.ready and not busy:
+                    break
+            for worker in self.pool:
+                worker.conn.send(None)
+                worker.process.join()
+        finally:
+            for worker in self.pool:
+                worker.kill()
+
+
+def _skipping(numbered, skip):
+    for lineno, line in numbered:
+        if lineno in skip:
+            yield lineno, None
+        else:
+            yield lineno, line
+
+
+def run_census(lines, process, args = (), workers = 1, ordered = True, max_lines = 0, chunksize = 8,
+               first_lineno = 1, skip = (), budget = None):
+    """
+    Calls process(line, *args) for each line of the iterable lines and yields (line_number, result) pairs,
+    with line numbers starting at first_lineno. max_lines > 0 stops after that many lines. Lines whose
+    number is in skip are not processed and yield None as their result.
+
+    With workers > 1, or a Budget, the lines are processed by supervised worker processes. Lines are sent
+    in chunks of chunksize lines and each result comes back as soon as it is done; at most 4 chunks per
+    worker are in flight, so the input is read lazily however long it is. A worker that dies (even through
+    os._exit), or exceeds the time or memory budget on a line, is replaced: that line yields None and is
+    quarantined, and the rest of its chunk goes on in the new worker. An idle worker holding more memory
+    than the budget since it started is replaced before its next chunk. With ordered = False results are
+    yielded as soon as they are done, so the caller should tag them by line number.
+    """
+    numbered = enumerate(lines, first_lineno)
+    if max_lines > 0:
+        numbered = itertools.islice(numbered, max_lines)
+    if skip:
+        skip = set(skip)
+        numbered = _skipping(numbered, skip)
+
+    if workers <= 1 and budget is None:
+        for lineno, line in numbered:
+            if line is None:
+                yield lineno, None
+            else:
+                yield lineno, process(line, *args)
+        return
+
+    supervisor = _Supervisor(iter(numbered), process, args, max(workers, 1), ordered, chunksize, budget)
+    for result in supervisor.results():
+        yield result
+
+
+def add_driver_options(parser, max_lines = 0):
+    """
+    Adds the input/output options (-i/--input, -o/--output, --flush-every), the -j/--workers,
+    -u/--unordered and -n/--max-lines options used by run_census, the checkpoint (--checkpoint,
+    --checkpoint-every, --resume), cache (--cache, --cache-size), budget (--time-budget,
+    --memory-budget, --quarantine) and stats (--stats, --stats-every) options used by drive_census to an
+    argparse.ArgumentParser.
+    """
+    parser.add_argument('-i', '--input', default = '-',
+                        help = 'census file (.sig, .sig.bz2 or .sig.gz), default: stdin')
+    parser.add_argument('-o', '--output', default = '-',
+                        help = 'output file, compressed if it ends in .bz2 or .gz, default: stdout')
+    parser.add_argument('--flush-every', type = int, default = 1000,
+                        help = 'write the output in batches of this many results (default: %(default)s)')
+    parser.add_argument('-j', '--workers', type = int, default = 1,
+                        help = 'number of worker processes (default: 1, no pool)')
+    parser.add_argument('-u', '--unordered', action = 'store_true',
+                        help = 'write results as they complete, each tagged with its input line number')
+    parser.add_argument('-n', '--max-lines', type = int, default = max_lines,
+                        help = 'stop after this many input lines, 0 for the whole input (default: %(default)s)')
+    parser.add_argument('--checkpoint', default = None,
+                        help = 'checkpoint file (default: <output>.checkpoint when writing to a file)')
+    parser.add_argument('--checkpoint-every', type = int, default = 1000,
+                        help = 'save a checkpoint every this many lines, 0 for none (default: %(default)s)')
+    parser.add_argument('--resume', action = 'store_true',
+                        help = 'continue from the checkpoint of an earlier run with the same input and output')
+    parser.add_argument('--cache', default = None,
+                        help = 'SQLite file caching the results per isoSig and parameters across runs')
+    parser.add_argument('--cache-size', type = int, default = 1024,
+                        help = 'evict the least recently used results above this many MB, 0 for no bound (default: %(default)s)')
+    parser.add_argument('--time-budget', type = float, default = None,
+                        help = 'kill and quarantine a line after this many seconds (supervised workers)')
+    parser.add_argument('--memory-budget', type = float, default = None,
+                        help = 'kill and quarantine a line whose worker grows by more than this many MB of RSS during it (supervised workers)')
+    parser.add_argument('--quarantine', default = None,
+                        help = 'JSON Lines file of the quarantined lines (default: <output>.quarantine when writing to a file)')
+    parser.add_argument('--stats', default = None,
+                        help = 'JSON file of the cumulative time per stage and the hot-path counters (off by default)')
+    parser.add_argument('--stats-every', type = int, default = 1000,
+                        help = 'rewrite the --stats file every this many lines, 0 for only at the end (default: %(default)s)')
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    return json.load(open(path))
+
+
+def save_checkpoint(path, state):
+    # write and rename, so a crash while saving leaves the previous checkpoint intact
+    tmp = path + '.tmp'
+    handle = open(tmp, 'w')
+    json.dump(state, handle)
+    handle.flush()
+    os.fsync(handle.fileno())
+    handle.close()
+    os.rename(tmp, path)
+
+
+def _tag_text(lineno, text):
+    return '# line '+str(lineno)+'\n'+text
+
+
+def drive_census(options, process, args = (), render = None, cache_params = None, tag = None):
+    """
+    Runs process(line, *args) over the census described by the options of add_driver_options and writes
+    the returned text blocks to the output. If render is given, process returns a result object and
+    render(result) the text to write. In unordered runs each text is written as tag(line number, text),
+    which by default (tag = None) puts a '# line n' comment line in front of it.
+
+    With options.cache, results are stored in a ResultCache under the isoSig and cache_params (which
+    must hold every parameter the result depends on, and a version to bump when the result format
+    changes). Lines found in the cache are rendered from it and never sent to process. Hit and miss
+    counts are printed to stderr at the end.
+
+    Every options.checkpoint_every lines a checkpoint is saved, holding the input byte offset after the
+    last line whose result (and all before it) is written, the number of such lines, and the byte position
+    of the output file at that point. Results of later lines that are already written (unordered runs) are
+    listed in 'done_after'. With options.resume the input is opened at the saved offset (plain files are
+    seeked, compressed ones are skipped without decoding a single isoSig), the output is cut back to the
+    saved position and the run goes on from there.
+
+    With options.time_budget or options.memory_budget every line runs under that Budget in a supervised
+    worker; lines over budget are skipped (nothing is written for them) and recorded in the quarantine
+    file, options.quarantine or <output>.quarantine.
+
+    With options.stats, censusStats.STATS is enabled (before the workers start, so they inherit it) and
+    its totals are written to that file every options.stats_every lines and at the end. Lines found in
+    the cache are not processed and add nothing to the stage times.
+    """
+    ordered = not options.unordered
+    if tag is None:
+        tag = _tag_text
+    checkpoint_path = options.checkpoint
+    if checkpoint_path is None and options.output != '-':
+        checkpoint_path = options.output + '.checkpoint'
+    if options.checkpoint_every <= 0:
+        checkpoint_path = None
+
+    state = {'input': options.input, 'output': options.output,
+             'input_offset': 0, 'lines': 0, 'output_offset': None, 'done_after': []}
+    if options.resume:
+        if options.output == '-' or checkpoint_path is None:
+            raise CensusDriverError('--resume needs an output file and checkpoints')
+        saved = load_checkpoint(checkpoint_path)
+        if saved is not None:
+            if saved['input'] != options.input or saved['output'] != options.output:
+                raise CensusDriverError('checkpoint '+checkpoint_path+' belongs to a run on '+saved['input']+' -> '+saved['output'])
+            state = saved
+
+    max_lines = options.max_lines
+    if max_lines > 0:
+        max_lines -= state['lines']
+        if max_lines <= 0:
+            return
+
+    cache = None
+    if options.cache is not None:
+        if cache_params is None:
+            raise CensusDriverError('this script does not support --cache')
+        max_bytes = None
+        if options.cache_size > 0:
+            max_bytes = options.cache_size << 20
+        cache = ResultCache(options.cache, max_bytes)
+
+    budget = None
+    if options.time_budget is not None or options.memory_budget is not None:
+        quarantine = options.quarantine
+        if quarantine is None and options.output != '-':
+            quarantine = options.output + '.quarantine'
+        budget = Budget(options.time_budget, options.memory_budget, quarantine)
+
+    if options.stats is not None:
+        STATS.enable()
+
+    reader = open_census(options.input, state['input_offset'])
+    writer = CensusWriter(options.output, options.flush_every, resume_at = state['output_offset'])
+
+    # input offset after each line read but not yet covered by a checkpoint
+    line_ends = {}
+    # results found in the cache, and the isoSigs of the lines to store once processed
+    cached = {}
+    missed = {}
+    def tracked_lines():
+        lineno = state['lines']
+        for line in reader:
+            lineno += 1
+            line_ends[lineno] = reader.offset
+            if cache is not None and lineno not in done and line.strip():
+                result = cache.get(line, cache_params)
+                if result is not None:
+                    cached[lineno] = result
+                    line = None
+                else:
+                    missed[lineno] = line
+            yield line
+
+    def save():
+        if cache is not None:
+            cache.commit()
+        state['output_offset'] = writer.checkpoint()
+        state['done_after'] = sorted(done)
+        save_checkpoint(checkpoint_path, state)
+
+    # all lines up to state['lines'] are written, done holds the written lines after it
+    done = set(state['done_after'])
+    since_checkpoint = 0
+    since_stats = 0
+    lines_done = 0
+    results = run_census(tracked_lines(), process, args, options.workers, ordered, max_lines,
+                         first_lineno = state['lines'] + 1, skip = done, budget = budget)
+    for lineno, result in results:
+        if lineno in cached:
+            result = cached.pop(lineno)
+        elif lineno in missed:
+            line = missed.pop(lineno)
+            # quarantined lines have no result, and are tried again by the next run
+            if result is not None:
+                cache.put(line, cache_params, result)
+        if render is not None and result is not None:
+            text = render(result)
+        else:
+            text = result
+        if text:
+            if not ordered:
+                text = tag(lineno, text)
+            writer.write(text)
+        done.add(lineno)
+        while state['lines'] + 1 in done:
+            state['lines'] += 1
+            done.discard(state['lines'])
+            state['input_offset'] = line_ends.pop(state['lines'])
+        since_checkpoint += 1
+        if checkpoint_path is not None and since_checkpoint >= options.checkpoint_every:
+            save()
+            since_checkpoint = 0
+        lines_done += 1
+        since_stats += 1
+        if options.stats is not None and options.stats_every > 0 and since_stats >= options.stats_every:
+            STATS.write(options.stats, lines_done)
+            since_stats = 0
+    if checkpoint_path is not None:
+        save()
+    if options.stats is not None:
+        STATS.write(options.stats, lines_done)
+    writer.close()
+    reader.close()
+    if cache is not None:
+        stats = cache.stats()
+        cache.close()
+        print >>sys.stderr, 'cache: %(hits)d hits, %(misses)d misses, %(evictions)d evicted, %(entries)d entries' % stats
+    if budget is not None and budget.quarantined:
+        print >>sys.stderr, 'quarantined: %d lines' % budget.quarantined + (' (see ' + budget.quarantine + ')' if budget.quarantine else '')
@@ -0,0 +1,208 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Streaming input and output for census files
+#
+# open_census reads isoSig lines from .sig, .sig.bz2 or .sig.gz files (or
+# stdin) with chunked decompression, so no bzcat pipe is needed.
+# CensusWriter collects output text in memory and writes it in batches,
+# compressing on the fly when the output name ends in .bz2 or .gz.
+###############################################################################
+
+import os
+
+import sys
+
+import bz2
+
+import zlib
+
+# size of the raw chunks read from disk and of the output batches
+CHUNK_SIZE = 1 << 20
+
+
+class CensusReader(object):
+    """
+    Iterates over the lines of a census file. Compression is picked from the file name: '.bz2' and '.gz'
+    files are decompressed chunk by chunk (concatenated streams, as written by pbzip2 or pigz, are
+    supported), anything else is read as plain text. path = '-' or None reads stdin.
+
+    offset is the number of (uncompressed) bytes of the lines yielded so far. Passing start = offset of an
+    earlier run continues after that line: plain files are seeked there directly, compressed files and stdin
+    are decompressed and skipped up to it.
+    """
+    def __init__(self, path = None, chunk_size = CHUNK_SIZE, start = 0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.start = start
+        self.offset = start
+        if path is None or path == '-':
+            self.raw = sys.stdin
+            self.compression = None
+        else:
+            self.raw = open(path, 'rb')
+            if path.endswith('.bz2'):
+                self.compression = 'bz2'
+            elif path.endswith('.gz'):
+                self.compression = 'gz'
+            else:
+                self.compression = None
+
+    def _decompressor(self):
+        if self.compression == 'bz2':
+            return bz2.BZ2Decompressor()
+        # 16 + MAX_WBITS: expect a gzip header and trailer
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _blocks(self):
+        skip = self.start
+        if self.compression is None and self.raw is not sys.stdin:
+            self.raw.seek(skip)
+            skip = 0
+        for block in self._raw_blocks():
+            if skip >= len(block):
+                skip -= len(block)
+                continue
+            yield block[skip:]
+            skip = 0
+
+    def _raw_blocks(self):
+        if self.compression is None:
+            while True:
+                block = self.raw.read(self.chunk_size)
+                if not block:
+                    return
+                yield block
+        decompressor = self._decompressor()
+        while True:
+            data = self.raw.read(self.chunk_size)
+            if not data:
+                return
+            while data:
+                try:
+                    block = decompressor.decompress(data)
+                except EOFError:
+                    # the previous stream ended exactly at a chunk boundary
+                    decompressor = self._decompressor()
+                    block = decompressor.decompress(data)
+                if block:
+                    yield block
+                data = decompressor.unused_data
+                if data:
+                    # start of the next concatenated stream
+                    decompressor = self._decompressor()
+
+    def blocks(self):
+        """
+        Yields the (decompressed) data in chunks, for binary files. offset is not updated.
+        """
+        return self._blocks()
+
+    def __iter__(self):
+        rest = ''
+        for block in self._blocks():
+            lines = (rest + block).split('\n')
+            rest = lines.pop()
+            for line in lines:
+                self.offset += len(line) + 1
+                yield line + '\n'
+        if rest:
+            self.offset += len(rest)
+            yield rest
+
+    def close(self):
+        if self.raw is not sys.stdin:
+            self.raw.close()
+
+
+def open_census(path = None, start = 0):
+    return CensusReader(path, start = start)
+
+
+class CensusWriter(object):
+    """
+    Buffered, optionally compressing writer for the text produced by the census scripts.
+
+    Text passed to write() is kept in memory and written to the output every flush_every calls or
+    once CHUNK_SIZE characters have piled up, whichever comes first. Output names ending in '.bz2'
+    or '.gz' are compressed while writing; path = '-' or None writes (uncompressed) to stdout.
+
+    checkpoint() makes everything written so far complete on disk and returns the byte position in
+    the output file. Passing resume_at = that position reopens the file, drops whatever was written
+    after the checkpoint and appends from there.
+    """
+    def __init__(self, path = None, flush_every = 1000, level = 9, resume_at = None):
+        self.path = path
+        self.flush_every = flush_every
+        self.level = level
+        if path is None or path == '-':
+            self.raw = sys.stdout
+            self.compression = None
+        else:
+            if resume_at is None:
+                self.raw = open(path, 'wb')
+            else:
+                self.raw = open(path, 'r+b')
+                self.raw.truncate(resume_at)
+                self.raw.seek(resume_at)
+            if path.endswith('.bz2'):
+                self.compression = 'bz2'
+            elif path.endswith('.gz'):
+                self.compression = 'gz'
+            else:
+                self.compression = None
+        self.compressor = self._compressor()
+        self.pending = []
+        self.pending_size = 0
+        # characters written so far, before compression
+        self.position = 0
+
+    def _compressor(self):
+        if self.compression == 'bz2':
+            return bz2.BZ2Compressor(self.level)
+        if self.compression == 'gz':
+            return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return None
+
+    def write(self, text):
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if len(self.pending) >= self.flush_every or self.pending_size >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            text = ''.join(self.pending)
+            self.position += len(text)
+            self.pending = []
+            self.pending_size = 0
+            if self.compressor is not None:
+                text = self.compressor.compress(text)
+            self.raw.write(text)
+        self.raw.flush()
+
+    def checkpoint(self):
+        """
+        Flushes all pending text and returns the byte position in the output file (None for stdout).
+        A compressed stream is ended here and a new one started, so the file up to the returned position
+        decompresses on its own (readers handle the concatenated streams).
+        """
+        self.flush()
+        if self.raw is sys.stdout:
+            return None
+        if self.compressor is not None:
+            self.raw.write(self.compressor.flush())
+            self.compressor = self._compressor()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        return self.raw.tell()
+
+    def close(self):
+        self.flush()
+        if self.compressor is not None:
+            self.raw.write(self.compressor.flush())
+            self.compressor = None
+        if self.raw is not sys.stdout:
+            self.raw.close()
+        else:
+            self.raw.flush()
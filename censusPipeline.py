@@ -0,0 +1,247 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Staged processing of one census line, with cheap prefilters
+#
+# The census scripts run every triangulation through the same stages:
+#   decode -> Hasse -> collapse -> boundaries -> operator [-> normal surfaces]
+# A Pipeline runs them in order on an item (a dict that each stage adds its
+# results to), and after each stage the predicates attached to it: the
+# first predicate that fails rejects the item, so no later (costlier) stage
+# runs on it. The item records where it was rejected, and the main process
+# counts passes and rejects per stage from the results (tally, report), so
+# the counts are right with any number of workers and with cached results.
+# With censusStats.STATS enabled, process also adds the time of each stage.
+#
+# Stages, predicates and the pipeline are picklable (module-level functions
+# and small classes), so a pipeline can be passed to drive_census as an
+# argument of the script's process function.
+###############################################################################
+
+import sys
+
+import time
+
+# optional stage timers (--stats)
+from censusStats import STATS
+
+# called with the name of each stage as it starts (see set_stage_listener)
+_stage_listener = None
+
+
+def set_stage_listener(listener):
+    """
+    Makes Pipeline.process call listener(stage name) before each stage; None removes it. The supervised
+    workers of censusDriver use it to quarantine a line with the stage it was stuck in.
+    """
+    global _stage_listener
+    _stage_listener = listener
+
+
+class Stage(object):
+    """
+    One step of a Pipeline: run(item, *args) adds its results to the dict item. predicates are
+    callables item -> bool (False rejects the item), checked after run in order; they are named by
+    their name attribute, or their class name.
+    """
+    def __init__(self, name, run, args = (), predicates = ()):
+        self.name = name
+        self.run = run
+        self.args = tuple(args)
+        self.predicates = list(predicates)
+
+
+def predicate_name(predicate):
+    return getattr(predicate, 'name', None) or type(predicate).__name__
+
+
+class Pipeline(object):
+    """
+    Runs Stages in order on an item. process(item) stops at the first failing predicate and sets
+    item['rejected'] = [stage name, predicate name], or None if the item went through every stage.
+    tally(result) counts a processed item (in the main process), report() returns the counts as text.
+    """
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.passed = dict((stage.name, 0) for stage in self.stages)
+        self.rejected = dict((stage.name, {}) for stage in self.stages)
+
+    def stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError('no stage ' + name)
+
+    def add_predicate(self, name, predicate):
+        """
+        Attaches predicate to the stage called name; it runs after the predicates already there.
+        """
+        self.stage(name).predicates.append(predicate)
+
+    def process(self, item):
+        timed = STATS.enabled
+        for stage in self.stages:
+            if _stage_listener is not None:
+                _stage_listener(stage.name)
+            if timed:
+                started = time.time()
+            stage.run(item, *stage.args)
+            if timed:
+                STATS.add_time(stage.name, time.time() - started)
+            for predicate in stage.predicates:
+                if not predicate(item):
+                    item['rejected'] = [stage.name, predicate_name(predicate)]
+                    return item
+        item['rejected'] = None
+        return item
+
+    def tally(self, result):
+        """
+        Counts the result of process: the stages before the rejecting one (all stages if the item was not
+        rejected) as passed, the rejecting one as rejected by its predicate.
+        """
+        rejected = result.get('rejected')
+        for stage in self.stages:
+            if rejected is not None and stage.name == rejected[0]:
+                reasons = self.rejected[stage.name]
+                reasons[rejected[1]] = reasons.get(rejected[1], 0) + 1
+                return
+            self.passed[stage.name] += 1
+
+    def counting(self, render):
+        """
+        Wraps the render function of drive_census so that every result is tallied before rendering.
+        """
+        def render_counted(result):
+            if result is not None:
+                self.tally(result)
+            return render(result)
+        return render_counted
+
+    def report(self):
+        lines = []
+        for stage in self.stages:
+            reasons = self.rejected[stage.name]
+            line = 'stage %-16s %10d passed %10d rejected' % (stage.name, self.passed[stage.name],
+                                                             sum(reasons.values()))
+            if reasons:
+                line += ' (' + ', '.join('%s: %d' % item for item in sorted(reasons.items())) + ')'
+            lines.append(line)
+        return '\n'.join(lines) + '\n'
+
+    def print_report(self, out = None):
+        (out or sys.stderr).write(self.report())
+
+
+##########################################
+# predicates
+##########################################
+
+class MinCritical(object):
+    """
+    At least count critical cells of dimension dim (item['critical'], after the collapse).
+    """
+    def __init__(self, dim, count):
+        self.dim = dim
+        self.count = count
+        self.name = 'critical[%d] >= %d' % (dim, count)
+
+    def __call__(self, item):
+        return len(item['critical'][self.dim]) >= self.count
+
+
+class MaxCritical(object):
+    """
+    At most count critical cells of dimension dim.
+    """
+    def __init__(self, dim, count):
+        self.dim = dim
+        self.count = count
+        self.name = 'critical[%d] <= %d' % (dim, count)
+
+    def __call__(self, item):
+        return len(item['critical'][self.dim]) <= self.count
+
+
+def is_dunce_hat(boundary):
+    """
+    True if a triangle boundary [[edge, sign], ...] (the form of SCBdry) has the same edge three times:
+    a critical dunce hat, or a similar trivial example.
+    """
+    return boundary[0][0] == boundary[1][0] == boundary[2][0]
+
+
+class NoDunceHats(object):
+    """
+    None of the critical triangles is a dunce hat (item['bdrys'] and item['critical'], after the
+    boundaries).
+    """
+    name = 'dunce hat'
+
+    def __call__(self, item):
+        bdrys = item['bdrys']
+        for j in item['critical'][2]:
+            if is_dunce_hat(bdrys[j]):
+                return False
+        return True
+
+
+def h1_rank(t):
+    """
+    Rank of H_1 of a Regina triangulation, with the current API (homology) or the old one (getHomologyH1).
+    """
+    if hasattr(t, 'homology'):
+        return t.homology().rank()
+    return t.getHomologyH1().getRank()
+
+
+class H1Rank(object):
+    """
+    The rank of H_1 of item['t'] (after decoding) lies in [minimum, maximum]; None is no bound.
+    """
+    def __init__(self, minimum = None, maximum = None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.name = 'H1 rank'
+
+    def __call__(self, item):
+        rank = h1_rank(item['t'])
+        if self.minimum is not None and rank < self.minimum:
+            return False
+        return self.maximum is None or rank <= self.maximum
+
+
+def add_pipeline_options(parser):
+    """
+    Adds the predicate options of add_predicates (--min-critical-triangles, --max-critical-triangles,
+    --reject-dunce-hats, --min-h1-rank, --max-h1-rank) to an argparse.ArgumentParser.
+    """
+    parser.add_argument('--min-critical-triangles', type = int, default = None,
+                        help = 'drop triangulations with fewer critical triangles, right after the collapse')
+    parser.add_argument('--max-critical-triangles', type = int, default = None,
+                        help = 'drop triangulations with more critical triangles, right after the collapse')
+    parser.add_argument('--reject-dunce-hats', action = 'store_true',
+                        help = 'drop triangulations with a critical dunce hat, right after the boundaries')
+    parser.add_argument('--min-h1-rank', type = int, default = None,
+                        help = 'drop triangulations whose H_1 has a smaller rank, right after decoding')
+    parser.add_argument('--max-h1-rank', type = int, default = None,
+                        help = 'drop triangulations whose H_1 has a larger rank, right after decoding')
+
+
+def add_predicates(pipeline, options):
+    """
+    Attaches the predicates selected by the options of add_pipeline_options to the decode, collapse and
+    boundaries stages of pipeline. Returns the options as a dict, for the cache parameters.
+    """
+    if options.min_h1_rank is not None or options.max_h1_rank is not None:
+        pipeline.add_predicate('decode', H1Rank(options.min_h1_rank, options.max_h1_rank))
+    if options.min_critical_triangles is not None:
+        pipeline.add_predicate('collapse', MinCritical(2, options.min_critical_triangles))
+    if options.max_critical_triangles is not None:
+        pipeline.add_predicate('collapse', MaxCritical(2, options.max_critical_triangles))
+    if options.reject_dunce_hats:
+        pipeline.add_predicate('boundaries', NoDunceHats())
+    return {'minCriticalTriangles': options.min_critical_triangles,
+            'maxCriticalTriangles': options.max_critical_triangles,
+            'rejectDunceHats': options.reject_dunce_hats,
+            'minH1Rank': options.min_h1_rank, 'maxH1Rank': options.max_h1_rank}
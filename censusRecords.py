@@ -0,0 +1,432 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Machine-readable census results
+#
+# One record per triangulation, holding the data the census scripts print:
+# isoSig, downward Hasse diagram, Morse function, critical cells, oriented
+# boundaries of the triangles, induced boundary operator, (genExamples)
+# edge weights of the normal discs and (--homology) Betti numbers and
+# torsion coefficients. Records are written as JSON Lines ('jsonl') or in a
+# compact binary format ('binary'), and read back with read_records.
+#
+# ./censusRecords.py convert saved_eg.txt -o saved_eg.jsonl
+#   turns a text dump of hasseDiagramCopy.py or genExamples.py into records
+#   (streaming, compressed input and output as in censusIO)
+###############################################################################
+
+import sys
+
+import re
+
+import json
+
+import struct
+
+import argparse
+
+# compressed input and buffered output
+from censusIO import open_census, CensusWriter
+
+RECORD_FORMATS = ('jsonl', 'binary')
+
+
+class RecordFormatError(Exception):
+    pass
+
+
+def make_record(isosig, downward, morse, critical_triangles, critical_edges, boundaries, operator,
+                seed = None, edge_weights = None, homology = None):
+    """
+    Returns the record of one triangulation. downward is the downward Hasse diagram as built by the
+    census scripts (downward[3]: tetrahedra to triangles, downward[2]: triangles to edges), morse the
+    list of [dimension, index] pairs, boundaries the oriented boundaries [[i_0,s_0],[i_1,s_1],[i_2,s_2]]
+    of all triangles and operator the induced boundary operator (rows: critical edges, columns: critical
+    triangles). homology is (Betti numbers, torsion coefficients, complex) as returned by
+    morseComplex.triangulation_homology, complex ('morse' or 'simplicial') being the chain complex they
+    were computed on; the torsion coefficients are None if only the Betti numbers were computed. seed,
+    edge_weights and homology are left out of the record when None.
+    """
+    record = {'isoSig': isosig,
+              'downward': {'tetrahedra': downward[3], 'triangles': downward[2]},
+              'morse': morse,
+              'critical': {'triangles': critical_triangles, 'edges': critical_edges},
+              'boundaries': boundaries,
+              'operator': operator}
+    if seed is not None:
+        record['seed'] = seed
+    if edge_weights is not None:
+        record['edgeWeights'] = edge_weights
+    if homology is not None:
+        record['homology'] = {'betti': homology[0], 'torsion': homology[1]}
+        if len(homology) > 2:
+            record['homology']['complex'] = homology[2]
+    return record
+
+
+###############################################################################
+# JSON Lines
+###############################################################################
+
+def encode_jsonl(record):
+    return json.dumps(record, separators = (',', ':'), sort_keys = True) + '\n'
+
+
+def tag_jsonl(lineno, text):
+    # adds the input line number to an encoded record, for unordered runs
+    return '{"line":' + str(lineno) + ',' + text[1:]
+
+
+###############################################################################
+# binary: one frame per record
+#
+#   uint32 length of the rest of the frame
+#   int32  input line number, -1 if untagged
+#   uint8  flags (1: seed present, 2: edge weights present, 4: homology
+#          present, 8: homology computed on the simplicial chain complex
+#          instead of the Morse complex, 16: no torsion coefficients, only
+#          Betti numbers)
+#   int64  seed (only with flag 1)
+#   uint16 length of the isoSig, followed by the isoSig
+#   tables: downward tetrahedra, downward triangles, Morse function,
+#           critical triangles and edges (2 rows), boundaries (6 entries
+#           per row), operator, edge weights (only with flag 2), Betti
+#           numbers (1 row) and torsion coefficients (1 row per dimension)
+#           (only with flag 4, torsion coefficients not with flag 16)
+#
+# A table is uint8 width of the entries (1, 2, 4 or 8 bytes), uint8 width
+# of the row lengths (1, 2 or 4), uint32 number of rows, the length of each
+# row, then all entries, each in the smallest width that fits the table.
+# Integers are little-endian, entries signed and row lengths unsigned.
+###############################################################################
+
+_FRAME = struct.Struct('<IiB')
+
+_SEED = struct.Struct('<q')
+
+_SIG = struct.Struct('<H')
+
+_TABLE = struct.Struct('<BBI')
+
+# smallest signed / unsigned struct codes per width
+_SIGNED = ((1, 'b', 1 << 7), (2, 'h', 1 << 15), (4, 'i', 1 << 31), (8, 'q', 1 << 63))
+
+_UNSIGNED = ((1, 'B', 1 << 8), (2, 'H', 1 << 16), (4, 'I', 1 << 32))
+
+_CODES = dict([(width, code) for width, code, bound in _SIGNED])
+
+_LENGTH_CODES = dict([(width, code) for width, code, bound in _UNSIGNED])
+
+
+def _pack_table(rows):
+    values = [x for row in rows for x in row]
+    lengths = [len(row) for row in rows]
+    low = min(values) if values else 0
+    high = max(values) if values else 0
+    for width, code, bound in _SIGNED:
+        if -bound <= low and high < bound:
+            break
+    longest = max(lengths) if lengths else 0
+    for length_width, length_code, bound in _UNSIGNED:
+        if longest < bound:
+            break
+    return (_TABLE.pack(width, length_width, len(rows)) +
+            struct.pack('<%d%s' % (len(rows), length_code), *lengths) +
+            struct.pack('<%d%s' % (len(values), code), *values))
+
+
+def _unpack_table(data, pos):
+    width, length_width, count = _TABLE.unpack_from(data, pos)
+    pos += _TABLE.size
+    lengths = struct.unpack_from('<%d%s' % (count, _LENGTH_CODES[length_width]), data, pos)
+    pos += length_width * count
+    total = sum(lengths)
+    values = struct.unpack_from('<%d%s' % (total, _CODES[width]), data, pos)
+    pos += width * total
+    rows = []
+    start = 0
+    for length in lengths:
+        rows.append(list(values[start:start + length]))
+        start += length
+    return rows, pos
+
+
+def encode_binary(record, lineno = -1):
+    flags = 0
+    parts = []
+    if 'seed' in record:
+        flags |= 1
+        parts.append(_SEED.pack(record['seed']))
+    isosig = str(record['isoSig'])
+    parts.append(_SIG.pack(len(isosig)) + isosig)
+    parts.append(_pack_table(record['downward']['tetrahedra']))
+    parts.append(_pack_table(record['downward']['triangles']))
+    parts.append(_pack_table(record['morse']))
+    parts.append(_pack_table([record['critical']['triangles'], record['critical']['edges']]))
+    parts.append(_pack_table([[x for pair in bdry for x in pair] for bdry in record['boundaries']]))
+    parts.append(_pack_table(record['operator']))
+    if 'edgeWeights' in record:
+        flags |= 2
+        parts.append(_pack_table(record['edgeWeights']))
+    if 'homology' in record:
+        flags |= 4
+        if record['homology'].get('complex') == 'simplicial':
+            flags |= 8
+        parts.append(_pack_table([record['homology']['betti']]))
+        if record['homology']['torsion'] is None:
+            flags |= 16
+        else:
+            parts.append(_pack_table(record['homology']['torsion']))
+    body = ''.join(parts)
+    return _FRAME.pack(_FRAME.size - 4 + len(body), lineno, flags) + body
+
+
+def tag_binary(lineno, data):
+    # overwrites the line number of an encoded frame, for unordered runs
+    return data[:4] + struct.pack('<i', lineno) + data[8:]
+
+
+def decode_binary(data, pos = 0):
+    """
+    Decodes the frame starting at data[pos]. Returns the record and the position after the frame.
+    """
+    length, lineno, flags = _FRAME.unpack_from(data, pos)
+    end = pos + 4 + length
+    if end > len(data):
+        raise RecordFormatError('truncated record at byte '+str(pos))
+    pos += _FRAME.size
+    record = {}
+    if lineno >= 0:
+        record['line'] = lineno
+    if flags & 1:
+        record['seed'] = _SEED.unpack_from(data, pos)[0]
+        pos += _SEED.size
+    size = _SIG.unpack_from(data, pos)[0]
+    pos += _SIG.size
+    record['isoSig'] = data[pos:pos + size]
+    pos += size
+    tetrahedra, pos = _unpack_table(data, pos)
+    triangles, pos = _unpack_table(data, pos)
+    record['downward'] = {'tetrahedra': tetrahedra, 'triangles': triangles}
+    record['morse'], pos = _unpack_table(data, pos)
+    critical, pos = _unpack_table(data, pos)
+    record['critical'] = {'triangles': critical[0], 'edges': critical[1]}
+    boundaries, pos = _unpack_table(data, pos)
+    record['boundaries'] = [[row[0:2], row[2:4], row[4:6]] for row in boundaries]
+    record['operator'], pos = _unpack_table(data, pos)
+    if flags & 2:
+        record['edgeWeights'], pos = _unpack_table(data, pos)
+    if flags & 4:
+        betti, pos = _unpack_table(data, pos)
+        torsion = None
+        if not flags & 16:
+            torsion, pos = _unpack_table(data, pos)
+        record['homology'] = {'betti': betti[0], 'torsion': torsion,
+                              'complex': 'simplicial' if flags & 8 else 'morse'}
+    if pos != end:
+        raise RecordFormatError('malformed record at byte '+str(end - 4 - length))
+    return record, end
+
+
+_ENCODERS = {'jsonl': encode_jsonl, 'binary': encode_binary}
+
+_TAGGERS = {'jsonl': tag_jsonl, 'binary': tag_binary}
+
+
+def record_renderer(format, to_record):
+    """
+    Returns render(result) for drive_census: the encoded record to_record(result), or '' if to_record
+    returns None (results the script filters out).
+    """
+    encode = _ENCODERS[format]
+    def render(result):
+        record = to_record(result)
+        if record is None:
+            return ''
+        return encode(record)
+    return render
+
+
+def record_tagger(format):
+    return _TAGGERS[format]
+
+
+def guess_format(path):
+    if path is None or path == '-':
+        return 'jsonl'
+    name = path
+    for suffix in ('.bz2', '.gz'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    if name.endswith('.jsonl'):
+        return 'jsonl'
+    return 'binary'
+
+
+def read_records(path, format = None):
+    """
+    Iterates over the records of a file written by the census scripts or by convert (compressed files as
+    in censusIO). The format is guessed from the file name if not given: '.jsonl' is JSON Lines, anything
+    else binary.
+    """
+    if format is None:
+        format = guess_format(path)
+    reader = open_census(path)
+    try:
+        if format == 'jsonl':
+            for line in reader:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = ''
+        pos = 0
+        for block in reader.blocks():
+            data = data[pos:] + block
+            pos = 0
+            while len(data) - pos >= 4:
+                length = struct.unpack_from('<I', data, pos)[0]
+                if len(data) - pos < 4 + length:
+                    break
+                record, pos = decode_binary(data, pos)
+                yield record
+        if pos != len(data):
+            raise RecordFormatError('truncated record at the end of '+path)
+    finally:
+        reader.close()
+
+
+###############################################################################
+# converter for text dumps
+###############################################################################
+
+_CRITICAL = re.compile(r'critical triangle\(s\):\s*(\[.*?\])\s*critical edges:\s*(\[.*?\])')
+
+_HOMOLOGY = re.compile(r'homology \(.*?\):\s*(\[.*?\])\s*(\[.*\]|None)')
+
+_TERM = re.compile(r'(-?\d+) \* \( (\d+) \)')
+
+# header of the equations of genExamples.py since it prints the right column of the operator for every
+# critical triangle; before, every equation showed the first column
+_EQUATIONS = 'one equation per critical triangle'
+
+
+def _records_from_dump(lines):
+    # yields (record, columns of the operator read from equations, whether those can be trusted)
+    record = None
+    section = None
+    columns = []
+    trusted = True
+    for line in lines:
+        text = line.strip()
+        if text.startswith('# isomorphism signature:'):
+            if record is not None:
+                yield record, columns, trusted
+            record = {'isoSig': text.split(':', 1)[1].strip(), 'boundaries': []}
+            section = None
+            columns = []
+            trusted = True
+            continue
+        if record is None or not text:
+            continue
+        if text.startswith('# tetrahedra to triangles'):
+            section = 'tetrahedra'
+        elif text.startswith('# triangles to edges'):
+            section = 'triangles'
+        elif text.startswith('Morse function'):
+            section = 'morse'
+        elif text.startswith('seed of the collapse:'):
+            record['seed'] = int(text.split(':', 1)[1])
+            section = None
+        elif text.startswith('critical triangle(s):'):
+            match = _CRITICAL.match(text)
+            record['critical'] = {'triangles': json.loads(match.group(1)), 'edges': json.loads(match.group(2))}
+            section = None
+        elif text.startswith('oriented boundaries'):
+            section = 'boundaries'
+        elif text.startswith('induced boundary operator'):
+            record['operator'] = []
+            section = 'equations' if '(columns)' not in text else 'operator'
+            trusted = section == 'operator' or _EQUATIONS in text
+        elif text.startswith('homology ('):
+            match = _HOMOLOGY.match(text)
+            torsion = None if match.group(2) == 'None' else json.loads(match.group(2))
+            record['homology'] = {'betti': json.loads(match.group(1)), 'torsion': torsion}
+            section = None
+        elif text.startswith('homology computed on'):
+            record['homology']['complex'] = text.split()[-1]
+            section = None
+        elif text.startswith('Edge weights'):
+            record['edgeWeights'] = []
+            section = 'edgeWeights'
+        elif section in ('tetrahedra', 'triangles') and text.startswith('['):
+            record.setdefault('downward', {})[section] = json.loads(text)
+            section = None
+        elif section == 'morse' and text.startswith('['):
+            record['morse'] = json.loads(text)
+            section = None
+        elif section in ('boundaries', 'operator') and text.startswith('['):
+            record[section].append(json.loads(text))
+        elif section == 'equations' and '=' in text:
+            # genExamples prints the operator as one equation per critical triangle
+            columns.append([int(c) for c, e in _TERM.findall(text.split('=', 1)[1])])
+        elif section == 'edgeWeights' and text.startswith('('):
+            record['edgeWeights'].append([int(x) for x in text.strip('()').split(',')])
+    if record is not None:
+        yield record, columns, trusted
+
+
+def convert_dump(lines):
+    """
+    Parses the text printed by hasseDiagramCopy.py or genExamples.py (e.g. saved_eg.txt) from the iterable
+    lines and yields one record per '# isomorphism signature:' block. Anything else in the dump
+    (toStringLong output, separators) is skipped. The 'seed of the collapse:' line is only printed with
+    --seed or --trials, so a record has a seed only if its dump has that line. Older genExamples.py dumps
+    printed the first column of the operator in the equation of every critical triangle, so their
+    operator is only rebuilt with a single critical triangle; otherwise a RecordFormatError is raised
+    (recompute them instead).
+    """
+    for record, columns, trusted in _records_from_dump(lines):
+        if len(columns) > 1 and not trusted:
+            raise RecordFormatError('the operator of '+record['isoSig']+' cannot be rebuilt: this genExamples.py '
+                                    'dump shows the first column of it for every critical triangle')
+        if columns:
+            # one column per critical triangle
+            record['operator'] = [list(row) for row in zip(*columns)]
+        for key in ('downward', 'morse', 'critical', 'operator'):
+            if key not in record:
+                raise RecordFormatError('no '+key+' in the dump of '+record['isoSig'])
+        yield record
+
+
+def convert(source, target, format = None):
+    """
+    Converts the text dump source into a record file target. Returns the number of records written.
+    """
+    if format is None:
+        format = guess_format(target)
+    encode = _ENCODERS[format]
+    reader = open_census(source)
+    writer = CensusWriter(target)
+    count = 0
+    try:
+        for record in convert_dump(reader):
+            writer.write(encode(record))
+            count += 1
+    finally:
+        writer.close()
+        reader.close()
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'machine-readable census results')
+    parser.add_argument('command', choices = ['convert'])
+    parser.add_argument('source', help = 'text dump (.txt, .bz2 or .gz, - for stdin)')
+    parser.add_argument('-o', '--output', default = '-', help = 'record file, compressed if it ends in .bz2 or .gz')
+    parser.add_argument('-f', '--format', choices = RECORD_FORMATS, default = None,
+                        help = 'record format (default: binary for output files not ending in .jsonl, jsonl otherwise)')
+    options = parser.parse_args()
+
+    if options.command == 'convert':
+        count = convert(options.source, options.output, options.format)
+        print >>sys.stderr, count, 'records written'
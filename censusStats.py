@@ -0,0 +1,96 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Optional stage timers and hot-path counters of the census scripts
+#
+# STATS is the one recorder of a process. It is disabled by default, and the
+# instrumented code only checks STATS.enabled (once per stage or per call of
+# a hot function, never per step), so a run without --stats pays nothing
+# measurable. When enabled:
+#   - Pipeline.process adds the time of every stage (decode, hasse, collapse,
+#     boundaries, operator, ...) with add_time,
+#   - the collapse, the gradient paths and FacePoset matchings add counters
+#     with count: collapse trials, critical cells, pairs collapsed, V-path
+#     steps, lookup hits and misses, nodes removed.
+# Supervised workers send their take() with every result and the main
+# process merges them, so drive_census writes the totals of the whole run to
+# the stats sidecar (--stats) every --stats-every lines and at the end.
+###############################################################################
+
+import os
+
+import json
+
+import time
+
+
+class CensusStats(object):
+    """
+    Cumulative stage times (seconds and calls per name) and counters of one process, written as JSON by
+    write. snapshot, take and merge move them between processes as plain dicts.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.started = time.time()
+        self.reset()
+
+    def reset(self):
+        self.seconds = {}
+        self.calls = {}
+        self.counts = {}
+
+    def enable(self, enabled = True):
+        self.enabled = enabled
+        self.started = time.time()
+
+    def add_time(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n = 1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def snapshot(self):
+        return {'seconds': dict(self.seconds), 'calls': dict(self.calls), 'counts': dict(self.counts)}
+
+    def take(self):
+        """
+        The snapshot of everything recorded since the last take, which is then cleared (see merge).
+        """
+        snapshot = {'seconds': self.seconds, 'calls': self.calls, 'counts': self.counts}
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        """
+        Adds a snapshot of another process (a take of a worker) to this one.
+        """
+        for key, totals in (('seconds', self.seconds), ('calls', self.calls), ('counts', self.counts)):
+            for name, value in snapshot[key].iteritems():
+                totals[name] = totals.get(name, 0) + value
+
+    def report(self, lines = None):
+        """
+        The JSON object of the sidecar: wall-clock seconds since enable, lines done (if given), per stage
+        the seconds, calls and mean milliseconds per call, and the counters.
+        """
+        stages = {}
+        for name, seconds in self.seconds.iteritems():
+            calls = self.calls[name]
+            stages[name] = {'seconds': round(seconds, 6), 'calls': calls,
+                            'mean_ms': round(1000.0 * seconds / calls, 4) if calls else None}
+        return {'elapsed': round(time.time() - self.started, 3), 'lines': lines,
+                'stages': stages, 'counts': dict(self.counts)}
+
+    def write(self, path, lines = None):
+        # write and rename, so a reader never sees half a file
+        tmp = path + '.tmp'
+        handle = open(tmp, 'w')
+        json.dump(self.report(lines), handle, indent = 2, sort_keys = True)
+        handle.write('\n')
+        handle.close()
+        os.rename(tmp, path)
+
+
+# the recorder of this process (forked workers inherit whether it is enabled)
+STATS = CensusStats()
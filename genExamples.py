@@ -6,6 +6,32 @@
 #
 # 2. normal files
 # cat <file>.sig | ./<pythonFile>.py
+#
+# or, without the pipes (reads .sig, .sig.bz2, .sig.gz; output is compressed
+# if its name ends in .bz2 or .gz)
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.out.bz2
+#
+# 3. on 32 cores (add -u to write results as they complete, tagged by line
+#    number)
+# bzcat <file>.sig.bz2 | ./<pythonFile>.py -j 32
+#
+# 4. keep the results in a cache file, so isoSigs already computed by an
+#    earlier run (with the same parameters) are not recomputed; the collapse
+#    is seeded (--seed, default 0), so cached results are reproducible
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.out.bz2 --cache results.db
+#
+# 5. machine-readable output: one JSON record per line, or compact binary
+#    records (see censusRecords.py, which also converts old text dumps)
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.jsonl.bz2 --format jsonl
+#
+# 6. further filters before the normal surfaces (see censusPipeline.py), and
+#    the passed and rejected triangulations per stage on stderr
+# ./<pythonFile>.py -i <file>.sig.bz2 --max-critical-triangles 2 --min-h1-rank 1 --stage-report
+#
+# 7. where the time goes: cumulative time per stage and counters (V-path
+#    steps, lookup hits/misses, critical cells, ...) in a JSON sidecar, saved
+#    every --stats-every lines and at the end (see censusStats.py)
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.out.bz2 --stats <file>.stats.json
 ###############################################################################
 #
 # LOCATION of 1-vtx solid tori:
@@ -34,6 +60,33 @@ import re
 # gcd for Smith normal form
 from fractions import gcd
 
+# text of each triangulation is collected and written by the census driver
+import cStringIO
+
+# command line options
+import argparse
+
+# parallel census driver
+# (reads .sig/.sig.bz2/.sig.gz input, checkpoints long runs)
+from censusDriver import drive_census, add_driver_options
+
+# JSON Lines / binary records instead of text (--format)
+from censusRecords import make_record, record_renderer, record_tagger, RECORD_FORMATS
+
+# stages decode -> Hasse -> collapse -> boundaries -> operator -> normal
+# surfaces, with predicates that drop triangulations early
+from censusPipeline import Pipeline, Stage, MinCritical, NoDunceHats, add_pipeline_options, add_predicates
+
+# optional stage timers and counters of the hot paths (--stats)
+from censusStats import STATS
+
+# free faces and remaining cells of collKnotCompl
+from indexedSet import IndexedSet
+
+# induced boundary operator of the Morse function (shared with
+# hasseDiagramCopy.py)
+from morseOperator import SCMorseBdryOp
+
 import sys
 sys.setrecursionlimit(100)
 
@@ -81,197 +134,91 @@ def SCBdry(t):
 
 ### collapses a knot complement and computes a Morse function
 ### of a knot complement from an oriented Hasse diagram
-def collKnotCompl(upward,downward,t):
+### (random choices are taken from rng, e.g. a seeded random.Random; each
+### step takes constant time, and upward is not changed)
+def collKnotCompl(upward,downward,t,rng=random):
   f=[1,0,0,0]
   Morse=[]
   critical=[[0],[],[],[]]
-  available=[[0],range(t.getNumberOfEdges()),range(t.getNumberOfFaces()),range(t.getNumberOfTetrahedra())]
+  available = [IndexedSet(1,[0]),IndexedSet(t.getNumberOfEdges(),range(t.getNumberOfEdges())),IndexedSet(t.getNumberOfFaces(),range(t.getNumberOfFaces())),IndexedSet(t.getNumberOfTetrahedra(),range(t.getNumberOfTetrahedra()))]
+  # degree[d][i]: number of (d+1)-cells still containing the d-cell i, and
+  # cosum[d][i] the sum of their indices, which is the remaining coface
+  # once the degree is 1 (upward itself is not changed)
+  degree = [None,[len(x) for x in upward[1]],[len(x) for x in upward[2]]]
+  cosum = [None,[sum(x) for x in upward[1]],[sum(x) for x in upward[2]]]
 
   for iii in [2,1]:
-    free=[]
+    free=IndexedSet(len(upward[iii]))
     for i in range(len(upward[iii])):
-      if len(upward[iii][i]) == 1:
-        free.append(i)
-    while available[iii+1] <> []:
-      if free==[]:
+      if degree[iii][i] == 1:
+        free.add(i)
+    while len(available[iii+1]) > 0:
+      if len(free) == 0:
         f[iii+1]+=1
-        r=random.choice(available[iii+1])
+        r=available[iii+1].choice(rng)
         # keep track of Morse function
         Morse.append([iii+1,r])
         critical[iii+1].append(r)
-        available[iii+1].pop(available[iii+1].index(r))
+        available[iii+1].remove(r)
         # update upward Hasse diagram
         R=downward[iii+1][r]
         for i in R:
-          upward[iii][i].pop(upward[iii][i].index(r))
-          if len(upward[iii][i]) == 1:
-            free.append(i)
+          degree[iii][i]-=1
+          cosum[iii][i]-=r
+          if degree[iii][i] == 1:
+            free.add(i)
       else:
-        r=random.choice(free)
-        free.pop(free.index(r))
-        pairedFace=upward[iii][r][0]
+        r=free.choice(rng)
+        free.remove(r)
+        pairedFace=cosum[iii][r]
         # keep track of Morse function
         Morse.append([iii,r])
         Morse.append([iii+1,pairedFace])
-        available[iii].pop(available[iii].index(r))
-        available[iii+1].pop(available[iii+1].index(pairedFace))
+        available[iii].remove(r)
+        available[iii+1].remove(pairedFace)
         R=downward[iii+1][pairedFace]
 
         # update upward Hasse diagram
         for i in R:
-          upward[iii][i].pop(upward[iii][i].index(pairedFace))
-          if len(upward[iii][i]) == 1:
-            free.append(i)
-          elif upward[iii][i] == []:
-            if i in free:
-              free.pop(free.index(i))
+          degree[iii][i]-=1
+          cosum[iii][i]-=pairedFace
+          if degree[iii][i] == 1:
+            free.add(i)
+          elif degree[iii][i] == 0:
+            free.discard(i)
         if iii > 1:
           R=downward[iii][r]
           for i in R:
-            upward[iii-1][i].pop(upward[iii-1][i].index(r))
+            degree[iii-1][i]-=1
+            cosum[iii-1][i]-=r
 
-  for i in available[1]:
+  for i in sorted(available[1]):
     Morse.append([1,i])
     critical[1].append(i)
     f[1]+=1
   Morse.append([0,0])
+  if STATS.enabled:
+    STATS.count('collapse trials')
+    STATS.count('critical cells',sum(f))
+    STATS.count('pairs collapsed',(len(Morse)-sum(f))/2)
+    STATS.count('nodes removed',len(Morse))
   return [f,critical,Morse]
 
-def SCAddCrits(s1,s2):
-  for i in range(len(s1)):
-    s1[i][1]=s1[i][1]+s2[i][1];
-  return s1
-
-def SCAddCrit(s,chain):
-  for i in range(len(s)):
-    if s[i][0]==chain[0]:
-      s[i][1]=s[i][1]+chain[1]
-  return s
-
-
-def SCGradient(Morse,face,bdrys):
-  pos=Morse.index([1,face])
-  matching=[]
-  for i in range(pos,len(Morse)):
-    if Morse[i][0] <> 2: continue
-    if not face in [bdrys[Morse[i][1]][0][0],bdrys[Morse[i][1]][1][0],bdrys[Morse[i][1]][2][0]]: continue
-    matching=Morse[i][1]
-    if face == bdrys[Morse[i][1]][0][0]:
-      sign=bdrys[Morse[i][1]][0][1]
-    elif face == bdrys[Morse[i][1]][1][0]:
-      sign=bdrys[Morse[i][1]][1][1]
-    elif face == bdrys[Morse[i][1]][2][0]:
-      sign=bdrys[Morse[i][1]][2][1]
-    break
-  if matching == []:
-    return 0
-  else:
-    return [matching,(-1)*sign]
-
-
-def SCFindGradientPaths(Morse,chain,crits,mult,lookup,bdrys):
-  dict1=lookup
-  # check if oriented edge 'chain' was already computed
-  check=dict1.get(tuple(chain))
-  if check<>None:
-    return [check,dict1]
-
-  # empty chain
-  s=[[x,0] for x in crits]
-
-  gradTrig=SCGradient(Morse,chain[0],bdrys)
-  if gradTrig==0:
-    # if no gradient triangle found, update dictionary with empty chain 's'
-    # positive case
-    dict1.update({tuple(chain): s})
-    # negative case
-    dict1.update({tuple([chain[0],-1*chain[1]]): [[x[0],-1*x[1]] for x in s]})
-    return [s,dict1]
-  
-  #print 'edge', chain[0], '->', 'triangle', gradTrig
-  # case: gradient triangle found
-  # adjust multiplicity of gradient triangle
-  gradTrig[1]=gradTrig[1]*chain[1]
-  boundaryGradTrig=bdrys[gradTrig[0]]
-  # orient boundary
-  if gradTrig[1] == -1:
-    boundaryGradTrig[0][1]*=-1
-    boundaryGradTrig[1][1]*=-1
-    boundaryGradTrig[2][1]*=-1
-  outgoingEdges=[x for x in boundaryGradTrig if x[0]<>chain[0] and Morse.index([1,chain[0]]) < Morse.index([1,x[0]])]
-  adjacent=[x[0] for x in outgoingEdges]
-
-  # case: outgoing edges are critical edges
-  intersection=[x for x in adjacent if x in crits];
-  for i in intersection:
-    pos=adjacent.index(i)
-    if mult == outgoingEdges[pos][1]:
-      s=SCAddCrit(s,[i,1])
-    else:
-      s=SCAddCrit(s,[i,-1])
-    outgoingEdges.pop(pos)
-    adjacent.pop(pos)
-
-
-
-
-  #print len(outgoingEdges), 'recursion(s) ahead'
-  #print 'triangle', gradTrig, '->', 'edge(s)', outgoingEdges
-  # loop over remaining outgoing edges
-  for i in outgoingEdges:
-    #print 'SCFindGradientPaths:', x, ',', i, ',',  crits, ',', lookup
-    #print 'SCFindGradientPaths:', Morse.index([1,i[0]]), Morse.index([1,crits[0]]), Morse.index([1,crits[1]]), dict1
-    new=SCFindGradientPaths(Morse,i,crits,mult,dict1,bdrys)
-    dict1=new[1]
-    s=SCAddCrits(s,new[0])
-  dict1.update({tuple(chain): s})
-  dict1.update({tuple([chain[0],-1*chain[1]]): [[x[0],-1*x[1]] for x in s]});
-  return [s,dict1]
-
-
-# compute bdry operator between triangles and edges
-# in a knot complement
-def SCBdryOp(Morse,critsUp,critsDown,t,bdrys):
-  lookup = {}
-  tau=[]
-  for i in critsUp:
-    s=[]
-    f = t.getFace(i)
-    bd = bdrys[i]
-    for x in critsDown:
-      s.append([x,0])
-    for ii in bd:
-      if ii[0] in critsDown:
-        s=SCAddCrit(s,ii)
-      else:
-        new=SCFindGradientPaths(Morse,ii,critsDown,1,lookup,bdrys)
-        s1=new[0]
-        s=SCAddCrits(s,s1)
-    tau.append(s)
-  tau2=[]
-  for i in range(len(critsDown)):
-    row=[]
-    for ii in range(len(critsUp)):
-      row.append(tau[ii][i][1])
-    tau2.append(row)
-  return tau2
-
 
-##########################################
-##########################################
-#########END HELPER FUNCTIONS ############
-##########################################
-##########################################
+### the stages of computeIsoSig (see censusPipeline.py): each adds its
+### results to the dict item
 
-ctr=0
-for line in sys.stdin:
-  ctr += 1
+### decode: the triangulation item['t'] of item['line']
+def decodeStage(item):
   #if ctr%1000 == 0:
   #  print ctr
-  sig = re.search('[a-zA-Z0-9]*' ,line)
-  t = NTriangulation.fromIsoSig(sig.group(0))
-  print type(t)
+  sig = re.search('[a-zA-Z0-9]*' ,item['line'])
+  item['t'] = NTriangulation.fromIsoSig(sig.group(0))
   #print t.isoSig()
+
+### Hasse: item['upward'] and item['downward'] (multiple edges removed)
+def hasseStage(item):
+  t = item['t']
   vertices = t.getVertices()
   edges = t.getEdges()
   faces = t.getFaces()
@@ -344,13 +291,18 @@ for line in sys.stdin:
   for i in range(len(upward[2])):
     for j in range(t.getNumberOfTetrahedra()):
       if upward[2][i].count(j) > 1:
-        upward[2][i]=[y for y in upward[2][i] if y != j] 
-
-  tmp = collKnotCompl(upward,downward,t)
-  f = tmp[0]
-  critical = tmp[1]
-  Morse = tmp[2]
-  bdrys = SCBdry(t)
+        upward[2][i]=[y for y in upward[2][i] if y != j]
+  item['upward'] = upward
+  item['downward'] = downward
+
+### collapse: item['f'], item['critical'] and item['Morse'] of collKnotCompl,
+### seeded with seed (item['seed']) for every triangulation
+def collapseStage(item,seed):
+  tmp = collKnotCompl(item['upward'],item['downward'],item['t'],random.Random(seed))
+  item['seed'] = seed
+  item['f'] = tmp[0]
+  item['critical'] = tmp[1]
+  item['Morse'] = tmp[2]
 
   #test=[0,0,0,0]
   #for i in Morse:
@@ -360,80 +312,165 @@ for line in sys.stdin:
   #print critical
   #print t.toStringLong()
 
+### boundaries: item['bdrys'] of SCBdry
+def boundariesStage(item):
+  item['bdrys'] = SCBdry(item['t'])
+
 ################ NEW STUFF ###############
 
-  critsUp=critical[2]
-  critsDown=critical[1]
+### operator: the induced boundary operator item['operator']
+def operatorStage(item):
+  critsUp=item['critical'][2]
+  critsDown=item['critical'][1]
 
   # get boundary operator
 #  print t.isoSig()
-  tmp=SCBdryOp(Morse,critsUp,critsDown,t,bdrys)
-
-  if len(critsUp) < 1:
-    continue
+  item['operator']=SCMorseBdryOp(item['Morse'],critsUp,critsDown,item['bdrys'])
+
+### normal surfaces: item['edgeWeights'], the edge weights of the non-trivial
+### discs
+def normalSurfacesStage(item):
+  t = item['t']
+  weights = []
+  n = NNormalSurfaceList.enumerateStandardDirect(t)
+  for idx in range(0,n.getNumberOfSurfaces()):
+    s = n.getSurface(idx)
+    if s.getEulerCharacteristic() != 1 or s.isVertexLinking():
+      continue
+    weights.append([s.getEdgeWeight(e) for e in range(t.getNumberOfEdges())])
+  item['edgeWeights'] = weights
+
+### the stages decode -> Hasse -> collapse -> boundaries -> operator ->
+### normal surfaces; the trivial examples (no critical triangle, critical
+### dunce hats and similar) are dropped before the operator; seed: see
+### collapseStage
+def examplePipeline(seed=0):
+  return Pipeline([Stage('decode', decodeStage), Stage('hasse', hasseStage),
+                   Stage('collapse', collapseStage, (seed,), [MinCritical(2, 1)]),
+                   Stage('boundaries', boundariesStage, (), [NoDunceHats()]),
+                   Stage('operator', operatorStage), Stage('normal surfaces', normalSurfacesStage)])
+
+### computes a Morse function, the induced boundary operator and the
+### normal discs of the triangulation with isomorphism signature 'line',
+### and returns them in a dictionary (see formatResult for the printed text)
+### 'edgeWeights' is None for the trivial examples (and all others rejected
+### by a predicate of the pipeline), which are not printed
+def computeIsoSig(line,pipeline=None):
+  if pipeline == None:
+    pipeline = examplePipeline()
+  item = pipeline.process({'line': line})
+  result = {'isoSig': item['t'].isoSig(), 'rejected': item['rejected'], 'edgeWeights': None}
+  for key in ['downward', 'critical', 'Morse', 'seed', 'bdrys', 'operator', 'edgeWeights']:
+    if key in item:
+      result[key] = item[key]
+  return result
+
+
+### returns the text printed for a result of computeIsoSig
+def formatResult(result):
+  out = cStringIO.StringIO()
+  print >>out, NTriangulation
+  if result['edgeWeights'] is None:
+    return out.getvalue()
   else:
-    # checking for critical dunce hats and similar trivial examples
-    cont = False
-    for j in critsUp:
-      if bdrys[j][0][0]==bdrys[j][1][0] and bdrys[j][0][0]==bdrys[j][2][0]: 
-        cont = True
-        break
-    if cont: continue
-
-    print '# isomorphism signature:',
-    print t.isoSig(), '\n\n'
-    print '# downward Hasse diagram (with multiple edges removed)'
-    print '['
-    print '# tetrahedra to triangles'
-    print downward[3]
-    print '# triangles to edges'
-    print downward[2]
-    print ']\n\n'
-    print 'Morse function ([i,j] means j-th face of dimension i):\n'
-    print Morse, '\n\n'
-    print 'critical triangle(s):\t', critsUp, '\tcritical edges:\t', critsDown, '\n\n'
-    print 'oriented boundaries of triangles (k-th entry [[i_0,s_0],[i_1,s_1],[i_2,s_2]]: i_j = j-th edge of triangle k, s_j = orientation of i_j)\n'
+    downward = result['downward']
+    Morse = result['Morse']
+    critsUp = result['critical'][2]
+    critsDown = result['critical'][1]
+    bdrys = result['bdrys']
+    tmp = result['operator']
+
+    print >>out, '# isomorphism signature:',
+    print >>out, result['isoSig'], '\n\n'
+    print >>out, '# downward Hasse diagram (with multiple edges removed)'
+    print >>out, '['
+    print >>out, '# tetrahedra to triangles'
+    print >>out, downward[3]
+    print >>out, '# triangles to edges'
+    print >>out, downward[2]
+    print >>out, ']\n\n'
+    print >>out, 'Morse function ([i,j] means j-th face of dimension i):\n'
+    print >>out, Morse, '\n\n'
+    print >>out, 'critical triangle(s):\t', critsUp, '\tcritical edges:\t', critsDown, '\n\n'
+    print >>out, 'oriented boundaries of triangles (k-th entry [[i_0,s_0],[i_1,s_1],[i_2,s_2]]: i_j = j-th edge of triangle k, s_j = orientation of i_j)\n'
     for i in bdrys:
-      print i
-    print '\n'
-    print 'induced boundary operator between critical triangles and critical edges\n'
+      print >>out, i
+    print >>out, '\n'
+    # one equation per critical triangle, with its column of the operator
+    # (censusRecords.convert_dump only trusts equations under this header)
+    print >>out, 'induced boundary operator between critical triangles and critical edges (one equation per critical triangle)\n'
 #    for i in tmp:
 #      print i
 
-    for j in critsUp:
-      print bdrys[j][0][1], '* (', bdrys[j][0][0], ')',
+    for col in range(len(critsUp)):
+      j = critsUp[col]
+      print >>out, bdrys[j][0][1], '* (', bdrys[j][0][0], ')',
       if bdrys[j][1][1] >= 0:
-        print '+', 
-      print bdrys[j][1][1], '* (', bdrys[j][1][0], ')',
+        print >>out, '+', 
+      print >>out, bdrys[j][1][1], '* (', bdrys[j][1][0], ')',
       if bdrys[j][2][1] >= 0:
-        print '+', 
-      print bdrys[j][2][1], '* (', bdrys[j][2][0], ') =',
+        print >>out, '+', 
+      print >>out, bdrys[j][2][1], '* (', bdrys[j][2][0], ') =',
       for k in range(len(critsDown)):
-        print tmp[k][0], '* (', critsDown[k], ')',
-        if k < len(critsDown)-1 and tmp[k+1][0] >= 0:
-          print '+',
-      print '\n'
+        print >>out, tmp[k][col], '* (', critsDown[k], ')',
+        if k < len(critsDown)-1 and tmp[k+1][col] >= 0:
+          print >>out, '+',
+      print >>out, '\n'
 
 
 #    print t.toStringLong(), "\n\n\n\n\n"
 #    print "\n\n\n\n\n"
 
-    print 'Edge weights of non-trivial discs\n'
-    n = NNormalSurfaceList.enumerateStandardDirect(t)
-    for idx in range(0,n.getNumberOfSurfaces()):
-      s = n.getSurface(idx)
-      if s.getEulerCharacteristic() != 1 or s.isVertexLinking():
-        continue
-      else:
-        print '(',
-        for e in range(t.getNumberOfEdges()):
-          print s.getEdgeWeight(e),
-          if e < t.getNumberOfEdges()-1:
-            print ',',
-        print ')'
-    print '\n'
+    print >>out, 'Edge weights of non-trivial discs\n'
+    for weights in result['edgeWeights']:
+      print >>out, '(',
+      for e in range(len(weights)):
+        print >>out, weights[e],
+        if e < len(weights)-1:
+          print >>out, ',',
+      print >>out, ')'
+    print >>out, '\n'
+  return out.getvalue()
 
 
+### returns the record (see censusRecords.py) of a result of computeIsoSig
+def resultRecord(result):
+  if result['edgeWeights'] is None:
+    return None
+  return make_record(result['isoSig'], result['downward'], result['Morse'], result['critical'][2],
+                     result['critical'][1], result['bdrys'], result['operator'],
+                     seed=result['seed'], edge_weights=result['edgeWeights'])
 
 
+##########################################
+##########################################
+#########END HELPER FUNCTIONS ############
+##########################################
+##########################################
 
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Morse functions, induced boundary operators and normal discs for a census of isomorphism signatures (stdin or --input)')
+  add_driver_options(parser)
+  parser.add_argument('--seed', type=int, default=0, help='seed of the collapse of every triangulation (default: %(default)s)')
+  parser.add_argument('--format', choices=('text',)+RECORD_FORMATS, default='text', help='output text (default), JSON Lines or binary records')
+  parser.add_argument('--stage-report', action='store_true', help='print the passed and rejected triangulations per stage to stderr at the end')
+  add_pipeline_options(parser)
+  options = parser.parse_args()
+
+  pipeline = examplePipeline(options.seed)
+  predicates = add_predicates(pipeline, options)
+
+  if options.format == 'text':
+    render = formatResult
+    tag = None
+  else:
+    render = record_renderer(options.format, resultRecord)
+    tag = record_tagger(options.format)
+
+  # results are cached per isoSig and these parameters; bump 'version'
+  # whenever the computed data changes
+  cacheParams = {'version': 6, 'seed': options.seed, 'predicates': predicates}
+  drive_census(options, computeIsoSig, (pipeline,), render=pipeline.counting(render),
+               cache_params=cacheParams, tag=tag)
+  if options.stage_report:
+    pipeline.print_report()
@@ -1,23 +1,136 @@
 #!/usr/bin/regina-python
+
+###############################################################################
+# Hasse diagram of a triangulation in any dimension 2-8
+#
+# compute_hasse builds the downward (faces) and upward (cofaces) diagrams of
+# all layers as NumPy CSR arrays, with the multiple edges (a facet that
+# occurs more than once in the boundary of a cell) removed, as the census
+# scripts do for dimension 3.
+#
+# cat <file>.sig | ./hasse.py [-d 4] [--verbose]
+#   prints the downward diagram of the first triangulation with --verbose
+###############################################################################
 from regina import *
 
+import regina
+
 import numpy as np
 
-print np.array([1,2,3,4])
+import argparse
 
 import sys
 sys.setrecursionlimit(100)
 
-def compute_hasse(isosig, dimension):
-    if dimension ==3:
+
+def triangulation_class(dimension):
+    """
+    The Regina class TriangulationN of the given dimension (2-8).
+    """
+    cls = getattr(regina, 'Triangulation' + str(dimension), None)
+    if cls is None or not 2 <= dimension <= 8:
+        raise ValueError('no triangulations of dimension ' + str(dimension))
+    return cls
+
+
+def _facets(t, k):
+    # facets[i, j]: index of the j-th (k-1)-face of the i-th k-face
+    if k == t.dimension:
+        cells = t.simplices()
+    else:
+        cells = t.faces(k)
+    indices = [cell.face(k - 1, j).index() for cell in cells for j in xrange(k + 1)]
+    return np.array(indices, dtype = np.intp).reshape(-1, k + 1)
+
+
+def _csr(rows, cols, count):
+    # CSR arrays (ptr, idx) with count rows from the entries (rows[i], cols[i]), keeping the order of
+    # the entries within each row
+    order = np.argsort(rows, kind = 'mergesort')
+    ptr = np.zeros(count + 1, dtype = np.intp)
+    np.cumsum(np.bincount(rows, minlength = count), out = ptr[1:])
+    return ptr, cols[order]
+
+
+def strip_multi_edges(facets, faces_below):
+    """
+    Returns (cells, faces) of the arcs of facets (an array of shape (number of k-faces, k+1), see
+    compute_hasse) that occur exactly once: a facet repeated in the boundary of a cell loses all its arcs
+    to that cell. Arcs are in the order of the cells and, within a cell, of its faces.
+    """
+    count, width = facets.shape
+    cells = np.repeat(np.arange(count, dtype = np.intp), width)
+    faces = facets.ravel()
+    keys = cells * faces_below + faces
+    _, inverse, counts = np.unique(keys, return_inverse = True, return_counts = True)
+    keep = counts[inverse.ravel()] == 1
+    return cells[keep], faces[keep]
+
+
+def compute_hasse(isosig, dimension, verbose = False):
+    """
+    Returns (t, upward, downward) for the triangulation with isomorphism signature isosig: downward[k] =
+    (ptr, idx) is the CSR array of the (k-1)-faces of each k-face (k = 0, ..., dimension; empty for
+    vertices), upward[k] = (ptr, idx) that of the (k+1)-faces containing each k-face (empty for the
+    simplices). Faces are numbered as in Regina and multiple edges are removed. The faces of the i-th
+    k-face are downward[k][1][downward[k][0][i]:downward[k][0][i+1]]; csr_rows turns a CSR array into
+    lists. verbose prints the downward diagram before and after removing the multiple edges.
+    """
+    t = triangulation_class(dimension).fromIsoSig(isosig.strip())
+    upward, downward = triangulation_hasse(t, verbose)
+    return t, upward, downward
+
+
+def triangulation_hasse(t, verbose = False):
+    """
+    (upward, downward) of compute_hasse for a Regina triangulation t of any dimension 2-8.
+    """
+    dim = t.dimension
+    counts = [t.countFaces(k) for k in xrange(dim)] + [t.size()]
+    empty = np.zeros(0, dtype = np.intp)
+    upward = [None] * (dim + 1)
+    downward = [None] * (dim + 1)
+    downward[0] = (np.zeros(counts[0] + 1, dtype = np.intp), empty)
+    upward[dim] = (np.zeros(counts[dim] + 1, dtype = np.intp), empty)
+    for k in xrange(1, dim + 1):
+        facets = _facets(t, k)
+        if verbose:
+            print 'k = ', k, '(with multiple edges)'
+            print facets.tolist()
+        cells, faces = strip_multi_edges(facets, counts[k - 1])
+        downward[k] = _csr(cells, faces, counts[k])
+        upward[k - 1] = _csr(faces, cells, counts[k - 1])
+        if verbose:
+            print 'k = ', k
+            print csr_rows(downward[k])
+    return upward, downward
+
+
+def csr_rows(csr):
+    """
+    The rows of a CSR array (ptr, idx) as a list of lists, the form of the census scripts' diagrams.
+    """
+    ptr, idx = csr
+    values = idx.tolist()
+    bounds = ptr.tolist()
+    return [values[bounds[i]:bounds[i + 1]] for i in xrange(len(bounds) - 1)]
+
+
+def compute_hasse_reference(isosig, dimension):
+    """
+    The original list implementation for dimensions 3 and 4 (face lookups by list search, multiple edges
+    removed by counting every face index), without its debug output. Returns (t, upward, downward) as
+    lists of lists; used to check and benchmark compute_hasse.
+    """
+    if dimension == 3:
         t = Triangulation3.fromIsoSig(isosig)
     if dimension == 4:
         t = Triangulation4.fromIsoSig(isosig)
     cells = []
     dim = t.dimension
     for i in range(dim):
-        cells.append(t.faces(i))
-    cells.append(t.simplices())
+        cells.append(list(t.faces(i)))
+    cells.append(list(t.simplices()))
 
     upward = [[] for _ in range(dim+1)]
     downward = [[] for _ in range(dim+1)]
@@ -30,11 +143,6 @@ def compute_hasse(isosig, dimension):
             for i in range(len(cells[j])):
                 upward[j].append([])
 
-    print "initial"
-    for k in range(1,dim+1):
-        print "k = ", k
-        print downward[k]
-
     for k in range(1,dim+1):                    #dim chg
         for i in range(len(cells[k])):
             for j in range(k+1):
@@ -42,12 +150,6 @@ def compute_hasse(isosig, dimension):
                 downward[k][i].append(idx)
                 upward[k-1][idx].append(i)
 
-    print "middle"
-    for k in range(1,dim+1):
-        print "k = ", k
-        print downward[k]
-
-
     for k in range(dim+1):
         if k > 0:
             for i in range(len(downward[k])):
@@ -64,11 +166,15 @@ def compute_hasse(isosig, dimension):
                     for j in range(t.countFaces(k+1)):
                         if upward[k][i].count(j) > 1:
                             upward[k][i]=[y for y in upward[k][i] if y != j]
-    print "final"
-    for k in range(1,dim+1):
-        print "k = ", k
-        print downward[k]
-
-for isosig in sys.stdin:
-    compute_hasse(isosig, 3)
-    break
\ No newline at end of file
+    return t, upward, downward
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Hasse diagram of the first triangulation on stdin')
+    parser.add_argument('-d', '--dimension', type = int, default = 3, help = 'dimension of the triangulations (2-8)')
+    parser.add_argument('--verbose', action = 'store_true', help = 'print the downward diagram')
+    options = parser.parse_args()
+
+    for isosig in sys.stdin:
+        compute_hasse(isosig, options.dimension, options.verbose)
+        break
@@ -8,6 +8,40 @@
 #
 # 2. normal files
 # cat <file>.sig | ./<pythonFile>.py
+#
+# or, without the pipes (reads .sig, .sig.bz2, .sig.gz; output is compressed
+# if its name ends in .bz2 or .gz)
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.out.bz2
+#
+# 3. whole census on 32 cores (-n 0: all lines, default is the first line only;
+#    add -u to write results as they complete, tagged by line number)
+# bzcat <file>.sig.bz2 | ./<pythonFile>.py -j 32 -n 0
+#
+# 4. keep the results in a cache file, so isoSigs already computed by an
+#    earlier run (with the same parameters) are not recomputed
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.out.bz2 --cache results.db
+#
+# 5. machine-readable output: one JSON record per line, or compact binary
+#    records (see censusRecords.py, which also converts old text dumps)
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.jsonl.bz2 --format jsonl
+#
+# 6. homology (Betti numbers and torsion) of every triangulation, from the
+#    Smith normal form of its Morse complex (see smithNormalForm.py); the
+#    collapse then only uses elementary collapses of the triangulation (a
+#    face repeated in a remaining cell is never free), so the operator is
+#    the 2->1 boundary of that same complex (see morseComplex.py); add
+#    --betti-only for the Betti numbers alone, from ranks modulo a prime
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.out.bz2 --homology
+#
+# 7. drop triangulations as early as possible (see censusPipeline.py): each
+#    predicate runs right after the stage that provides its data, so the
+#    costlier stages are skipped; --stage-report prints the counts per stage
+# ./<pythonFile>.py -i <file>.sig.bz2 -n 0 --min-critical-triangles 1 --reject-dunce-hats --stage-report
+#
+# 8. where the time goes: cumulative time per stage and counters (V-path
+#    steps, lookup hits/misses, critical cells, ...) in a JSON sidecar, saved
+#    every --stats-every lines and at the end (see censusStats.py)
+# ./<pythonFile>.py -i <file>.sig.bz2 -o <file>.out.bz2 -n 0 --stats <file>.stats.json
 ###############################################################################
 #
 # LOCATION of 1-vtx solid tori:
@@ -36,6 +70,39 @@ import re
 # gcd for Smith normal form
 from fractions import gcd
 
+# text of each triangulation is collected and written by the census driver
+import cStringIO
+
+# command line options
+import argparse
+
+# parallel census driver
+# (reads .sig/.sig.bz2/.sig.gz input, checkpoints long runs)
+from censusDriver import drive_census, add_driver_options
+
+# JSON Lines / binary records instead of text (--format)
+from censusRecords import make_record, record_renderer, record_tagger, RECORD_FORMATS
+
+# stages decode -> Hasse -> collapse -> boundaries -> operator, with
+# predicates that drop triangulations early
+from censusPipeline import Pipeline, Stage, add_pipeline_options, add_predicates
+
+# oriented boundaries as NumPy arrays
+from orientedBoundaries import boundary_arrays, boundary_lists
+
+# homology from the Morse complex of the collapse (--homology)
+from morseComplex import triangulation_homology, collapse_gradient
+
+# optional stage timers and counters of the hot paths (--stats)
+from censusStats import STATS
+
+# free faces and remaining cells of collKnotCompl
+from indexedSet import IndexedSet
+
+# sparse chains, the gradient of a Morse function and the induced boundary
+# operator (also used by genExamples.py)
+from morseOperator import SCChain, SCAddCrits, SCAddCrit, SCMorseGradient, SCMorseBdryOp
+
 import sys
 sys.setrecursionlimit(100)
 
@@ -47,174 +114,251 @@ sys.setrecursionlimit(100)
 
 ### computes the boundary of all triangles
 ### and returns a list of 1-chains (1-cycles)
+### (read off the vertex maps of the tetrahedra, see orientedBoundaries.py,
+### instead of searching the embeddings of every edge)
 def SCBdry(t):
-  edgeEmbeddings=[]
-  #for j in range(t.getNumberOfEdges()):
-  for j in range(t.countFaces(1)):
-    edgeEmbeddings.append([])
-    #e = t.getEdge(j)
-    e = t.face(1, j)
-    #for i in range(e.getDegree()):
-    for i in range(e.degree()):
-      #emb = e.getEmbedding(i)                                    # e.getEmbedding
-      emb = e.embedding(i)
-      #print type(emb)
-      #print type(emb.simplex())
-      #print emb.simplex().index()
-      #tetIdx = t.tetrahedronIndex(emb.getTetrahedron())  OG      # t.tetrahedronIndex; emb.getTetrahedron
-      tetIdx = emb.simplex().index()                              # big question mark here... is this the intended aim?
-      #vtcs = emb.getVertices()                           OG
-      vtcs = emb.vertices()
-      #print [tetIdx,vtcs[0],vtcs[1]]
-      edgeEmbeddings[j].append([tetIdx,vtcs[0],vtcs[1]])
-  bdrys = []
-  #for j in range(t.getNumberOfTriangles()):
-  for j in range(t.countFaces(2)):
-    #f = t.getTriangle(j)                                   OG
-    f = t.face(2, j)
-    #emb=f.getEmbedding(0)                                  OG
-    emb = f.embedding(0)
-    #tetIdx = t.tetrahedronIndex(emb.getTetrahedron())      OG
-    tetIdx = emb.simplex().index()
-
-    #vtcs = emb.getVertices()                               OG
-    vtcs = emb.vertices()
-
-    b = [[],[],[]]
-    #if [tetIdx,vtcs[1],vtcs[2]] in edgeEmbeddings[t.edgeIndex(f.getEdge(0))]:      OG
-    if [tetIdx,vtcs[1],vtcs[2]] in edgeEmbeddings[f.face(1,0).index()]:
-      #b[0] = [t.edgeIndex(f.getEdge(0)),1]                                         OG
-      b[0] = [f.face(1,0).index(),1]
-    else:
-      #b[0] = [t.edgeIndex(f.getEdge(0)),-1]                                        OG
-      b[0] = [f.face(1,0).index(),-1]
-
-    #if [tetIdx,vtcs[0],vtcs[2]] in edgeEmbeddings[t.edgeIndex(f.getEdge(1))]:
-    if [tetIdx,vtcs[0],vtcs[2]] in edgeEmbeddings[f.face(1,1).index()]:
-      #b[1] = [t.edgeIndex(f.getEdge(1)),-1]
-      b[1] = [f.face(1,1).index(),-1]
-    else:
-      #b[1] = [t.edgeIndex(f.getEdge(1)),1]
-      b[1] = [f.face(1,1).index(),1]
-
-    #if [tetIdx,vtcs[0],vtcs[1]] in edgeEmbeddings[t.edgeIndex(f.getEdge(2))]:
-    if [tetIdx,vtcs[0],vtcs[1]] in edgeEmbeddings[f.face(1,2).index()]:
-      #b[2] = [t.edgeIndex(f.getEdge(2)),1]
-      b[2] = [f.face(1,2).index(),1]
-    else:
-      #b[2] = [t.edgeIndex(f.getEdge(2)),-1]
-      b[2] = [f.face(1,2).index(),-1]
-    bdrys.append(b)
-  return bdrys
+  return boundary_lists(boundary_arrays(t,[2]),2)
 
 ### collapses a knot complement and computes a Morse function
 ### of a knot complement from an oriented Hasse diagram
-def collKnotCompl(upward,downward,t):
+### (random choices are taken from rng, e.g. a seeded random.Random; each
+### step takes constant time, and upward is not changed)
+### the diagram has no multiple edges, so by default a face repeated in the
+### boundary of a coface can be collapsed while that coface is still there:
+### the Morse function then belongs to the diagram and not to the
+### triangulation (its V-paths can close up through the repeated faces).
+### With repeated (item['repeated'] of SCHasse), such a face only becomes
+### free once all cofaces repeating it are gone, so every step is an
+### elementary collapse of the triangulation itself and the Morse complex
+### of morseComplex.py has the operator of SCMorseBdryOp as its 2->1 part
+def collKnotCompl(upward,downward,t,rng=random,repeated=None):
   f=[1,0,0,0]
   Morse=[]
   critical=[[0],[],[],[]]
-  #available=[[0],range(t.getNumberOfEdges()),range(t.getNumberOfTriangles()),range(t.getNumberOfTetrahedra())]
-  available = [[0],range(t.countFaces(1)),range(t.countFaces(2)),range(t.size())]
+  available = [IndexedSet(1,[0]),IndexedSet(t.countFaces(1),range(t.countFaces(1))),IndexedSet(t.countFaces(2),range(t.countFaces(2))),IndexedSet(t.size(),range(t.size()))]
+  # degree[d][i]: number of (d+1)-cells still containing the d-cell i, and
+  # cosum[d][i] the sum of their indices, which is the remaining coface
+  # once the degree is 1 (upward itself is not changed)
+  degree = [None,[len(x) for x in upward[1]],[len(x) for x in upward[2]]]
+  cosum = [None,[sum(x) for x in upward[1]],[sum(x) for x in upward[2]]]
+  # blocked[d][i]: number of (d+1)-cells still there that have the d-cell i
+  # more than once in their boundary (always 0 without repeated)
+  blocked = [None,[0]*len(upward[1]),[0]*len(upward[2])]
+  if repeated == None:
+    repeated = [None,None,[[]]*len(downward[2]),[[]]*len(downward[3])]
+  for d in [1,2]:
+    for x in repeated[d+1]:
+      for i in x:
+        blocked[d][i]+=1
 
   for iii in [2,1]:
-    free=[]
+    free=IndexedSet(len(upward[iii]))
     for i in range(len(upward[iii])):
-      if len(upward[iii][i]) == 1:
-        free.append(i)
-    while available[iii+1] <> []:
-      if free==[]:
+      if degree[iii][i] == 1 and blocked[iii][i] == 0:
+        free.add(i)
+    while len(available[iii+1]) > 0:
+      if len(free) == 0:
         f[iii+1]+=1
-        r=random.choice(available[iii+1])
+        r=available[iii+1].choice(rng)
         # keep track of Morse function
         Morse.append([iii+1,r])
         critical[iii+1].append(r)
-        available[iii+1].pop(available[iii+1].index(r))
+        available[iii+1].remove(r)
         # update upward Hasse diagram
         R=downward[iii+1][r]
         for i in R:
-          upward[iii][i].pop(upward[iii][i].index(r))
-          if len(upward[iii][i]) == 1:
-            free.append(i)
+          degree[iii][i]-=1
+          cosum[iii][i]-=r
+          if degree[iii][i] == 1 and blocked[iii][i] == 0:
+            free.add(i)
+        for i in repeated[iii+1][r]:
+          blocked[iii][i]-=1
+          if degree[iii][i] == 1 and blocked[iii][i] == 0:
+            free.add(i)
       else:
-        r=random.choice(free)
-        free.pop(free.index(r))
-        pairedFace=upward[iii][r][0]
+        r=free.choice(rng)
+        free.remove(r)
+        pairedFace=cosum[iii][r]
         # keep track of Morse function
         Morse.append([iii,r])
         Morse.append([iii+1,pairedFace])
-        available[iii].pop(available[iii].index(r))
-        available[iii+1].pop(available[iii+1].index(pairedFace))
+        available[iii].remove(r)
+        available[iii+1].remove(pairedFace)
         R=downward[iii+1][pairedFace]
 
         # update upward Hasse diagram
         for i in R:
-          upward[iii][i].pop(upward[iii][i].index(pairedFace))
-          if len(upward[iii][i]) == 1:
-            free.append(i)
-          elif upward[iii][i] == []:
-            if i in free:
-              free.pop(free.index(i))
+          degree[iii][i]-=1
+          cosum[iii][i]-=pairedFace
+          if degree[iii][i] == 1 and blocked[iii][i] == 0:
+            free.add(i)
+          elif degree[iii][i] == 0:
+            free.discard(i)
+        for i in repeated[iii+1][pairedFace]:
+          blocked[iii][i]-=1
+          if degree[iii][i] == 1 and blocked[iii][i] == 0:
+            free.add(i)
         if iii > 1:
           R=downward[iii][r]
           for i in R:
-            upward[iii-1][i].pop(upward[iii-1][i].index(r))
+            degree[iii-1][i]-=1
+            cosum[iii-1][i]-=r
+          for i in repeated[iii][r]:
+            blocked[iii-1][i]-=1
 
-  for i in available[1]:
+  for i in sorted(available[1]):
     Morse.append([1,i])
     critical[1].append(i)
     f[1]+=1
   Morse.append([0,0])
+  if STATS.enabled:
+    STATS.count('collapse trials')
+    STATS.count('critical cells',sum(f))
+    STATS.count('pairs collapsed',(len(Morse)-sum(f))/2)
+    STATS.count('nodes removed',len(Morse))
   return [f,critical,Morse]
 
-def SCAddCrits(s1,s2):
-  for i in range(len(s1)):
-    s1[i][1]=s1[i][1]+s2[i][1];
-  return s1
-
-def SCAddCrit(s,chain):
-  for i in range(len(s)):
-    if s[i][0]==chain[0]:
-      s[i][1]=s[i][1]+chain[1]
-  return s
-
-
-def SCGradient(Morse,face,bdrys):
-  pos=Morse.index([1,face])
-  matching=[]
-  for i in range(pos,len(Morse)):
-    if Morse[i][0] <> 2: continue
-    if not face in [bdrys[Morse[i][1]][0][0],bdrys[Morse[i][1]][1][0],bdrys[Morse[i][1]][2][0]]: continue
-    matching=Morse[i][1]
-    if face == bdrys[Morse[i][1]][0][0]:
-      sign=bdrys[Morse[i][1]][0][1]
-    elif face == bdrys[Morse[i][1]][1][0]:
-      sign=bdrys[Morse[i][1]][1][1]
-    elif face == bdrys[Morse[i][1]][2][0]:
-      sign=bdrys[Morse[i][1]][2][1]
-    break
-  if matching == []:
+### runs collKnotCompl with the seeds seed,...,seed+trials-1 on the Hasse
+### diagram and keeps the Morse function with the fewest
+### critical cells; stops as soon as lowerBound critical cells are reached
+### returns [f,critical,Morse,winning seed] (repeated: see collKnotCompl)
+def SCBestCollapse(upward,downward,t,trials,seed=0,lowerBound=None,repeated=None):
+  best=None
+  for trialSeed in range(seed,seed+trials):
+    tmp=collKnotCompl(upward,downward,t,random.Random(trialSeed),repeated)
+    if best == None or sum(tmp[0]) < sum(best[0]):
+      best=tmp+[trialSeed]
+    if lowerBound <> None and sum(tmp[0]) <= lowerBound:
+      break
+  return best
+
+### returns [triangle,sign] of the gradient triangle of edge 'face', or 0
+### the sign is read from bdrys at call time, since SCFindGradientPaths
+### re-orients the boundaries in place
+def SCGradient(grad,face,bdrys):
+  paired=grad.gradient[face]
+  if paired == None:
     return 0
-  else:
-    return [matching,(-1)*sign]
+  matching,slot=paired
+  return [matching,(-1)*bdrys[matching][slot][1]]
+
+
+### opens the traversal of the gradient paths starting at oriented edge
+### 'chain': returns the frame [chain,s,outgoingEdges,k] of SCFindGradientPaths
+### with the critical edges already added to s (k: next outgoing edge)
+def SCEnterGradientPath(grad,chain,crits,mult,bdrys):
+  # empty chain
+  s=SCChain()
+
+  gradTrig=SCGradient(grad,chain[0],bdrys)
+  if gradTrig==0:
+    # no gradient triangle: the path ends here with the empty chain 's'
+    return [chain,s,[],0]
 
+  #print 'edge', chain[0], '->', 'triangle', gradTrig
+  # case: gradient triangle found
+  # adjust multiplicity of gradient triangle
+  gradTrig[1]=gradTrig[1]*chain[1]
+  boundaryGradTrig=bdrys[gradTrig[0]]
+  # orient boundary
+  if gradTrig[1] == -1:
+    boundaryGradTrig[0][1]*=-1
+    boundaryGradTrig[1][1]*=-1
+    boundaryGradTrig[2][1]*=-1
+  outgoingEdges=[x for x in boundaryGradTrig if x[0]<>chain[0] and grad.before(1,chain[0],x[0])]
+  adjacent=[x[0] for x in outgoingEdges]
+  if STATS.enabled:
+    STATS.count('V-path steps',len(outgoingEdges))
 
-def SCFindGradientPaths(Morse,chain,crits,mult,lookup,bdrys):
+  # case: outgoing edges are critical edges
+  intersection=[x for x in adjacent if x in crits];
+  for i in intersection:
+    pos=adjacent.index(i)
+    if mult == outgoingEdges[pos][1]:
+      s=SCAddCrit(s,[i,1])
+    else:
+      s=SCAddCrit(s,[i,-1])
+    outgoingEdges.pop(pos)
+    adjacent.pop(pos)
+  return [chain,s,outgoingEdges,0]
+
+
+### sum of the critical edges reached by the gradient paths starting at
+### oriented edge 'chain' (an SCChain; crits: set of critical edges)
+### lookup memoises the sum of every edge visited, for the positive
+### orientation only (the negative one is its negation); returns [sum,lookup]
+### the returned sum may be the memoised chain itself: do not change it
+### the paths are followed depth first with an explicit stack of frames
+### (one per edge on the current path), so their length is not bounded by
+### the recursion limit; frames are opened, summed and stored in the same
+### order as the recursive version SCFindGradientPathsRecursive
+def SCFindGradientPaths(grad,chain,crits,mult,lookup,bdrys):
   dict1=lookup
   # check if oriented edge 'chain' was already computed
-  check=dict1.get(tuple(chain))
+  check=dict1.get(chain[0])
   if check<>None:
+    if STATS.enabled:
+      STATS.count('lookup hits')
+    if chain[1] == -1:
+      check=SCChain(check).negate()
+    return [check,dict1]
+
+  # lookups answered by dict1 and edges entered (for --stats)
+  hits=0
+  misses=1
+  stack=[SCEnterGradientPath(grad,chain,crits,mult,bdrys)]
+  while True:
+    frame=stack[-1]
+    outgoingEdges=frame[2]
+    # loop over remaining outgoing edges
+    if frame[3] < len(outgoingEdges):
+      i=outgoingEdges[frame[3]]
+      frame[3]+=1
+      check=dict1.get(i[0])
+      if check<>None:
+        hits+=1
+        frame[1].add(check,i[1])
+      else:
+        misses+=1
+        stack.append(SCEnterGradientPath(grad,i,crits,mult,bdrys))
+      continue
+    # all paths through this edge are summed up: update dictionary
+    # (chain[1] is read again here, the boundary holding it may have been
+    # re-oriented further down the path)
+    chain=frame[0]
+    s=frame[1]
+    if chain[1] == -1:
+      s.negate()
+    dict1[chain[0]]=s
+    stack.pop()
+    if stack == []:
+      if STATS.enabled:
+        STATS.count('lookup hits',hits)
+        STATS.count('lookup misses',misses)
+      if chain[1] == -1:
+        s=SCChain(s).negate()
+      return [s,dict1]
+    stack[-1][1].add(s,chain[1])
+
+
+### recursive version of SCFindGradientPaths (one call per edge on the
+### path), kept as the reference for './benchmarks.py paths'
+def SCFindGradientPathsRecursive(grad,chain,crits,mult,lookup,bdrys):
+  dict1=lookup
+  # check if oriented edge 'chain' was already computed
+  check=dict1.get(chain[0])
+  if check<>None:
+    if chain[1] == -1:
+      check=SCChain(check).negate()
     return [check,dict1]
 
   # empty chain
-  s=[[x,0] for x in crits]
+  s=SCChain()
 
-  gradTrig=SCGradient(Morse,chain[0],bdrys)
+  gradTrig=SCGradient(grad,chain[0],bdrys)
   if gradTrig==0:
     # if no gradient triangle found, update dictionary with empty chain 's'
-    # positive case
-    dict1.update({tuple(chain): s})
-    # negative case
-    dict1.update({tuple([chain[0],-1*chain[1]]): [[x[0],-1*x[1]] for x in s]})
+    dict1[chain[0]]=s
     return [s,dict1]
   
   #print 'edge', chain[0], '->', 'triangle', gradTrig
@@ -227,7 +371,7 @@ def SCFindGradientPaths(Morse,chain,crits,mult,lookup,bdrys):
     boundaryGradTrig[0][1]*=-1
     boundaryGradTrig[1][1]*=-1
     boundaryGradTrig[2][1]*=-1
-  outgoingEdges=[x for x in boundaryGradTrig if x[0]<>chain[0] and Morse.index([1,chain[0]]) < Morse.index([1,x[0]])]
+  outgoingEdges=[x for x in boundaryGradTrig if x[0]<>chain[0] and grad.before(1,chain[0],x[0])]
   adjacent=[x[0] for x in outgoingEdges]
 
   # case: outgoing edges are critical edges
@@ -250,63 +394,70 @@ def SCFindGradientPaths(Morse,chain,crits,mult,lookup,bdrys):
   for i in outgoingEdges:
     #print 'SCFindGradientPaths:', x, ',', i, ',',  crits, ',', lookup
     #print 'SCFindGradientPaths:', Morse.index([1,i[0]]), Morse.index([1,crits[0]]), Morse.index([1,crits[1]]), dict1
-    new=SCFindGradientPaths(Morse,i,crits,mult,dict1,bdrys)
+    new=SCFindGradientPathsRecursive(grad,i,crits,mult,dict1,bdrys)
     dict1=new[1]
     s=SCAddCrits(s,new[0])
-  dict1.update({tuple(chain): s})
-  dict1.update({tuple([chain[0],-1*chain[1]]): [[x[0],-1*x[1]] for x in s]});
+  if chain[1] == -1:
+    dict1[chain[0]]=SCChain(s).negate()
+  else:
+    dict1[chain[0]]=s
   return [s,dict1]
 
 
 # compute bdry operator between triangles and edges
 # in a knot complement
-def SCBdryOp(Morse,critsUp,critsDown,t,bdrys):
+# (findPaths: SCFindGradientPathsRecursive to compare with the old traversal)
+def SCBdryOp(Morse,critsUp,critsDown,t,bdrys,findPaths=SCFindGradientPaths):
   lookup = {}
+  grad = SCMorseGradient(Morse,bdrys)
+  crits = set(critsDown)
   tau=[]
   for i in critsUp:
-    s=[]
     #f = t.getTriangle(i)
     f = t.face(2,i)
     bd = bdrys[i]
-    for x in critsDown:
-      s.append([x,0])
+    s=SCChain()
     for ii in bd:
-      if ii[0] in critsDown:
+      if ii[0] in crits:
         s=SCAddCrit(s,ii)
       else:
-        new=SCFindGradientPaths(Morse,ii,critsDown,1,lookup,bdrys)
+        new=findPaths(grad,ii,crits,1,lookup,bdrys)
         s1=new[0]
         s=SCAddCrits(s,s1)
     tau.append(s)
   tau2=[]
-  for i in range(len(critsDown)):
+  for x in critsDown:
     row=[]
     for ii in range(len(critsUp)):
-      row.append(tau[ii][i][1])
+      row.append(tau[ii].coefficient(x))
     tau2.append(row)
   return tau2
 
 
-##########################################
-##########################################
-#########END HELPER FUNCTIONS ############
-##########################################
-##########################################
+### computes the Hasse diagram, a Morse function and the induced boundary
+### operator of the triangulation with isomorphism signature 'line', and
+### returns them in a dictionary (see SCFormatResult for the printed text)
+### trials, seed, lowerBound: number of seeded collapse trials, seed of the
+### first trial, and the number of critical cells at which to stop early
+### (1 vertex + 1 tetrahedron is the minimum for a closed triangulation)
+### the stages of SCComputeIsoSig (see censusPipeline.py): each adds its
+### results to the dict item
 
-ctr=0
-for line in sys.stdin:
-  if ctr > 0: # max added to stop loop
-    break
-  ctr += 1
+### decode: the triangulation item['t'] of item['line']
+def SCDecode(item):
   #if ctr%1000 == 0:
   #  print ctr
   #sig = re.search('[a-zA-Z0-9]*' ,line)
   #t = NTriangulation.fromIsoSig(line)
-  t = Triangulation3.fromIsoSig(line)
+  item['t'] = Triangulation3.fromIsoSig(item['line'])
   #print t.isoSig()
   #print t.detail()
   #print list([v for v in t.vertex_iterator()])
 
+### Hasse: item['upward'] and item['downward'] (multiple edges removed), and
+### the removed multiple faces item['repeated']
+def SCHasse(item):
+  t = item['t']
 
   #vertices = t.getVertices() OG
   vertices = t.faces(0)
@@ -372,6 +523,12 @@ for line in sys.stdin:
       idx = faces.index(tet[i].face(2,j))
       downward[3][i].append(idx)
       upward[2][idx].append(i)
+  # faces that occur more than once in a boundary, whose arcs are removed
+  # below (repeated[k][i]: those (k-1)-faces of the k-face i)
+  repeated=[None,None,[],[]]
+  for k in [2,3]:
+    for x in downward[k]:
+      repeated[k].append(sorted(set([y for y in x if x.count(y) > 1])))
   # remove double edges
 #  for i in range(len(downward[1])):
 #    for j in range(t.getNumberOfVertices()):
@@ -399,13 +556,24 @@ for line in sys.stdin:
   for i in range(len(upward[2])):
     for j in range(t.size()):            # renamed
       if upward[2][i].count(j) > 1:
-        upward[2][i]=[y for y in upward[2][i] if y != j] 
-
-  tmp = collKnotCompl(upward,downward,t)
-  f = tmp[0]
-  critical = tmp[1]
-  Morse = tmp[2]
-  bdrys = SCBdry(t)
+        upward[2][i]=[y for y in upward[2][i] if y != j]
+  item['upward'] = upward
+  item['downward'] = downward
+  item['repeated'] = repeated
+
+### collapse: item['f'], item['critical'], item['Morse'] and the winning
+### item['seed'] of SCBestCollapse; with regular, only along elementary
+### collapses of the triangulation itself (see collKnotCompl)
+def SCCollapse(item,trials,seed,lowerBound,regular=False):
+  if regular:
+    repeated = item['repeated']
+  else:
+    repeated = None
+  tmp = SCBestCollapse(item['upward'],item['downward'],item['t'],trials,seed,lowerBound,repeated)
+  item['f'] = tmp[0]
+  item['critical'] = tmp[1]
+  item['Morse'] = tmp[2]
+  item['seed'] = tmp[3]
 
   #test=[0,0,0,0]
   #for i in Morse:
@@ -415,49 +583,157 @@ for line in sys.stdin:
   #print critical
   #print t.toStringLong()
 
+### boundaries: item['bdrys'] of SCBdry
+def SCBoundaries(item):
+  item['bdrys'] = SCBdry(item['t'])
+
 ################ NEW STUFF ###############
 
-  critsUp=critical[2]
-  critsDown=critical[1]
+### operator: the induced boundary operator item['operator'], and with
+### homology the Betti numbers and torsion coefficients of H_0,...,H_3 and
+### the chain complex they were computed on (see triangulation_homology);
+### without torsion only the Betti numbers, from ranks modulo a large prime,
+### and None for the torsion coefficients
+def SCOperator(item,homology,torsion=True):
+  critsUp=item['critical'][2]
+  critsDown=item['critical'][1]
 
   # get boundary operator
 #  print t.isoSig()
-  tmp=SCBdryOp(Morse,critsUp,critsDown,t,bdrys)
-
-
-  # here you can say how many critical cells you want to have at least before you output something. 
-  # At the moment everything is printed.
-  if len(critsUp) < 0:
-    continue
-  else:
-    # checking for critical dunce hats and similar trivial examples
-    for j in critsUp:
-      if bdrys[j][0][1]==bdrys[j][1][1] and bdrys[j][0][1]==bdrys[j][2][1]: continue
-    print '# isomorphism signature:',
-    print t.isoSig(), '\n\n'
-    print '# downward Hasse diagram (with multiple edges removed)'
-    print '['
-    print '# tetrahedra to triangles'
-    print downward[3]
-    print '# triangles to edges'
-    print downward[2]
-    print ']\n\n'
-    print 'Morse function ([i,j] means j-th face of dimension i):\n'
-    print Morse, '\n\n'
-    print 'critical triangle(s):\t', critsUp, '\tcritical edges:\t', critsDown, '\n\n'
-    print 'oriented boundaries of triangles (k-th entry [[i_0,s_0],[i_1,s_1],[i_2,s_2]]: i_j = j-th edge of triangle k, s_j = orientation of i_j)\n'
-    for i in bdrys:
-      print i
-    print '\n'
-    print 'induced boundary operator between critical triangles (columns) and critical edges (rows)\n'
-    for i in tmp:
-      print i
-
-#    print t.toStringLong(), "\n\n\n\n\n"
-    print "\n\n\n\n\n"
-
-
-
+  item['operator']=SCMorseBdryOp(item['Morse'],critsUp,critsDown,item['bdrys'])
+  if homology:
+    pairs,critical = collapse_gradient([item['f'],item['critical'],item['Morse']])
+    betti,factors,chainComplex = triangulation_homology(item['t'],pairs,critical,torsion)
+    if not torsion:
+      factors = None
+    item['homology'] = (betti,factors,chainComplex)
+
+### the stages decode -> Hasse -> collapse -> boundaries -> operator, without
+### predicates (add them with add_predicate or censusPipeline.add_predicates)
+### with homology the collapse is regular (see collKnotCompl), so that the
+### operator and the homology come from the same Morse complex
+def SCPipeline(trials=1,seed=0,lowerBound=2,homology=False,torsion=True):
+  return Pipeline([Stage('decode', SCDecode), Stage('hasse', SCHasse),
+                   Stage('collapse', SCCollapse, (trials, seed, lowerBound, homology)),
+                   Stage('boundaries', SCBoundaries), Stage('operator', SCOperator, (homology, torsion))])
+
+### result of one census line: runs the stages of pipeline (by default
+### SCPipeline(trials,seed,lowerBound,homology)); 'rejected' is None or the
+### [stage, predicate] that dropped the triangulation, whose later results
+### are then missing
+def SCComputeIsoSig(line,trials=1,seed=0,lowerBound=2,homology=False,pipeline=None):
+  if pipeline == None:
+    pipeline = SCPipeline(trials,seed,lowerBound,homology)
+  item = pipeline.process({'line': line})
+  result = {'isoSig': item['t'].isoSig(), 'rejected': item['rejected']}
+  for key in ['downward', 'f', 'critical', 'Morse', 'seed', 'bdrys', 'operator', 'homology']:
+    if key in item:
+      result[key] = item[key]
+  return result
+
+
+### returns the text printed for a result of SCComputeIsoSig; the seed of
+### the collapse is only printed with showSeed (--seed or --trials given),
+### so the default output keeps its original format
+def SCFormatResult(result,showSeed=False):
+  out = cStringIO.StringIO()
+  # triangulations rejected by a predicate of the pipeline (too few critical
+  # triangles, critical dunce hats, ... see censusPipeline.py) are not
+  # printed. By default there are no predicates and everything is printed.
+  if result.get('rejected') <> None:
+    return out.getvalue()
+  downward = result['downward']
+  Morse = result['Morse']
+  winningSeed = result['seed']
+  critsUp = result['critical'][2]
+  critsDown = result['critical'][1]
+  bdrys = result['bdrys']
+  tmp = result['operator']
+
+  print >>out, '# isomorphism signature:',
+  print >>out, result['isoSig'], '\n\n'
+  print >>out, '# downward Hasse diagram (with multiple edges removed)'
+  print >>out, '['
+  print >>out, '# tetrahedra to triangles'
+  print >>out, downward[3]
+  print >>out, '# triangles to edges'
+  print >>out, downward[2]
+  print >>out, ']\n\n'
+  print >>out, 'Morse function ([i,j] means j-th face of dimension i):\n'
+  print >>out, Morse, '\n\n'
+  if showSeed:
+    print >>out, 'seed of the collapse:\t', winningSeed, '\n\n'
+  print >>out, 'critical triangle(s):\t', critsUp, '\tcritical edges:\t', critsDown, '\n\n'
+  print >>out, 'oriented boundaries of triangles (k-th entry [[i_0,s_0],[i_1,s_1],[i_2,s_2]]: i_j = j-th edge of triangle k, s_j = orientation of i_j)\n'
+  for i in bdrys:
+    print >>out, i
+  print >>out, '\n'
+  print >>out, 'induced boundary operator between critical triangles (columns) and critical edges (rows)\n'
+  for i in tmp:
+    print >>out, i
+  if 'homology' in result:
+    print >>out, '\n'
+    print >>out, 'homology (Betti numbers of H_0,...,H_3, torsion coefficients of H_0,...,H_3):\t', result['homology'][0], '\t', result['homology'][1]
+    # 'morse': the Morse complex of the collapse, whose 2->1 boundary is the
+    # operator above; 'simplicial': the collapse was not a gradient of the
+    # triangulation and the whole simplicial chain complex was used
+    print >>out, 'homology computed on (morse: Morse complex of the operator above, simplicial: simplicial chain complex):\t', result['homology'][2]
+
+#  print t.toStringLong(), "\n\n\n\n\n"
+  print >>out, "\n\n\n\n\n"
+  return out.getvalue()
+
+
+### returns the record (see censusRecords.py) of a result of SCComputeIsoSig
+def SCRecord(result):
+  # same filter as SCFormatResult
+  if result.get('rejected') <> None:
+    return None
+  critsUp = result['critical'][2]
+  critsDown = result['critical'][1]
+  return make_record(result['isoSig'], result['downward'], result['Morse'], critsUp, critsDown,
+                     result['bdrys'], result['operator'], seed=result['seed'], homology=result.get('homology'))
 
 
+##########################################
+##########################################
+#########END HELPER FUNCTIONS ############
+##########################################
+##########################################
 
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Morse functions and induced boundary operators for a census of isomorphism signatures (stdin or --input)')
+  add_driver_options(parser, max_lines=1) # max 1 added to stop loop
+  parser.add_argument('--trials', type=int, default=None, help='seeded collapse trials per triangulation (default: 1)')
+  parser.add_argument('--seed', type=int, default=None, help='seed of the first collapse trial (default: 0, so that a run and its cached results are reproducible); with --seed or --trials the text output also shows the winning seed')
+  parser.add_argument('--lower-bound', type=int, default=2, help='stop the trials once this many critical cells are reached')
+  parser.add_argument('--format', choices=('text',)+RECORD_FORMATS, default='text', help='output text (default), JSON Lines or binary records')
+  parser.add_argument('--homology', action='store_true', help='also output Betti numbers and torsion coefficients (Smith normal form of the Morse complex); the collapse then never frees a face repeated in a remaining cell, so the operator belongs to the same Morse complex')
+  parser.add_argument('--betti-only', action='store_true', help='with --homology, only the Betti numbers, from ranks modulo a large prime (the entries never grow); no torsion coefficients')
+  parser.add_argument('--stage-report', action='store_true', help='print the passed and rejected triangulations per stage to stderr at the end')
+  add_pipeline_options(parser)
+  options = parser.parse_args()
+  showSeed = options.seed <> None or options.trials <> None
+  if options.trials == None:
+    options.trials = 1
+  if options.seed == None:
+    options.seed = 0
+
+  pipeline = SCPipeline(options.trials, options.seed, options.lower_bound, options.homology, not options.betti_only)
+  predicates = add_predicates(pipeline, options)
+
+  if options.format == 'text':
+    render = lambda result: SCFormatResult(result,showSeed)
+    tag = None
+  else:
+    render = record_renderer(options.format, SCRecord)
+    tag = record_tagger(options.format)
+
+  # results are cached per isoSig and these parameters; bump 'version'
+  # whenever the computed data changes
+  cacheParams = {'version': 6, 'trials': options.trials, 'seed': options.seed, 'lowerBound': options.lower_bound,
+                 'homology': options.homology, 'torsion': not options.betti_only, 'predicates': predicates}
+  drive_census(options, SCComputeIsoSig, (options.trials, options.seed, options.lower_bound, options.homology, pipeline),
+               render=pipeline.counting(render), cache_params=cacheParams, tag=tag)
+  if options.stage_report:
+    pipeline.print_report()
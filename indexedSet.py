@@ -0,0 +1,54 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Set of cell indices with constant-time add, remove and random choice
+#
+# The collapses (collKnotCompl of the census scripts, morse_collapse of
+# morseCollapse.py) keep their free faces and remaining cells in
+# IndexedSets, so that every step of a collapse takes constant time.
+###############################################################################
+
+
+class IndexedSet(object):
+    """
+    Set of the integers 0, ..., size-1 with O(1) add, remove and uniform random choice: the members are
+    kept in a list, and pos[i] is the place of i in it (-1: not a member), so a member is removed by moving
+    the last one into its place.
+    """
+    __slots__ = ('members', 'pos')
+
+    def __init__(self, size, members = ()):
+        self.members = []
+        self.pos = [-1] * size
+        for i in members:
+            self.add(i)
+
+    def add(self, i):
+        if self.pos[i] < 0:
+            self.pos[i] = len(self.members)
+            self.members.append(i)
+
+    def remove(self, i):
+        p = self.pos[i]
+        last = self.members.pop()
+        if last != i:
+            self.members[p] = last
+            self.pos[last] = p
+        self.pos[i] = -1
+
+    def discard(self, i):
+        if self.pos[i] >= 0:
+            self.remove(i)
+
+    def choice(self, rng):
+        # uniform over the members, like rng.choice on a list of them
+        return rng.choice(self.members)
+
+    def __contains__(self, i):
+        return self.pos[i] >= 0
+
+    def __len__(self):
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.members)
@@ -0,0 +1,330 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Random collapse (Morse matching) of a triangulation in any dimension
+#
+# collKnotCompl of the census scripts only handles dimension 3. morse_collapse
+# runs the same collapse on the Hasse diagram of any dimension, as built by
+# hasse.compute_hasse (NumPy CSR arrays) or FacePoset.hasse_diagram (lists):
+# from the top down, every (k+1)-cell is either collapsed through a free
+# k-face, chosen uniformly at random, or, when there is no free face, made
+# critical (chosen uniformly at random among the remaining ones). Free faces
+# and remaining cells are kept in IndexedSets and the cofaces in degree
+# counters, so each step takes constant time.
+#
+# The choices are pluggable (CollapseStrategy, STRATEGIES): random (the
+# default), lowest index, max-degree critical cells and a lexicographic
+# order from a BFS of the dual graph. ./benchmarks.py strategies compares
+# their critical cell counts and running times on 5.sig.
+#
+# bzcat <file>.sig.bz2 | ./morseCollapse.py -d 4 -n 0 -o <file>.morse.bz2
+#   f-vectors, critical cells and Morse functions of a census of
+#   Triangulation4 isoSigs (input, output, -j etc. as in censusDriver);
+#   --bottom 0 also collapses edges onto vertices (spanning tree), for
+#   triangulations with more than one vertex; --strategy picks the choices
+###############################################################################
+
+import random
+
+import heapq
+
+from collections import deque
+
+import argparse
+
+import cStringIO
+
+# Hasse diagrams of any dimension
+from hasse import compute_hasse, csr_rows
+
+# parallel census driver
+from censusDriver import drive_census, add_driver_options
+
+# free faces and remaining cells of the collapse
+from indexedSet import IndexedSet
+
+
+def _rows(layer):
+    # a layer of the diagram as a list of lists, from CSR arrays (ptr, idx) or lists
+    if isinstance(layer, tuple):
+        return csr_rows(layer)
+    return layer
+
+
+class OrderedSet(object):
+    """
+    Set of the integers 0, ..., size-1 whose choice is always the member of least key (key[i], i; the
+    index itself if key is None), for the deterministic strategies. A heap of (key, member) entries
+    with lazy deletion: removed members stay in the heap until they reach the top.
+    """
+    __slots__ = ('heap', 'member', 'key', 'count')
+
+    def __init__(self, size, key = None, members = ()):
+        self.heap = []
+        self.member = bytearray(size)
+        self.key = key
+        self.count = 0
+        for i in members:
+            self.add(i)
+
+    def add(self, i):
+        if not self.member[i]:
+            self.member[i] = 1
+            self.count += 1
+            heapq.heappush(self.heap, (i if self.key is None else self.key[i], i))
+
+    def remove(self, i):
+        self.member[i] = 0
+        self.count -= 1
+
+    def discard(self, i):
+        if self.member[i]:
+            self.remove(i)
+
+    def choice(self, rng):
+        heap = self.heap
+        while not self.member[heap[0][1]]:
+            heapq.heappop(heap)
+        return heap[0][1]
+
+    def __contains__(self, i):
+        return self.member[i] == 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (i for i in xrange(len(self.member)) if self.member[i])
+
+
+class CollapseStrategy(object):
+    """
+    How morse_collapse picks the free face to collapse next and the cell to make critical when there is
+    none. This base strategy chooses both uniformly at random from the rng, as collKnotCompl does;
+    subclasses change the containers (cells, free_faces: an IndexedSet or OrderedSet per dimension or
+    level) or the choices (free_face among the free faces of a level, critical_cell among the cells of a
+    dimension).
+    prepare is called once per collapse with the diagram and the degree counters, which morse_collapse
+    keeps up to date: degree[d][i] is the number of remaining (d+1)-cells containing the d-cell i.
+    """
+    name = 'random'
+
+    def prepare(self, upward, downward, degree):
+        self.upward = upward
+        self.downward = downward
+        self.degree = degree
+
+    def cells(self, dim, size):
+        return IndexedSet(size, xrange(size))
+
+    def free_faces(self, level, size):
+        return IndexedSet(size)
+
+    def free_face(self, free, level, rng):
+        return free.choice(rng)
+
+    def critical_cell(self, cells, dim, rng):
+        return cells.choice(rng)
+
+
+class LowestIndexStrategy(CollapseStrategy):
+    """
+    Always the free face, and the critical cell, of least index.
+    """
+    name = 'lowest'
+
+    def cells(self, dim, size):
+        return OrderedSet(size, None, xrange(size))
+
+    def free_faces(self, level, size):
+        return OrderedSet(size)
+
+
+class MaxDegreeStrategy(LowestIndexStrategy):
+    """
+    Free faces of least index; the critical cell is the one that frees the most faces (those of degree
+    2), ties going to the least index. Finding it scans the remaining cells, which is cheap as long as
+    there are few critical cells.
+    """
+    name = 'max-degree'
+
+    def critical_cell(self, cells, dim, rng):
+        degree = self.degree[dim - 1]
+        faces = self.downward[dim]
+        best, best_count = None, -1
+        for r in cells:
+            count = 0
+            for i in faces[r]:
+                if degree[i] == 2:
+                    count += 1
+            if count > best_count:
+                best, best_count = r, count
+        return best
+
+
+class DualGraphStrategy(CollapseStrategy):
+    """
+    Lexicographic order from a breadth-first search of the dual graph: the simplices are ranked in BFS
+    order from simplex 0 (neighbours in increasing order), and the k-cells by the least rank of their
+    (k+1)-cofaces, then by index. Free faces and critical cells of least rank are taken first, so the
+    collapse sweeps through the triangulation from one end.
+    """
+    name = 'bfs'
+
+    def prepare(self, upward, downward, degree):
+        CollapseStrategy.prepare(self, upward, downward, degree)
+        n = len(downward) - 1
+        size = len(downward[n])
+        rank = [None] * size
+        order = 0
+        for start in xrange(size):
+            if rank[start] is not None:
+                continue
+            rank[start] = order
+            order += 1
+            queue = deque([start])
+            while queue:
+                s = queue.popleft()
+                neighbours = set()
+                for facet in downward[n][s]:
+                    neighbours.update(upward[n - 1][facet])
+                for other in sorted(neighbours):
+                    if rank[other] is None:
+                        rank[other] = order
+                        order += 1
+                        queue.append(other)
+        self.ranks = [None] * (n + 1)
+        self.ranks[n] = rank
+        for d in xrange(n - 1, -1, -1):
+            above = self.ranks[d + 1]
+            keys = [(min([above[c] for c in cofaces]) if cofaces else len(above), i)
+                    for i, cofaces in enumerate(upward[d])]
+            rank = [0] * len(keys)
+            for position, (key, i) in enumerate(sorted(keys)):
+                rank[i] = position
+            self.ranks[d] = rank
+
+    def cells(self, dim, size):
+        return OrderedSet(size, self.ranks[dim], xrange(size))
+
+    def free_faces(self, level, size):
+        return OrderedSet(size, self.ranks[level])
+
+
+STRATEGIES = dict((cls.name, cls) for cls in
+                  [CollapseStrategy, LowestIndexStrategy, MaxDegreeStrategy, DualGraphStrategy])
+
+
+def morse_collapse(upward, downward, rng = random, bottom = 1, strategy = None):
+    """
+    Collapses the Hasse diagram (upward, downward) of a triangulation of dimension n = len(downward) - 1:
+    upward[k][i] lists the (k+1)-cells containing the k-cell i and downward[k][i] the (k-1)-faces of the
+    k-cell i, with multiple edges removed (CSR arrays as from hasse.compute_hasse, or lists of lists).
+    The levels n -> n-1 down to bottom+1 -> bottom are collapsed; the cells of dimension bottom and below
+    that are left over are critical, in increasing order. strategy (a CollapseStrategy or one of the
+    names in STRATEGIES) picks free faces and critical cells; by default both are random, taken from rng.
+
+    Returns [f, critical, Morse] as collKnotCompl of hasseDiagramCopy.py does: f[d] is the number of
+    critical d-cells, critical[d] their list, and Morse the list of [dimension, index] cells in collapse
+    order (each collapsed face directly followed by its coface). For a one-vertex 3-manifold, the
+    diagrams of compute_hasse and the same rng give exactly the result of collKnotCompl.
+    """
+    if strategy is None:
+        strategy = CollapseStrategy()
+    elif isinstance(strategy, basestring):
+        strategy = STRATEGIES[strategy]()
+    up = [_rows(layer) for layer in upward]
+    down = [_rows(layer) for layer in downward]
+    n = len(down) - 1
+    counts = [len(up[d]) for d in xrange(n)] + [len(down[n])]
+    f = [0] * (n + 1)
+    critical = [[] for d in xrange(n + 1)]
+    morse = []
+    # degree[d][i]: number of (d+1)-cells still containing the d-cell i, and cosum[d][i] the sum of their
+    # indices, which is the remaining coface once the degree is 1
+    degree = [[len(cofaces) for cofaces in up[d]] for d in xrange(n)]
+    cosum = [[sum(cofaces) for cofaces in up[d]] for d in xrange(n)]
+    strategy.prepare(up, down, degree)
+    available = [strategy.cells(d, counts[d]) for d in xrange(n + 1)]
+
+    for level in xrange(n - 1, bottom - 1, -1):
+        free = strategy.free_faces(level, counts[level])
+        for i in xrange(counts[level]):
+            if degree[level][i] == 1:
+                free.add(i)
+        cells = available[level + 1]
+        while len(cells) > 0:
+            if len(free) == 0:
+                r = strategy.critical_cell(cells, level + 1, rng)
+                f[level + 1] += 1
+                morse.append([level + 1, r])
+                critical[level + 1].append(r)
+                cells.remove(r)
+                for i in down[level + 1][r]:
+                    degree[level][i] -= 1
+                    cosum[level][i] -= r
+                    if degree[level][i] == 1:
+                        free.add(i)
+            else:
+                r = strategy.free_face(free, level, rng)
+                free.remove(r)
+                paired = cosum[level][r]
+                morse.append([level, r])
+                morse.append([level + 1, paired])
+                available[level].remove(r)
+                cells.remove(paired)
+                for i in down[level + 1][paired]:
+                    degree[level][i] -= 1
+                    cosum[level][i] -= paired
+                    if degree[level][i] == 1:
+                        free.add(i)
+                    elif degree[level][i] == 0:
+                        free.discard(i)
+                if level > bottom:
+                    for i in down[level][r]:
+                        degree[level - 1][i] -= 1
+                        cosum[level - 1][i] -= r
+
+    for d in xrange(bottom, -1, -1):
+        for i in sorted(available[d]):
+            morse.append([d, i])
+            critical[d].append(i)
+            f[d] += 1
+    return [f, critical, morse]
+
+
+def collapse_isosig(line, dimension = 3, seed = 0, bottom = 1, strategy = 'random'):
+    """
+    compute_hasse and morse_collapse (seeded with seed, down to bottom, with the named strategy) of one
+    census line. Returns a dict with the isoSig, f, critical and Morse.
+    """
+    t, upward, downward = compute_hasse(line.split()[0], dimension)
+    f, critical, morse = morse_collapse(upward, downward, random.Random(seed), bottom, strategy)
+    return {'isoSig': t.isoSig(), 'f': f, 'critical': critical, 'Morse': morse}
+
+
+def format_collapse(result):
+    out = cStringIO.StringIO()
+    print >>out, '# isomorphism signature:', result['isoSig']
+    print >>out, 'critical cells per dimension:\t', result['f']
+    print >>out, 'critical cells ([i_0,...] of dimension 0, 1, ...):\t', result['critical']
+    print >>out, 'Morse function ([i,j] means j-th face of dimension i):\t', result['Morse']
+    print >>out
+    return out.getvalue()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Morse collapses of a census of isomorphism signatures in any dimension')
+    add_driver_options(parser)
+    parser.add_argument('-d', '--dimension', type = int, default = 4, help = 'dimension of the triangulations (2-8)')
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed of the collapse of every triangulation')
+    parser.add_argument('--bottom', type = int, default = 1, choices = [0, 1],
+                        help = 'lowest level collapsed onto: 1 (edges, as collKnotCompl) or 0 (vertices too, for multi-vertex triangulations)')
+    parser.add_argument('--strategy', default = 'random', choices = sorted(STRATEGIES),
+                        help = 'choice of free faces and critical cells (default: %(default)s)')
+    options = parser.parse_args()
+
+    cache_params = {'version': 2, 'dimension': options.dimension, 'seed': options.seed, 'bottom': options.bottom,
+                    'strategy': options.strategy}
+    drive_census(options, collapse_isosig, (options.dimension, options.seed, options.bottom, options.strategy),
+                 render = format_collapse, cache_params = cache_params)
@@ -0,0 +1,278 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Morse chain complex of a discrete gradient on a 3-manifold triangulation
+#
+# The census scripts only compute the induced boundary operator from the
+# critical triangles to the critical edges. morse_complex builds all of
+# them (3->2, 2->1, 1->0) from one gradient field, given as the Morse
+# function of collKnotCompl (see collapse_gradient) or the output of
+# FacePoset.randomised_morse_matching. Homology can then be computed on the
+# Morse complex, which has one generator per critical cell, instead of on
+# the full simplicial chain complex (see triangulation_homology).
+#
+# collKnotCompl collapses the Hasse diagram without multiple edges, so by
+# default its Morse function need not be a gradient of the triangulation:
+# a face repeated in the boundary of a cell can be collapsed while that cell
+# is still there, and the V-paths through it can close up. Only collapses
+# with repeated (SCCollapse with regular, hasseDiagramCopy.py --homology)
+# are always gradients of the triangulation; their Morse complex has the
+# operator of SCMorseBdryOp as its 2->1 boundary.
+###############################################################################
+
+# signed incidences of all faces
+from orientedBoundaries import boundary_arrays, boundary_lists
+
+# invariant factors of the boundary matrices
+from smithNormalForm import chain_complex_homology
+
+# counts the fallbacks to the simplicial chain complex (--stats)
+from censusStats import STATS
+
+
+class MorseComplexError(Exception):
+    pass
+
+
+def oriented_boundaries(triangulation):
+    """
+    Returns the oriented boundaries of all cells of a Regina Triangulation3: boundaries[k][i] is the list of
+    [face index, sign] pairs of the (k-1)-faces of the i-th k-face (k = 1, 2, 3; k = 3 are the tetrahedra),
+    in the order of the faces of the cell. Each cell is oriented by its own vertex numbering, so the signs
+    satisfy boundary o boundary = 0. For triangles these are the boundaries SCBdry of hasseDiagramCopy.py
+    computes. (orientedBoundaries.boundary_arrays as lists.)
+    """
+    return boundary_lists(boundary_arrays(triangulation))
+
+
+def collapse_gradient(collapse):
+    """
+    Turns the output [f, critical, Morse] of collKnotCompl (or [f, critical, Morse, seed] of SCBestCollapse)
+    into (pairs, critical) as returned by FacePoset.randomised_morse_matching: pairs is the list of
+    ((dim, face), (dim+1, coface)) tuples in collapse order, critical the list of (dim, index) cells.
+    """
+    critical_lists, morse = collapse[1], collapse[2]
+    critical = set()
+    cells = []
+    for dim in xrange(len(critical_lists)):
+        for i in critical_lists[dim]:
+            critical.add((dim, i))
+            cells.append((dim, i))
+    pairs = []
+    pos = 0
+    while pos < len(morse):
+        cell = tuple(morse[pos])
+        if cell in critical:
+            pos += 1
+            continue
+        if pos + 1 >= len(morse) or morse[pos + 1][0] != cell[0] + 1:
+            raise MorseComplexError('cell '+str(cell)+' of the Morse function is neither critical nor paired')
+        pairs.append((cell, tuple(morse[pos + 1])))
+        pos += 2
+    return pairs, cells
+
+
+def _add(chain, other, factor):
+    for cell, coefficient in other.iteritems():
+        c = chain.get(cell, 0) + factor * coefficient
+        if c:
+            chain[cell] = c
+        else:
+            chain.pop(cell, None)
+
+
+def morse_complex(boundaries, pairs, critical):
+    """
+    Builds the Morse chain complex of a discrete gradient.
+
+    boundaries is as returned by oriented_boundaries, pairs the gradient as ((dim, face), (dim+1, coface))
+    tuples and critical the critical (dim, index) cells. Returns (cells, matrices): cells[d] lists the
+    critical d-cells in the order of critical, and matrices[k] (k = 1, 2, 3) is the boundary from critical
+    k-cells to critical (k-1)-cells, with one row per critical (k-1)-cell and one column per critical k-cell
+    (the layout of SCBdryOp).
+
+    The flow of a (k-1)-cell x paired with the k-cell c is the chain of critical (k-1)-cells reached from x:
+    -a times the flows of the other faces of c, with a = +-1 the coefficient of x in the boundary of c.
+    Critical cells flow to themselves and cells paired with one of their faces to 0. Each flow is computed
+    once, after the flows it depends on, so the work is linear in the incidences times the nonzero
+    coefficients.
+
+    The flow follows every face of c, including multiple faces whose arcs collKnotCompl (or FacePoset after
+    strip_multi_edges) removed from the Hasse diagram, so the homology of this complex is the homology of the
+    triangulation. A matching that is only acyclic without those arcs (a default collKnotCompl collapse, see
+    above) raises MorseComplexError. For a collapse with repeated the faces of c other than x all come after
+    x in the Morse function, so the 2->1 matrix is the operator SCMorseBdryOp computes.
+    """
+    top = max(boundaries.keys())
+    cells = dict((d, []) for d in xrange(top + 1))
+    is_critical = set()
+    for cell in critical:
+        cells[cell[0]].append(cell[1])
+        is_critical.add(tuple(cell))
+    paired_up = {}
+    paired_down = set()
+    for face, coface in pairs:
+        paired_up[tuple(face)] = tuple(coface)
+        paired_down.add(tuple(coface))
+
+    check_gradient(boundaries, paired_up)
+
+    matrices = {}
+    for k in xrange(1, top + 1):
+        flow = {}
+        rows = dict((cells[k - 1][r], r) for r in xrange(len(cells[k - 1])))
+        matrix = [[0] * len(cells[k]) for r in cells[k - 1]]
+        for column in xrange(len(cells[k])):
+            chain = {}
+            for y, sign in boundaries[k][cells[k][column]]:
+                _add(chain, _flow(k - 1, y, boundaries[k], flow, is_critical, paired_up, paired_down), sign)
+            for y, coefficient in chain.iteritems():
+                matrix[rows[y]][column] = coefficient
+        matrices[k] = matrix
+    return cells, matrices
+
+
+def check_gradient(boundaries, paired_up):
+    """
+    Raises MorseComplexError unless the pairs paired_up {(dim, face): (dim+1, coface)} form a gradient:
+    every face must be a regular face of its coface, and there must be no closed V-path. The flows of
+    morse_complex only see the V-paths that start at critical cells, so a cyclic matching whose cycles
+    are not reached from them would otherwise pass (a perfect Morse function on a lens space, say).
+    """
+    successors = {}
+    for (dim, x), (up, c) in paired_up.iteritems():
+        faces = [y for y, sign in boundaries[up][c]]
+        if faces.count(x) != 1:
+            raise MorseComplexError('irregular pair '+str((dim, x))+' - '+str((up, c)))
+        successors[(dim, x)] = [(dim, y) for y in faces if y != x and (dim, y) in paired_up]
+    # Kahn's algorithm: every cell of an acyclic V-path graph is eventually removed
+    indegree = dict((cell, 0) for cell in successors)
+    for cell, nexts in successors.iteritems():
+        for y in nexts:
+            indegree[y] += 1
+    ready = [cell for cell, d in indegree.iteritems() if d == 0]
+    removed = 0
+    while ready:
+        cell = ready.pop()
+        removed += 1
+        for y in successors[cell]:
+            indegree[y] -= 1
+            if indegree[y] == 0:
+                ready.append(y)
+    if removed != len(successors):
+        raise MorseComplexError('closed V-path among '+str(len(successors) - removed)+' paired cells')
+
+
+def _flow(dim, x, boundaries, flow, is_critical, paired_up, paired_down):
+    """
+    Returns the flow of the dim-cell x, computing (and storing in flow) the flows of all paired cells it
+    depends on first. boundaries are those of the (dim+1)-cells. Uses an explicit stack, since V-paths can
+    be much longer than the recursion limit.
+    """
+    def leaf(y):
+        cell = (dim, y)
+        if cell in is_critical:
+            return {y: 1}
+        if cell in paired_down:
+            # collapsed together with one of its faces: no flow through it
+            return {}
+        if cell not in paired_up:
+            raise MorseComplexError('cell '+str(cell)+' is neither critical nor paired')
+        return None
+
+    result = leaf(x)
+    if result is not None:
+        return result
+    if x in flow:
+        return flow[x]
+    # frames [cell, its coefficient a, faces still to add, chain, factor of the chain in the parent's]
+    in_progress = set([x])
+    stack = [_open_flow(dim, x, boundaries, paired_up, 1)]
+    while True:
+        frame = stack[-1]
+        if frame[2]:
+            y, sign = frame[2].pop()
+            result = leaf(y)
+            if result is None:
+                if y in flow:
+                    result = flow[y]
+                elif y in in_progress:
+                    raise MorseComplexError('closed V-path through '+str((dim, y)))
+                else:
+                    in_progress.add(y)
+                    stack.append(_open_flow(dim, y, boundaries, paired_up, -frame[1] * sign))
+                    continue
+            _add(frame[3], result, -frame[1] * sign)
+            continue
+        stack.pop()
+        flow[frame[0]] = frame[3]
+        in_progress.discard(frame[0])
+        if not stack:
+            return frame[3]
+        _add(stack[-1][3], frame[3], frame[4])
+
+
+def _open_flow(dim, x, boundaries, paired_up, factor):
+    coface = paired_up[(dim, x)]
+    bdry = boundaries[coface[1]]
+    incidences = [sign for y, sign in bdry if y == x]
+    if len(incidences) != 1:
+        raise MorseComplexError('irregular pair '+str((dim, x))+' - '+str(coface))
+    return [x, incidences[0], [[y, sign] for y, sign in reversed(bdry) if y != x], {}, factor]
+
+
+def triangulation_morse_complex(triangulation, pairs, critical):
+    """
+    morse_complex of a gradient on a Regina Triangulation3, e.g.
+
+        triangulation_morse_complex(t, *collapse_gradient(collKnotCompl(upward, downward, t, repeated = repeated)))
+        triangulation_morse_complex(t, *FacePoset(t, 3).randomised_morse_matching())
+    """
+    return morse_complex(oriented_boundaries(triangulation), pairs, critical)
+
+
+def simplicial_complex(triangulation, boundaries = None):
+    """
+    The full simplicial chain complex of a Regina Triangulation3 in the shape of morse_complex: (sizes,
+    matrices), sizes[d] being the number of d-faces and matrices[k] the sparse boundary {row: {column:
+    entry}} from k-faces to (k-1)-faces.
+    """
+    if boundaries is None:
+        boundaries = oriented_boundaries(triangulation)
+    sizes = [triangulation.countFaces(0)] + [len(boundaries[k]) for k in (1, 2, 3)]
+    matrices = {}
+    for k in (1, 2, 3):
+        matrix = {}
+        for column in xrange(len(boundaries[k])):
+            for y, sign in boundaries[k][column]:
+                row = matrix.setdefault(y, {})
+                row[column] = row.get(column, 0) + sign
+        matrices[k] = matrix
+    return sizes, matrices
+
+
+def triangulation_homology(triangulation, pairs = None, critical = None, torsion = True):
+    """
+    Returns (betti, torsion coefficients, complex) of a Regina Triangulation3 (see
+    smithNormalForm.chain_complex_homology), computed on the Morse complex of the gradient (pairs,
+    critical) if given, e.g.
+
+        triangulation_homology(t, *collapse_gradient(collKnotCompl(upward, downward, t, repeated = repeated)))
+
+    complex is the chain complex the homology was computed on: 'morse', or 'simplicial' for calls without
+    a gradient and for gradients with closed V-paths or irregular pairs (MorseComplexError), which fall
+    back to the simplicial chain complex. Those fallbacks are counted as 'homology fallbacks' in
+    censusStats.STATS.
+    """
+    boundaries = oriented_boundaries(triangulation)
+    if pairs is not None:
+        try:
+            cells, matrices = morse_complex(boundaries, pairs, critical)
+            betti, factors = chain_complex_homology([len(cells[d]) for d in xrange(4)], matrices, torsion)
+            return betti, factors, 'morse'
+        except MorseComplexError:
+            if STATS.enabled:
+                STATS.count('homology fallbacks')
+    sizes, matrices = simplicial_complex(triangulation, boundaries)
+    betti, factors = chain_complex_homology(sizes, matrices, torsion)
+    return betti, factors, 'simplicial'
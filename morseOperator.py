@@ -0,0 +1,151 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Induced boundary operator of a Morse function, shared by the census scripts
+#
+# hasseDiagramCopy.py and genExamples.py both turn the Morse function of
+# collKnotCompl into the operator between critical triangles and critical
+# edges with SCMorseBdryOp (dynamic programming over the gradient, see
+# there). SCChain and SCMorseGradient are also used by the V-path walkers
+# of hasseDiagramCopy.py (SCFindGradientPaths, SCBdryOp), which
+# './benchmarks.py paths' compares with SCMorseBdryOp.
+###############################################################################
+
+# optional counters of the hot paths (--stats)
+from censusStats import STATS
+
+
+### sparse integer chain: maps cells (e.g. critical edges) to their nonzero
+### coefficients; cells not in the dictionary have coefficient 0
+class SCChain(dict):
+  def coefficient(self,cell):
+    return self.get(cell,0)
+
+  def addCell(self,cell,coefficient):
+    c=self.get(cell,0)+coefficient
+    if c == 0:
+      if cell in self:
+        del self[cell]
+    else:
+      self[cell]=c
+    return self
+
+  # in place: self += factor*other
+  def add(self,other,factor=1):
+    for cell,coefficient in other.iteritems():
+      self.addCell(cell,factor*coefficient)
+    return self
+
+  # in place: self = -self
+  def negate(self):
+    for cell in self.keys():
+      self[cell]=-self[cell]
+    return self
+
+def SCAddCrits(s1,s2):
+  return s1.add(s2)
+
+def SCAddCrit(s,chain):
+  return s.addCell(chain[0],chain[1])
+
+
+### discrete gradient of a Morse function (list of [dim,index] pairs in the
+### order of the collapse) together with the oriented triangle boundaries
+### position[d][i]: position of the i-th face of dimension d in Morse
+### gradient[e]: [triangle,slot] of the first triangle after edge e in Morse
+###   with e in its boundary (slot: first position of e in that boundary),
+###   or None; this is the triangle SCGradient (hasseDiagramCopy.py) pairs
+###   e with
+class SCMorseGradient(object):
+  def __init__(self,Morse,bdrys):
+    counts=[0,0,0,0]
+    for cell in Morse:
+      if cell[1] >= counts[cell[0]]:
+        counts[cell[0]]=cell[1]+1
+    self.position=[[None]*n for n in counts]
+    for pos in range(len(Morse)):
+      self.position[Morse[pos][0]][Morse[pos][1]]=pos
+    self.gradient=[None]*counts[1]
+    # walk the Morse function backwards, remembering for every edge the
+    # closest triangle seen so far that has it in its boundary
+    nextTriangle={}
+    for pos in range(len(Morse)-1,-1,-1):
+      dim,idx=Morse[pos]
+      if dim == 2:
+        for slot in [2,1,0]:
+          nextTriangle[bdrys[idx][slot][0]]=[idx,slot]
+      elif dim == 1:
+        self.gradient[idx]=nextTriangle.get(idx)
+
+  def before(self,dim,i,j):
+    return self.position[dim][i] < self.position[dim][j]
+
+
+### induced boundary operator between critical triangles and critical edges,
+### in the same layout as SCBdryOp of hasseDiagramCopy.py (rows: critical
+### edges, columns: critical triangles), by dynamic programming over the
+### gradient instead of walking the V-paths: every edge e reached from a critical triangle gets one
+### chain flow[e] (critical edges reached from e, positive orientation),
+### summed from the chains of its outgoing edges; these come later in the
+### Morse function, so the edges are processed in reverse Morse order
+### bdrys is not changed
+def SCMorseBdryOp(Morse,critsUp,critsDown,bdrys):
+  grad = SCMorseGradient(Morse,bdrys)
+  crits = set(critsDown)
+  # outgoing[e]: [[x,c],...] with c the coefficient of x in the flow from e
+  outgoing = {}
+  # arcs followed and memoised flows read (for --stats)
+  steps = 0
+  hits = 0
+  for i in critsUp:
+    for x in bdrys[i]:
+      if not x[0] in crits:
+        outgoing[x[0]] = None
+  for cell in Morse:
+    if cell[0] <> 1 or not cell[1] in outgoing:
+      continue
+    e = cell[1]
+    out = []
+    paired = grad.gradient[e]
+    if paired <> None:
+      gradTrig,slot = paired
+      sign = bdrys[gradTrig][slot][1]
+      for x in bdrys[gradTrig]:
+        if x[0] <> e and grad.before(1,e,x[0]):
+          out.append([x[0],-sign*x[1]])
+          if not x[0] in crits and not x[0] in outgoing:
+            outgoing[x[0]] = None
+      steps += len(out)
+    outgoing[e] = out
+
+  flow = {}
+  for pos in range(len(Morse)-1,-1,-1):
+    dim,e = Morse[pos]
+    if dim <> 1 or not e in outgoing:
+      continue
+    s = SCChain()
+    for x,c in outgoing[e]:
+      if x in crits:
+        s.addCell(x,c)
+      else:
+        hits += 1
+        s.add(flow[x],c)
+    flow[e] = s
+
+  tau2 = [[0]*len(critsUp) for x in critsDown]
+  row = dict([(critsDown[k],k) for k in range(len(critsDown))])
+  for j in range(len(critsUp)):
+    s = SCChain()
+    for x,c in bdrys[critsUp[j]]:
+      if x in crits:
+        s.addCell(x,c)
+      else:
+        hits += 1
+        s.add(flow[x],c)
+    for x,c in s.iteritems():
+      tau2[row[x]][j] = c
+  if STATS.enabled:
+    STATS.count('V-path steps',steps)
+    STATS.count('lookup hits',hits)
+    STATS.count('lookup misses',len(flow))
+  return tau2
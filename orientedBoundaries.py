@@ -0,0 +1,138 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Oriented boundaries of all faces of a triangulation, as NumPy arrays
+#
+# SCBdry of genExamples.py finds the orientation of each edge of a
+# triangle by searching the list of all embeddings of the edge, and only
+# handles triangles. boundary_arrays instead reads the face numbers and
+# vertex maps of every simplex once into arrays, and derives the signed
+# incidences of all k-faces to their (k-1)-faces (k = 1, ..., dimension)
+# from them with array operations. Works for Triangulation3 and
+# Triangulation4 (any Regina triangulation with faceMapping); SCBdry of
+# hasseDiagramCopy.py and morseComplex.oriented_boundaries use it.
+###############################################################################
+
+import numpy as np
+
+
+def _binomial(n, k):
+    result = 1
+    for i in xrange(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+_PERMUTATIONS = {}
+
+
+def _permutation_images(perm_class, n):
+    # images[code] are the images of 0..n of the permutation with SnIndex() code
+    if perm_class not in _PERMUTATIONS:
+        _PERMUTATIONS[perm_class] = np.array([[perm_class.Sn[code][v] for v in xrange(n + 1)]
+                                              for code in xrange(perm_class.nPerms)], dtype = np.intp)
+    return _PERMUTATIONS[perm_class]
+
+
+def _vertex_tables(triangulation, dimensions):
+    # per face dimension j < n in dimensions: index[j][s, i] is the index of the i-th j-face of simplex s, and
+    # images[j][s, i] the images of the vertices 0..n under the faceMapping of that face (the vertices of
+    # the face, in its own numbering, come first). The maps are read as SnIndex codes, one Regina call
+    # per face, and expanded through a table of all permutations.
+    n = triangulation.dimension
+    size = triangulation.size()
+    index = {}
+    images = {}
+    for j in dimensions:
+        count = _binomial(n + 1, j + 1)
+        faces = []
+        codes = []
+        perm_class = None
+        for s in xrange(size):
+            simplex = triangulation.simplex(s)
+            faces.append([simplex.face(j, i).index() for i in xrange(count)])
+            mappings = [simplex.faceMapping(j, i) for i in xrange(count)]
+            codes.append([mapping.SnIndex() for mapping in mappings])
+            perm_class = type(mappings[0])
+        index[j] = np.array(faces, dtype = np.intp).reshape(size, count)
+        if perm_class is None:
+            images[j] = np.empty((0, count, n + 1), dtype = np.intp)
+        else:
+            images[j] = _permutation_images(perm_class, n)[np.array(codes, dtype = np.intp)]
+    return index, images
+
+
+def _face_numbers(n, j, images):
+    # array table: face_numbers[mask] is the number of the j-face of the n-simplex with the vertex set
+    # mask (a bit mask), read off the vertex maps of one simplex since all simplices are numbered alike
+    table = np.full(1 << (n + 1), -1, dtype = np.intp)
+    if len(images):
+        masks = (1 << images[0, :, :j + 1]).sum(axis = 1)
+        table[masks] = np.arange(len(masks))
+    return table
+
+
+def boundary_arrays(triangulation, dimensions = None):
+    """
+    Returns {k: (faces, signs)} for k = 1, ..., dimension: faces[i, l] is the index of the l-th
+    (k-1)-face of the i-th k-face in Regina's numbering (opposite vertex l for k >= 2, vertex l for
+    k = 1) and signs[i, l] = +-1 its orientation,
+    both arrays of shape (number of k-faces, k+1). Each face is oriented by its own vertex numbering, so
+    boundary o boundary = 0; for Triangulation3 and k = 2 these are the boundaries of SCBdry, and
+    boundary_lists turns the arrays into that form. dimensions restricts the result to these k.
+    """
+    n = triangulation.dimension
+    size = triangulation.size()
+    if dimensions is None:
+        dimensions = range(1, n + 1)
+    needed = sorted(set(dimensions) | set(k - 1 for k in dimensions))
+    index, images = _vertex_tables(triangulation, [j for j in needed if j < n])
+    # top-dimensional faces: the simplices, with the identity vertex map
+    index[n] = np.arange(size, dtype = np.intp).reshape(size, 1)
+    images[n] = np.tile(np.arange(n + 1, dtype = np.intp), (size, 1, 1))
+    weights = 1 << np.arange(n + 1, dtype = np.intp)
+
+    result = {}
+    for k in dimensions:
+        # one embedding per k-face: its first occurrence in the simplices
+        faces, first = np.unique(index[k].ravel(), return_index = True)
+        count = len(faces)
+        s, number = np.divmod(first, index[k].shape[1])
+        vertices = images[k][s, number, :k + 1]
+        # position of each simplex vertex among the vertices of the face (k+1: not in the face)
+        position = np.full((count, n + 1), k + 1, dtype = np.intp)
+        rows = np.arange(count)[:, None]
+        position[rows, vertices] = np.arange(k + 1)
+        numbers = _face_numbers(n, k - 1, images[k - 1])
+        bdry = np.empty((count, k + 1), dtype = np.intp)
+        signs = np.empty((count, k + 1), dtype = np.int8)
+        for l in xrange(k + 1):
+            # the facet opposite vertex l of the face, as a face of the same simplex
+            mask = (weights[vertices] * (np.arange(k + 1) != l)).sum(axis = 1)
+            facet = numbers[mask]
+            bdry[:, l] = index[k - 1][s, facet]
+            # its own vertex order, as positions in the face: the sign is (-1)^l times the sign of that
+            # sequence as a permutation of the positions
+            order = position[rows, images[k - 1][s, facet, :k]]
+            inversions = np.zeros(count, dtype = np.intp)
+            for a in xrange(k):
+                for b in xrange(a + 1, k):
+                    inversions += order[:, a] > order[:, b]
+            signs[:, l] = np.where((inversions + l) % 2 == 0, 1, -1)
+        if k == 1:
+            # Regina numbers the vertices of an edge by themselves, not by the opposite vertex
+            bdry, signs = bdry[:, ::-1].copy(), signs[:, ::-1].copy()
+        result[k] = (bdry, signs)
+    return result
+
+
+def boundary_lists(arrays, k = None):
+    """
+    The arrays of boundary_arrays as nested lists: [[face, sign], ...] per k-face (the form of SCBdry and
+    morseComplex.oriented_boundaries). Returns {k: lists} for all k, or the lists of one k.
+    """
+    if k is not None:
+        faces, signs = arrays[k]
+        return [[[int(y), int(sign)] for y, sign in zip(row, row_signs)]
+                for row, row_signs in zip(faces.tolist(), signs.tolist())]
+    return dict((d, boundary_lists(arrays, d)) for d in arrays)
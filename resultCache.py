@@ -0,0 +1,107 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Persistent result cache for the census scripts
+#
+# Results are stored in an SQLite file, keyed by the isomorphism signature
+# and the algorithm parameters (seed, number of trials, strategy, ...), so
+# overlapping census runs only do the Regina work for new isoSigs. The
+# cache is bounded in size: the least recently used entries are evicted.
+###############################################################################
+
+import sqlite3
+
+# the cached results are pickled
+import pickle
+
+# canonical form of the parameters in the key
+import json
+
+
+class ResultCache(object):
+    """
+    SQLite-backed cache of picklable results.
+
+    get(isosig, params) returns the stored result or None and counts a hit or a miss; put(isosig, params,
+    result) stores one. params is any JSON-serialisable object (usually a dict), and is part of the key.
+    When the pickled results take more than max_bytes, the least recently used entries are evicted down
+    to 90% of max_bytes (max_bytes = None: no bound).
+
+    Writes are batched: commit() is called every commit_every puts, by the drivers at checkpoints, and by
+    close(). A cache file should only be written by one process at a time.
+    """
+    def __init__(self, path, max_bytes = None, commit_every = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncommitted = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS results '
+                        '(key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used INTEGER)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        total, clock = self.db.execute('SELECT SUM(size), MAX(last_used) FROM results').fetchone()
+        self.total_bytes = total or 0
+        self.clock = clock or 0
+
+    def key(self, isosig, params):
+        return isosig.strip() + ' ' + json.dumps(params, sort_keys = True)
+
+    def get(self, isosig, params):
+        key = self.key(isosig, params)
+        row = self.db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.clock += 1
+        self.db.execute('UPDATE results SET last_used = ? WHERE key = ?', (self.clock, key))
+        return pickle.loads(bytes(row[0]))
+
+    def put(self, isosig, params, result):
+        key = self.key(isosig, params)
+        value = pickle.dumps(result, 2)
+        old = self.db.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+        if old is not None:
+            self.total_bytes -= old[0]
+        self.clock += 1
+        self.db.execute('INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                        (key, sqlite3.Binary(value), len(value), self.clock))
+        self.total_bytes += len(value)
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            self.evict(int(0.9 * self.max_bytes))
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.commit()
+
+    def evict(self, target_bytes):
+        """
+        Deletes least recently used entries until the results take at most target_bytes.
+        """
+        cursor = self.db.execute('SELECT key, size FROM results ORDER BY last_used')
+        doomed = []
+        for key, size in cursor:
+            if self.total_bytes <= target_bytes:
+                break
+            doomed.append((key,))
+            self.total_bytes -= size
+        cursor.close()
+        self.db.executemany('DELETE FROM results WHERE key = ?', doomed)
+        self.evictions += len(doomed)
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self), 'bytes': self.total_bytes}
+
+    def commit(self):
+        self.db.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
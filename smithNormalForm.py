@@ -0,0 +1,246 @@
+#!/usr/bin/regina-python
+
+###############################################################################
+# Integer Smith normal form of sparse boundary matrices
+#
+# The Morse boundary matrices of the census scripts (SCBdryOp,
+# SCMorseBdryOp, morseComplex.morse_complex) are small and mostly +-1, and
+# the full simplicial boundary matrices are large and very sparse. Both are
+# reduced here without Regina:
+#
+# - unit pivots (+-1) are eliminated first, from the shortest rows and
+#   sparsest columns, so that the Markowitz fill-in (row count - 1) *
+#   (column count - 1) stays small; each contributes an invariant factor 1,
+# - the core left without unit pivots is diagonalised by Euclidean row and
+#   column operations and the diagonal put into divisibility order,
+# - ranks alone (Betti numbers) are computed modulo a large prime, where
+#   the entries cannot grow.
+###############################################################################
+
+# gcd for Smith normal form
+from fractions import gcd
+
+# rows by length, for the pivot choice
+import heapq
+
+# ranks are computed modulo this prime (2^31 - 1)
+MODULUS = 2147483647
+
+
+def sparse_rows(matrix):
+    """
+    Returns matrix as {row: {column: entry}} without zero entries. matrix is a list of rows (the layout of
+    SCBdryOp: one row per critical edge, one column per critical triangle) or already such a dict.
+    """
+    if isinstance(matrix, dict):
+        items = matrix.iteritems()
+    else:
+        items = enumerate(matrix)
+    rows = {}
+    for r, row in items:
+        if isinstance(row, dict):
+            entries = dict((c, v) for c, v in row.iteritems() if v)
+        else:
+            entries = dict((c, v) for c, v in enumerate(row) if v)
+        if entries:
+            rows[r] = entries
+    return rows
+
+
+def _columns(rows):
+    columns = {}
+    for r, row in rows.iteritems():
+        for c in row:
+            columns.setdefault(c, set()).add(r)
+    return columns
+
+
+def _eliminate(rows, columns, pr, pc, pivot, modulus = None):
+    # clears column pc outside row pr with row operations, then drops row pr and column pc. With
+    # pivot = +-1 (or any nonzero pivot modulo a prime) the column operations that would clear the rest
+    # of row pr only touch row pr, so dropping it is exact. Returns the rows that changed.
+    row = rows.pop(pr)
+    inverse = pivot if modulus is None else pow(pivot, modulus - 2, modulus)
+    for c in row:
+        columns[c].discard(pr)
+    changed = list(columns.pop(pc))
+    for r in changed:
+        target = rows[r]
+        factor = target[pc] * inverse
+        if modulus is not None:
+            factor %= modulus
+        for c, v in row.iteritems():
+            x = target.get(c, 0) - factor * v
+            if modulus is not None:
+                x %= modulus
+            if x:
+                if c not in target:
+                    columns[c].add(r)
+                target[c] = x
+            else:
+                target.pop(c, None)
+                if c != pc:
+                    columns[c].discard(r)
+        if not target:
+            del rows[r]
+    for c in row:
+        if c != pc and not columns[c]:
+            del columns[c]
+    return changed
+
+
+def _pivot_elimination(rows, columns, modulus = None):
+    # eliminates pivots until none is left and returns their number. Over the integers (modulus None)
+    # the pivots are the units +-1, modulo a prime all nonzero entries. Markowitz-style choice: the
+    # shortest row first (a heap of (length, row), refreshed when rows change), and in it the pivot whose
+    # column has the fewest entries, which keeps the fill-in (row count - 1) * (column count - 1) small.
+    # Rows without a pivot are only looked at again once an elimination changes them.
+    heap = [(len(row), r) for r, row in rows.iteritems()]
+    heapq.heapify(heap)
+    count = 0
+    while heap:
+        length, pr = heapq.heappop(heap)
+        row = rows.get(pr)
+        if row is None or len(row) != length:
+            continue
+        best = None
+        for c, v in row.iteritems():
+            if modulus is None and v != 1 and v != -1:
+                continue
+            if best is None or len(columns[c]) < len(columns[best[0]]):
+                best = (c, v)
+                if len(columns[c]) == 1:
+                    break
+        if best is None:
+            continue
+        for r in _eliminate(rows, columns, pr, best[0], best[1], modulus):
+            if r in rows:
+                heapq.heappush(heap, (len(rows[r]), r))
+        count += 1
+    return count
+
+
+def _diagonalise(rows):
+    # Euclidean reduction of the (small) core without unit pivots; returns the nonzero diagonal
+    matrix = dict((r, dict(row)) for r, row in rows.iteritems())
+    diagonal = []
+    while matrix:
+        # pivot: the entry of least absolute value
+        pr, pc, pivot = min(((r, c, v) for r, row in matrix.iteritems() for c, v in row.iteritems()),
+                            key = lambda entry: abs(entry[2]))
+        reduced = True
+        for r, row in matrix.items():
+            if r != pr and pc in row:
+                q = row[pc] // pivot
+                for c, v in matrix[pr].iteritems():
+                    x = row.get(c, 0) - q * v
+                    if x:
+                        row[c] = x
+                    else:
+                        row.pop(c, None)
+                if pc in row:
+                    reduced = False
+                if not row:
+                    del matrix[r]
+        prow = matrix[pr]
+        for c in prow.keys():
+            if c != pc:
+                q = prow[c] // pivot
+                for r, row in matrix.iteritems():
+                    if pc in row:
+                        x = row.get(c, 0) - q * row[pc]
+                        if x:
+                            row[c] = x
+                        else:
+                            row.pop(c, None)
+                if c in prow:
+                    reduced = False
+        for r in [r for r, row in matrix.iteritems() if not row]:
+            del matrix[r]
+        if reduced:
+            # pivot row and column are cleared
+            del matrix[pr]
+            diagonal.append(abs(pivot))
+        # otherwise the remainders are smaller than the pivot and one of them is the next pivot
+    return diagonal
+
+
+def _divisibility_order(diagonal):
+    # turns a diagonal into the invariant factors d_1 | d_2 | ... of the same group
+    factors = sorted(diagonal)
+    for i in xrange(len(factors)):
+        for j in xrange(i + 1, len(factors)):
+            a, b = factors[i], factors[j]
+            g = gcd(a, b)
+            factors[i], factors[j] = g, a // g * b
+    return factors
+
+
+def smith_normal_form(matrix):
+    """
+    Returns the nonzero invariant factors d_1 | d_2 | ... | d_r of an integer matrix (a list of rows or
+    {row: {column: entry}}), r being its rank. The cokernel of the matrix is Z^(rows - r) plus the
+    cyclic groups Z_d for the factors d > 1.
+    """
+    rows = sparse_rows(matrix)
+    columns = _columns(rows)
+    units = _pivot_elimination(rows, columns)
+    return [1] * units + _divisibility_order(_diagonalise(rows))
+
+
+def matrix_rank(matrix, modulus = MODULUS):
+    """
+    Returns the rank of an integer matrix modulo the prime modulus, by sparse elimination with the same
+    pivot choice as smith_normal_form. For a large prime this is the rank over the rationals unless the
+    prime divides a torsion coefficient, and the entries never grow, so it is the fast path when only
+    Betti numbers are needed.
+    """
+    rows = {}
+    for r, row in sparse_rows(matrix).iteritems():
+        entries = dict((c, v % modulus) for c, v in row.iteritems() if v % modulus)
+        if entries:
+            rows[r] = entries
+    return _pivot_elimination(rows, _columns(rows), modulus)
+
+
+def chain_complex_homology(sizes, matrices, torsion = True):
+    """
+    Homology of the chain complex with sizes[d] generators in dimension d and boundary matrices
+    matrices[k] from dimension k to k-1 (one row per (k-1)-generator, as from morseComplex.morse_complex;
+    missing matrices are zero). Returns (betti, torsion coefficients): betti[d] is the rank of H_d and
+    torsion[d] the invariant factors > 1 of its torsion subgroup. With torsion False the ranks are only
+    computed modulo MODULUS and the torsion lists are left empty.
+    """
+    top = len(sizes) - 1
+    ranks = {}
+    factors = {}
+    for k in xrange(1, top + 1):
+        matrix = matrices.get(k)
+        if matrix is None:
+            ranks[k], factors[k] = 0, []
+        elif torsion:
+            invariants = smith_normal_form(matrix)
+            ranks[k], factors[k] = len(invariants), [d for d in invariants if d > 1]
+        else:
+            ranks[k], factors[k] = matrix_rank(matrix), []
+    betti = []
+    coefficients = []
+    for d in xrange(top + 1):
+        betti.append(sizes[d] - ranks.get(d, 0) - ranks.get(d + 1, 0))
+        coefficients.append(factors.get(d + 1, []))
+    return betti, coefficients
+
+
+def operator_homology(operator, critical_edges, critical_triangles, torsion = True):
+    """
+    H_1 of a one-vertex triangulation from the induced boundary operator of SCBdryOp / SCMorseBdryOp
+    (rows: critical edges, columns: critical triangles): the edges of a one-vertex triangulation are
+    cycles, so H_1 is the cokernel of the operator. Returns (betti number, torsion coefficients); with
+    torsion False the rank is only computed modulo MODULUS and the torsion list is left empty.
+    """
+    if not critical_triangles:
+        return len(critical_edges), []
+    if not torsion:
+        return len(critical_edges) - matrix_rank(operator), []
+    invariants = smith_normal_form(operator)
+    return len(critical_edges) - len(invariants), [d for d in invariants if d > 1]
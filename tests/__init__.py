@@ -0,0 +1,7 @@
+###############################################################################
+# Tests of the census modules and scripts
+#
+# python -m unittest discover (from the top directory)
+#   runs them all; the tests of the modules that need Regina (the census
+#   scripts, hasse, morseCollapse, morseComplex) are skipped without it
+###############################################################################
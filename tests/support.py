@@ -0,0 +1,47 @@
+###############################################################################
+# Inputs shared by the tests: the isoSigs of 5.sig and the census scripts
+###############################################################################
+
+import os
+
+import sys
+
+import importlib
+
+try:
+    import regina
+except ImportError:
+    regina = None
+
+# the census of one-vertex 3-manifold triangulations next to the modules
+CENSUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '5.sig')
+
+# skip message of the tests that need Regina
+NEEDS_REGINA = 'needs Regina'
+
+
+def census_sigs(count):
+    """
+    The isoSigs of the first count lines of 5.sig.
+    """
+    sigs = []
+    for line in open(CENSUS):
+        if line.strip():
+            sigs.append(line.split()[0])
+            if len(sigs) == count:
+                break
+    return sigs
+
+
+def import_script(name):
+    """
+    The module name, or None without Regina. The census scripts lower the recursion limit when they are
+    imported, which is undone here.
+    """
+    if regina is None:
+        return None
+    limit = sys.getrecursionlimit()
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.setrecursionlimit(limit)
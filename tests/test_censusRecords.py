@@ -0,0 +1,191 @@
+import os
+
+import json
+
+import shutil
+
+import tempfile
+
+import unittest
+
+from censusRecords import (make_record, encode_jsonl, tag_jsonl, encode_binary, tag_binary, decode_binary,
+                           read_records, convert_dump, RecordFormatError)
+
+# compressed record files
+from censusIO import CensusWriter
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _record(seed = None, edge_weights = None, homology = None, operator = None):
+    # the record of a small made-up triangulation
+    downward = [None, None, [[0, 1, 2], [1, 2], [0]], [[0, 1], [1, 2, 0]]]
+    morse = [[3, 1], [2, 0], [3, 0], [2, 2], [1, 2], [2, 1], [1, 1], [1, 0], [0, 0]]
+    boundaries = [[[0, 1], [1, -1], [2, 1]], [[1, 1], [2, 1], [2, -1]], [[0, -1], [0, 1], [0, 1]]]
+    if operator is None:
+        operator = [[1, -2], [0, 3]]
+    return make_record('dLQbcccdero', downward, morse, [1, 2], [0, 1], boundaries, operator,
+                       seed = seed, edge_weights = edge_weights, homology = homology)
+
+
+# records with every optional part, and entries and rows too large for the narrow widths of the binary format
+RECORDS = [_record(),
+           _record(seed = 0),
+           _record(seed = -(1 << 63), edge_weights = [[1, 0, 2], [3, 3, 3]]),
+           _record(seed = 12345, homology = ([1, 0, 0, 1], [[], [5], [], []], 'morse')),
+           _record(homology = ([1, 2, 2, 1], None, 'simplicial')),
+           _record(operator = [[200, -129], [70000, -40000], [1 << 40, -(1 << 33)]]),
+           _record(edge_weights = [range(300), [1]])]
+
+
+class RecordTest(unittest.TestCase):
+    def test_make_record(self):
+        record = _record(seed = 3, homology = ([1, 0, 0, 1], [[], [5], [], []], 'simplicial'))
+        self.assertEqual(record['downward'], {'tetrahedra': [[0, 1], [1, 2, 0]], 'triangles': [[0, 1, 2], [1, 2], [0]]})
+        self.assertEqual(record['critical'], {'triangles': [1, 2], 'edges': [0, 1]})
+        self.assertEqual(record['seed'], 3)
+        self.assertEqual(record['homology'], {'betti': [1, 0, 0, 1], 'torsion': [[], [5], [], []],
+                                              'complex': 'simplicial'})
+        self.assertFalse('seed' in _record() or 'edgeWeights' in _record() or 'homology' in _record())
+
+    def test_jsonl_round_trip(self):
+        for record in RECORDS:
+            text = encode_jsonl(record)
+            self.assertTrue(text.endswith('\n') and '\n' not in text[:-1])
+            self.assertEqual(json.loads(text), record)
+            tagged = json.loads(tag_jsonl(17, text))
+            self.assertEqual(tagged.pop('line'), 17)
+            self.assertEqual(tagged, record)
+
+    def test_binary_round_trip(self):
+        for record in RECORDS:
+            data = encode_binary(record)
+            decoded, end = decode_binary(data)
+            self.assertEqual(end, len(data))
+            self.assertEqual(decoded, record)
+            decoded, end = decode_binary(tag_binary(42, data))
+            self.assertEqual(decoded.pop('line'), 42)
+            self.assertEqual(decoded, record)
+
+    def test_binary_homology_complex(self):
+        # records made without the complex read back as computed on the Morse complex
+        record = _record(homology = ([1, 0, 0, 1], [[], [5], [], []]))
+        decoded = decode_binary(encode_binary(record))[0]
+        self.assertEqual(decoded['homology'].pop('complex'), 'morse')
+        self.assertEqual(decoded, record)
+
+    def test_binary_frames(self):
+        data = ''.join(encode_binary(record, lineno) for lineno, record in enumerate(RECORDS))
+        pos = 0
+        for lineno, record in enumerate(RECORDS):
+            decoded, pos = decode_binary(data, pos)
+            self.assertEqual(decoded.pop('line'), lineno)
+            self.assertEqual(decoded, record)
+        self.assertEqual(pos, len(data))
+        self.assertRaises(RecordFormatError, decode_binary, encode_binary(RECORDS[0])[:-1])
+
+
+class RecordFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_read_records(self):
+        # enough records to span several blocks of the compressed readers
+        records = RECORDS * 300
+        for name, encode in [('records.jsonl', encode_jsonl), ('records.jsonl.gz', encode_jsonl),
+                             ('records.bin', encode_binary), ('records.bin.bz2', encode_binary)]:
+            path = os.path.join(self.tmp, name)
+            writer = CensusWriter(path)
+            for record in records:
+                writer.write(encode(record))
+            writer.close()
+            self.assertEqual(list(read_records(path)), records)
+
+    def test_truncated_file(self):
+        path = os.path.join(self.tmp, 'records.bin')
+        handle = open(path, 'wb')
+        handle.write(encode_binary(RECORDS[0]) + encode_binary(RECORDS[1])[:-3])
+        handle.close()
+        self.assertRaises(RecordFormatError, list, read_records(path))
+
+
+# a hasseDiagramCopy.py dump of one triangulation, with {seed} and {operator} to fill in
+HASSE_DUMP = '''# isomorphism signature: dLQbcccdero
+
+
+# downward Hasse diagram (with multiple edges removed)
+[
+# tetrahedra to triangles
+[[0, 1], [1, 2, 0]]
+# triangles to edges
+[[0, 1, 2], [1, 2], [0]]
+]
+
+
+Morse function ([i,j] means j-th face of dimension i):
+
+[[3, 1], [2, 0], [3, 0], [2, 2], [1, 2], [2, 1], [1, 1], [1, 0], [0, 0]]
+
+{seed}
+critical triangle(s):\t[1, 2] \tcritical edges:\t[0, 1]
+
+
+oriented boundaries of triangles (k-th entry [[i_0,s_0],[i_1,s_1],[i_2,s_2]]: i_j = j-th edge of triangle k, s_j = orientation of i_j)
+
+[[0, 1], [1, -1], [2, 1]]
+[[1, 1], [2, 1], [2, -1]]
+[[0, -1], [0, 1], [0, 1]]
+
+
+induced boundary operator between critical triangles (columns) and critical edges (rows)
+
+[1, -2]
+[0, 3]
+'''
+
+# the same triangulation as printed by genExamples.py, {header} being the header of the equations
+EXAMPLES_DUMP = HASSE_DUMP.split('induced boundary')[0].replace('{seed}\n', '') + '''{header}
+
+1 * ( 1 ) + 1 * ( 2 ) + -1 * ( 2 ) = 1 * ( 0 ) + 0 * ( 1 )
+
+-1 * ( 0 ) + 1 * ( 0 ) + 1 * ( 0 ) = -2 * ( 0 ) + 3 * ( 1 )
+
+Edge weights of non-trivial discs
+
+( 1 , 0 , 2 )
+'''
+
+
+class ConvertDumpTest(unittest.TestCase):
+    def test_hasse_dump(self):
+        records = list(convert_dump(HASSE_DUMP.replace('{seed}', '').splitlines(True)))
+        self.assertEqual(records, [_record()])
+
+    def test_hasse_dump_with_seed(self):
+        text = HASSE_DUMP.replace('{seed}', 'seed of the collapse:\t 7 \n\n')
+        self.assertEqual(list(convert_dump(text.splitlines(True))), [_record(seed = 7)])
+
+    def test_examples_dump(self):
+        header = 'induced boundary operator between critical triangles and critical edges (one equation per critical triangle)'
+        records = list(convert_dump(EXAMPLES_DUMP.replace('{header}', header).splitlines(True)))
+        self.assertEqual(records, [_record(edge_weights = [[1, 0, 2]])])
+
+    def test_old_examples_dump(self):
+        # the first column of the operator in every equation: not rebuilt
+        header = 'induced boundary operator between critical triangles and critical edges'
+        lines = EXAMPLES_DUMP.replace('{header}', header).splitlines(True)
+        self.assertRaises(RecordFormatError, list, convert_dump(lines))
+
+    def test_saved_example(self):
+        records = list(convert_dump(open(os.path.join(HERE, 'saved_eg.txt'))))
+        self.assertEqual(len(records), 1)
+        for record in records:
+            self.assertEqual(json.loads(encode_jsonl(record)), record)
+            self.assertEqual(decode_binary(encode_binary(record))[0], record)
+
+
+if __name__ == '__main__':
+    unittest.main()
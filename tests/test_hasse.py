@@ -0,0 +1,37 @@
+import unittest
+
+from tests.support import census_sigs, import_script, NEEDS_REGINA
+
+hasse = import_script('hasse')
+
+
+@unittest.skipIf(hasse is None, NEEDS_REGINA)
+class ComputeHasseTest(unittest.TestCase):
+    def test_matches_reference(self):
+        for sig in census_sigs(100):
+            t, upward, downward = hasse.compute_hasse(sig, 3)
+            r, ref_upward, ref_downward = hasse.compute_hasse_reference(sig, 3)
+            self.assertEqual([hasse.csr_rows(csr) for csr in upward[:-1]], ref_upward[:-1])
+            self.assertEqual([hasse.csr_rows(csr) for csr in downward[1:]], ref_downward[1:])
+            # no arcs to the vertices' faces or from the simplices
+            self.assertEqual(hasse.csr_rows(downward[0]), [[]] * t.countFaces(0))
+            self.assertEqual(hasse.csr_rows(upward[3]), [[]] * t.size())
+
+    def test_upward_is_the_transpose(self):
+        for sig in census_sigs(20):
+            t, upward, downward = hasse.compute_hasse(sig, 3)
+            for k in xrange(1, 4):
+                arcs = sorted((i, j) for j, faces in enumerate(hasse.csr_rows(downward[k])) for i in faces)
+                coarcs = sorted((i, j) for i, cofaces in enumerate(hasse.csr_rows(upward[k - 1])) for j in cofaces)
+                self.assertEqual(arcs, coarcs)
+
+    def test_strip_multi_edges(self):
+        import numpy as np
+        # cell 1 has face 2 twice, so loses both arcs to it
+        facets = np.array([[0, 1, 2], [2, 2, 3]], dtype = np.intp)
+        cells, faces = hasse.strip_multi_edges(facets, 4)
+        self.assertEqual(zip(cells.tolist(), faces.tolist()), [(0, 0), (0, 1), (0, 2), (1, 3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
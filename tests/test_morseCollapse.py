@@ -0,0 +1,76 @@
+import random
+
+import unittest
+
+from tests.support import census_sigs, import_script, regina, NEEDS_REGINA
+
+hasse = import_script('hasse')
+
+morseCollapse = import_script('morseCollapse')
+
+hasseDiagramCopy = import_script('hasseDiagramCopy')
+
+
+def _check_collapse(test, upward, downward, collapse, bottom):
+    # every cell once in the Morse function, critical or directly followed by a coface it is paired with,
+    # and the alternating sum of the critical cells is the Euler characteristic
+    f, critical, morse = collapse
+    n = len(downward) - 1
+    counts = [len(upward[d]) for d in xrange(n)] + [len(downward[n])]
+    cells = sorted((d, i) for d in xrange(n + 1) for i in xrange(counts[d]))
+    test.assertEqual(sorted(tuple(cell) for cell in morse), cells)
+    test.assertEqual(f, [len(critical[d]) for d in xrange(n + 1)])
+    test.assertEqual(sum((-1) ** d * f[d] for d in xrange(n + 1)), sum((-1) ** d * counts[d] for d in xrange(n + 1)))
+    is_critical = set((d, i) for d in xrange(n + 1) for i in critical[d])
+    pos = 0
+    while pos < len(morse):
+        d, i = morse[pos]
+        if (d, i) in is_critical:
+            pos += 1
+            continue
+        coface = morse[pos + 1]
+        test.assertEqual(coface[0], d + 1)
+        test.assertTrue(bottom <= d)
+        test.assertTrue(i in downward[d + 1][coface[1]])
+        pos += 2
+    # below bottom nothing is collapsed
+    for d in xrange(bottom):
+        test.assertEqual(f[d], counts[d])
+
+
+def _lists(t):
+    upward, downward = hasse.triangulation_hasse(t)
+    return [hasse.csr_rows(csr) for csr in upward], [hasse.csr_rows(csr) for csr in downward]
+
+
+@unittest.skipIf(morseCollapse is None, NEEDS_REGINA)
+class MorseCollapseTest(unittest.TestCase):
+    def test_same_as_collKnotCompl(self):
+        for number, sig in enumerate(census_sigs(100)):
+            t, upward, downward = hasse.compute_hasse(sig, 3)
+            self.assertEqual(t.countFaces(0), 1)
+            up, down = [hasse.csr_rows(csr) for csr in upward], [hasse.csr_rows(csr) for csr in downward]
+            expected = hasseDiagramCopy.collKnotCompl(up, down, t, random.Random(number))
+            self.assertEqual(morseCollapse.morse_collapse(up, down, random.Random(number)), expected)
+            # CSR arrays as well as lists
+            self.assertEqual(morseCollapse.morse_collapse(upward, downward, random.Random(number)), expected)
+
+    def test_strategies(self):
+        for number, sig in enumerate(census_sigs(50)):
+            up, down = _lists(regina.Triangulation3.fromIsoSig(sig))
+            for name in sorted(morseCollapse.STRATEGIES):
+                for bottom in (0, 1):
+                    collapse = morseCollapse.morse_collapse(up, down, random.Random(number), bottom, name)
+                    _check_collapse(self, up, down, collapse, bottom)
+
+    def test_strategies_in_dimension_4(self):
+        names = [name for name in ['fourSphere', 'rp4', 'cp2', 's2xs2'] if hasattr(regina.Example4, name)]
+        for name in names:
+            up, down = _lists(getattr(regina.Example4, name)())
+            for strategy in sorted(morseCollapse.STRATEGIES):
+                collapse = morseCollapse.morse_collapse(up, down, random.Random(0), 0, strategy)
+                _check_collapse(self, up, down, collapse, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from tests.support import census_sigs, import_script, regina, NEEDS_REGINA
+
+from smithNormalForm import operator_homology, sparse_rows
+
+hasseDiagramCopy = import_script('hasseDiagramCopy')
+
+morseComplex = import_script('morseComplex')
+
+
+def _regina_h1(t):
+    # (rank, invariant factors) of H_1 as Regina computes it
+    group = t.homology()
+    return group.rank(), [group.invariantFactor(i) for i in xrange(group.countInvariantFactors())]
+
+
+@unittest.skipIf(morseComplex is None, NEEDS_REGINA)
+class TriangulationHomologyTest(unittest.TestCase):
+    def test_regular_collapse(self):
+        # with --homology the collapse is a gradient of the triangulation: its Morse complex has the
+        # operator as 2->1 boundary, and the homology of Regina
+        for number, sig in enumerate(census_sigs(100)):
+            t = regina.Triangulation3.fromIsoSig(sig)
+            result = hasseDiagramCopy.SCComputeIsoSig(sig, 1, number, 2, True)
+            betti, factors, complex = result['homology']
+            self.assertEqual(complex, 'morse')
+            self.assertEqual((betti[1], factors[1]), _regina_h1(t))
+            self.assertEqual(betti[0], 1)
+            self.assertEqual(betti[0] - betti[1] + betti[2] - betti[3], 0)
+            crits_up, crits_down = result['critical'][2], result['critical'][1]
+            self.assertEqual(operator_homology(result['operator'], crits_down, crits_up), _regina_h1(t))
+            pairs, critical = morseComplex.collapse_gradient([None, result['critical'], result['Morse']])
+            cells, matrices = morseComplex.triangulation_morse_complex(t, pairs, critical)
+            self.assertEqual((cells[1], cells[2]), (crits_down, crits_up))
+            self.assertEqual(sparse_rows(matrices.get(2, {})), sparse_rows(result['operator']))
+
+    def test_default_collapse(self):
+        # without --homology the collapse may not be a gradient of the triangulation; the homology is
+        # then computed on the simplicial complex, and is the same
+        for number, sig in enumerate(census_sigs(50)):
+            t = regina.Triangulation3.fromIsoSig(sig)
+            result = hasseDiagramCopy.SCComputeIsoSig(sig, 1, number)
+            pairs, critical = morseComplex.collapse_gradient([None, result['critical'], result['Morse']])
+            betti, factors, complex = morseComplex.triangulation_homology(t, pairs, critical)
+            self.assertTrue(complex in ('morse', 'simplicial'))
+            self.assertEqual((betti[1], factors[1]), _regina_h1(t))
+            self.assertEqual(morseComplex.triangulation_homology(t)[:2], (betti, factors))
+            self.assertEqual(morseComplex.triangulation_homology(t, torsion = False)[0], betti)
+
+
+if __name__ == '__main__':
+    unittest.main()
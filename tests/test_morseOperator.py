@@ -0,0 +1,52 @@
+import sys
+
+import copy
+
+import unittest
+
+from tests.support import census_sigs, import_script, regina, NEEDS_REGINA
+
+hasseDiagramCopy = import_script('hasseDiagramCopy')
+
+
+def _inputs(t, seed, homology = False):
+    # the Morse function and critical cells of the census pipeline, and fresh oriented boundaries
+    result = hasseDiagramCopy.SCComputeIsoSig(t.isoSig(), 1, seed, 2, homology)
+    return result, result['Morse'], result['critical'][2], result['critical'][1], hasseDiagramCopy.SCBdry(t)
+
+
+@unittest.skipIf(hasseDiagramCopy is None, NEEDS_REGINA)
+class MorseBdryOpTest(unittest.TestCase):
+    def check(self, t, seed, homology = False):
+        result, morse, crits_up, crits_down, bdrys = _inputs(t, seed, homology)
+        original = copy.deepcopy(bdrys)
+        operator = hasseDiagramCopy.SCMorseBdryOp(morse, crits_up, crits_down, bdrys)
+        self.assertEqual(bdrys, original)
+        self.assertEqual(operator, result['operator'])
+        self.assertEqual(len(operator), len(crits_down))
+        for find_paths in [hasseDiagramCopy.SCFindGradientPaths, hasseDiagramCopy.SCFindGradientPathsRecursive]:
+            # SCBdryOp re-orients the boundaries in place
+            walked = hasseDiagramCopy.SCBdryOp(morse, crits_up, crits_down, t, copy.deepcopy(original), find_paths)
+            self.assertEqual(walked, operator)
+
+    def test_census(self):
+        for number, sig in enumerate(census_sigs(100)):
+            t = regina.Triangulation3.fromIsoSig(sig)
+            self.check(t, number)
+            self.check(t, number, True)
+
+    def test_subdivided(self):
+        # long V-paths, beyond the recursion limit of the scripts
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 100000))
+        try:
+            for number, sig in enumerate(census_sigs(3)):
+                t = regina.Triangulation3.fromIsoSig(sig)
+                t.barycentricSubdivision()
+                self.check(regina.Triangulation3.fromIsoSig(t.isoSig()), number)
+        finally:
+            sys.setrecursionlimit(limit)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+
+import pickle
+
+import shutil
+
+import tempfile
+
+import unittest
+
+from resultCache import ResultCache
+
+PARAMS = {'version': 6, 'trials': 1, 'seed': 0}
+
+
+def _result(i):
+    # results of the same pickled size
+    return {'isoSig': 'sig%03d' % i, 'payload': 'x' * 1000}
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'results.db')
+        self.size = len(pickle.dumps(_result(0), 2))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_get_and_put(self):
+        cache = ResultCache(self.path)
+        self.assertEqual(cache.get('sig000\n', PARAMS), None)
+        cache.put('sig000\n', PARAMS, _result(0))
+        # the isoSig is stripped, the params are compared in canonical form
+        self.assertEqual(cache.get('sig000', dict(PARAMS)), _result(0))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': self.size})
+        cache.close()
+
+    def test_params_are_part_of_the_key(self):
+        cache = ResultCache(self.path)
+        cache.put('sig000', PARAMS, _result(0))
+        for changed in [{'version': 7}, {'seed': 1}, {'trials': 2}, {'homology': True}]:
+            params = dict(PARAMS)
+            params.update(changed)
+            self.assertEqual(cache.get('sig000', params), None)
+        self.assertEqual(cache.get('sig000', PARAMS), _result(0))
+        cache.close()
+
+    def test_version_bump(self):
+        # results of an older version of a script stay in the file but are never returned
+        cache = ResultCache(self.path)
+        cache.put('sig000', {'version': 5}, _result(0))
+        cache.close()
+        cache = ResultCache(self.path)
+        self.assertEqual(cache.get('sig000', {'version': 6}), None)
+        cache.put('sig000', {'version': 6}, _result(1))
+        self.assertEqual(cache.get('sig000', {'version': 5}), _result(0))
+        self.assertEqual(cache.get('sig000', {'version': 6}), _result(1))
+        self.assertEqual(len(cache), 2)
+        cache.close()
+
+    def test_replace(self):
+        cache = ResultCache(self.path)
+        cache.put('sig000', PARAMS, _result(0))
+        cache.put('sig000', PARAMS, _result(1))
+        self.assertEqual(cache.get('sig000', PARAMS), _result(1))
+        self.assertEqual((len(cache), cache.total_bytes), (1, self.size))
+        cache.close()
+
+    def test_least_recently_used_eviction(self):
+        # room for three results: the fourth evicts down to 90%, i.e. the least recently used one
+        cache = ResultCache(self.path, max_bytes = int(3.5 * self.size))
+        for i in xrange(3):
+            cache.put('sig%03d' % i, PARAMS, _result(i))
+        cache.get('sig000', PARAMS)
+        cache.put('sig003', PARAMS, _result(3))
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.get('sig001', PARAMS), None)
+        for i in (0, 2, 3):
+            self.assertEqual(cache.get('sig%03d' % i, PARAMS), _result(i))
+        self.assertTrue(cache.total_bytes <= 3.5 * self.size)
+        cache.close()
+
+    def test_recency_survives_reopening(self):
+        cache = ResultCache(self.path)
+        for i in xrange(3):
+            cache.put('sig%03d' % i, PARAMS, _result(i))
+        cache.get('sig000', PARAMS)
+        cache.close()
+        cache = ResultCache(self.path, max_bytes = int(3.5 * self.size))
+        self.assertEqual((len(cache), cache.total_bytes), (3, 3 * self.size))
+        cache.put('sig003', PARAMS, _result(3))
+        self.assertEqual(cache.get('sig001', PARAMS), None)
+        self.assertEqual(cache.get('sig000', PARAMS), _result(0))
+        cache.close()
+
+    def test_batched_commits(self):
+        cache = ResultCache(self.path, commit_every = 2)
+        cache.put('sig000', PARAMS, _result(0))
+        other = ResultCache(self.path)
+        self.assertEqual(len(other), 0)
+        cache.put('sig001', PARAMS, _result(1))
+        self.assertEqual(len(other), 2)
+        other.close()
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
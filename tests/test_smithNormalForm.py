@@ -0,0 +1,110 @@
+import random
+
+import unittest
+
+from smithNormalForm import smith_normal_form, matrix_rank, chain_complex_homology, operator_homology
+
+
+def _determinant(matrix):
+    # fraction-free (Bareiss) determinant of a square integer matrix
+    a = [list(row) for row in matrix]
+    n = len(a)
+    sign = 1
+    previous = 1
+    for k in xrange(n - 1):
+        if a[k][k] == 0:
+            swap = [i for i in xrange(k + 1, n) if a[i][k] != 0]
+            if not swap:
+                return 0
+            a[k], a[swap[0]] = a[swap[0]], a[k]
+            sign = -sign
+        for i in xrange(k + 1, n):
+            for j in xrange(k + 1, n):
+                a[i][j] = (a[i][j] * a[k][k] - a[i][k] * a[k][j]) // previous
+        previous = a[k][k]
+    return sign * a[n - 1][n - 1]
+
+
+def _product(a, b):
+    return [[sum(a[i][k] * b[k][j] for k in xrange(len(b))) for j in xrange(len(b[0]))] for i in xrange(len(a))]
+
+
+def _random_matrix(rng, rows, columns, low = -3, high = 3):
+    return [[rng.randint(low, high) for j in xrange(columns)] for i in xrange(rows)]
+
+
+class SmithNormalFormTest(unittest.TestCase):
+    def test_known_forms(self):
+        self.assertEqual(smith_normal_form([[2, 0], [0, 3]]), [1, 6])
+        self.assertEqual(smith_normal_form([[2, 4, 4], [-6, 6, 12], [10, -4, -16]]), [2, 6, 12])
+        self.assertEqual(smith_normal_form([[1, 2], [2, 4]]), [1])
+        self.assertEqual(smith_normal_form([[0, 0], [0, 0]]), [])
+        self.assertEqual(smith_normal_form([]), [])
+
+    def test_sparse_input(self):
+        self.assertEqual(smith_normal_form({0: {1: 3}, 4: {1: 6, 2: 2}}), [1, 6])
+        self.assertEqual(smith_normal_form({0: {0: 0}}), [])
+
+    def test_divisibility_and_determinant(self):
+        rng = random.Random(0)
+        for size in xrange(1, 7):
+            for trial in xrange(20):
+                matrix = _random_matrix(rng, size, size)
+                invariants = smith_normal_form(matrix)
+                for d, e in zip(invariants, invariants[1:]):
+                    self.assertEqual(e % d, 0)
+                determinant = abs(_determinant(matrix))
+                if determinant:
+                    product = 1
+                    for d in invariants:
+                        product *= d
+                    self.assertEqual(len(invariants), size)
+                    self.assertEqual(product, determinant)
+                else:
+                    self.assertTrue(len(invariants) < size)
+
+    def test_rank(self):
+        rng = random.Random(1)
+        for trial in xrange(30):
+            inner = rng.randint(1, 4)
+            matrix = _product(_random_matrix(rng, 6, inner), _random_matrix(rng, inner, 5))
+            rank = len(smith_normal_form(matrix))
+            self.assertTrue(rank <= inner)
+            self.assertEqual(matrix_rank(matrix), rank)
+
+    def test_rank_modulo(self):
+        self.assertEqual(matrix_rank([[2]]), 1)
+        self.assertEqual(matrix_rank([[2]], 2), 0)
+        self.assertEqual(matrix_rank([[1, 1], [1, -1]], 2), 1)
+        self.assertEqual(matrix_rank([[1, 1], [1, -1]], 3), 2)
+
+
+class ChainComplexHomologyTest(unittest.TestCase):
+    # cellular chain complexes with one cell per dimension where possible
+
+    def test_torus(self):
+        self.assertEqual(chain_complex_homology([1, 2, 1], {1: [[0, 0]], 2: [[0], [0]]}), ([1, 2, 1], [[], [], []]))
+
+    def test_projective_plane(self):
+        self.assertEqual(chain_complex_homology([1, 1, 1], {1: [[0]], 2: [[2]]}), ([1, 0, 0], [[], [2], []]))
+
+    def test_klein_bottle(self):
+        self.assertEqual(chain_complex_homology([1, 2, 1], {1: [[0, 0]], 2: [[0], [2]]}), ([1, 1, 0], [[], [2], []]))
+
+    def test_lens_space(self):
+        # L(5, q): missing matrices are zero
+        self.assertEqual(chain_complex_homology([1, 1, 1, 1], {2: [[5]]}), ([1, 0, 0, 1], [[], [5], [], []]))
+
+    def test_betti_only(self):
+        self.assertEqual(chain_complex_homology([1, 2, 1], {1: [[0, 0]], 2: [[0], [2]]}, False),
+                         ([1, 1, 0], [[], [], []]))
+
+    def test_operator_homology(self):
+        self.assertEqual(operator_homology([[2, 0], [0, 3]], [0, 1], [0, 1]), (0, [6]))
+        self.assertEqual(operator_homology([[0], [4]], [0, 1], [5]), (1, [4]))
+        self.assertEqual(operator_homology([[0], [4]], [0, 1], [5], False), (1, []))
+        self.assertEqual(operator_homology([], [3, 7], []), (2, []))
+
+
+if __name__ == '__main__':
+    unittest.main()